@@ -0,0 +1,102 @@
+import time
+
+# Admission control for game commands and buttons.
+#
+# Every request is charged to two token buckets, one for the user and one for the
+# guild, per group (a command and its buttons share a group: /slots and Play Again
+# both draw from "slots"). An empty bucket means a cheap ephemeral rejection instead
+# of a round with its REST edits and saves. On top of that, all throttled groups are
+# shed while the bot is overloaded (event loop lag or a long outbound queue), so the
+# requests already in flight can finish.
+#
+# Limits can be overridden per group with RATE_LIMITS, user limits only:
+#
+#   RATE_LIMITS="slots=0.5/3,coinflip=2/6"   # group=tokens per second/burst
+
+
+class Limit:
+    __slots__ = ("user_rate", "user_burst", "guild_rate", "guild_burst")
+
+    def __init__(self, user_rate, user_burst, guild_rate, guild_burst):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+
+
+DEFAULT_LIMIT = Limit(1.0, 5, 25.0, 75)
+LIMITS = {
+    # Animated games hold a message for several edits per round
+    "slots": Limit(0.5, 3, 10.0, 30),
+    "coinflip": Limit(1.0, 4, 15.0, 45),
+    "dice": Limit(1.0, 4, 15.0, 45),
+    "blackjack": Limit(2.0, 6, 25.0, 75),  # Hit/Stand clicks come in quick succession
+    "highlow": Limit(1.5, 5, 20.0, 60),
+    "rps": Limit(1.5, 5, 20.0, 60),
+}
+
+SHED_LOOP_LAG = 0.5  # Seconds of smoothed event loop lag
+SHED_OUTBOUND = 2000  # Queued DMs / staff edits
+PRUNE_INTERVAL = 60  # Seconds between sweeps of idle (full) buckets
+
+
+def parse_limits(text, limits=None):
+    limits = dict(LIMITS if limits is None else limits)
+    for entry in filter(None, (part.strip() for part in (text or "").split(","))):
+        group, _, spec = entry.partition("=")
+        rate, _, burst = spec.partition("/")
+        base = limits.get(group, DEFAULT_LIMIT)
+        limits[group] = Limit(float(rate), int(burst or base.user_burst), base.guild_rate, base.guild_burst)
+    return limits
+
+
+class AdmissionControl:
+    def __init__(self, limits=None, overloaded=None):
+        self.limits = LIMITS if limits is None else limits
+        self.overloaded = overloaded  # Callable, true while load should be shed
+        self._buckets = {}  # (scope, id, group) -> [tokens, last refill, rate, burst]
+        self._pruned = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def limit(self, group):
+        return self.limits.get(group, DEFAULT_LIMIT)
+
+    def _bucket(self, key, rate, burst, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now, rate, burst]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    # None if the request may run, else (reason, seconds until it would be admitted).
+    # reason is "overload", "user" or "guild"; a rejected request costs no tokens.
+    def admit(self, user_id, guild_id, group):
+        now = time.monotonic()
+        if now - self._pruned > PRUNE_INTERVAL:
+            self.prune(now)
+        if self.overloaded is not None and self.overloaded():
+            return "overload", 5.0
+        limit = self.limit(group)
+        user = self._bucket(("user", user_id, group), limit.user_rate, limit.user_burst, now)
+        if user[0] < 1:
+            return "user", (1 - user[0]) / limit.user_rate
+        if guild_id is not None:
+            guild = self._bucket(("guild", guild_id, group), limit.guild_rate, limit.guild_burst, now)
+            if guild[0] < 1:
+                return "guild", (1 - guild[0]) / limit.guild_rate
+            guild[0] -= 1
+        user[0] -= 1
+        return None
+
+    # Forget buckets that have refilled completely: a new one starts full anyway
+    def prune(self, now=None):
+        now = time.monotonic() if now is None else now
+        idle = [key for key, (tokens, last, rate, burst) in self._buckets.items() if tokens + (now - last) * rate >= burst]
+        for key in idle:
+            del self._buckets[key]
+        self._pruned = now
+        return len(idle)
@@ -0,0 +1,142 @@
+import time
+
+import numpy as np
+
+# Rolling per-game payout aggregates for /stats, updated as rounds settle.
+#
+# Each window is a fixed ring of time buckets (1h: 60 one-minute buckets, 24h: 96
+# quarter-hours, 7d: 168 hours). A settled round adds to the current bucket of every
+# ring; a bucket is cleared when the ring comes round to it again, so memory is fixed
+# and a query sums at most a few hundred small rows, however busy the games are.
+#
+# For fixed-odds games, observed RTP is compared with the theoretical RTP measured by
+# simulator.py. The z-score scales the payout gap by the spread the game's variance
+# allows for the stakes actually played, so a real payout bug stands out after a few
+# minutes of play while a lucky streak at high variance does not. Highlow and blackjack
+# are not tested: their return depends on how the player guesses or when they stand,
+# and the simulator's fixed strategy says nothing about how real players play.
+
+WINDOWS = {"1h": (60, 60), "24h": (900, 96), "7d": (3600, 168)}  # name -> (bucket seconds, buckets)
+FIELDS = ("rounds", "hits", "handle", "payout", "stake_sq", "big_wins")
+BIG_WIN_MULTIPLE = 5  # A payout of at least 5x the stake
+ANOMALY_Z = 4.0
+ANOMALY_MIN_ROUNDS = 50
+FIXED_ODDS_GAMES = ("dice", "coinflip", "rps", "slots")  # Return independent of player choices
+
+
+def _values(stakes, payouts):
+    stakes = np.asarray(stakes, dtype=np.float64)
+    payouts = np.asarray(payouts, dtype=np.float64)
+    return np.stack([np.ones_like(stakes), payouts > stakes, stakes, payouts, stakes * stakes,
+                     payouts >= BIG_WIN_MULTIPLE * stakes], axis=-1)
+
+
+# One window: `size` buckets of `width` seconds, per game
+class Ring:
+    def __init__(self, width, size, games):
+        self.width = width
+        self.size = size
+        self.epochs = np.full(size, -1, dtype=np.int64)  # Bucket number held by each slot
+        self.totals = np.zeros((size, games, len(FIELDS)))
+        self.newest = -1
+
+    def clear(self):
+        self.epochs[:] = -1
+        self.totals[:] = 0
+        self.newest = -1
+
+    def _claim(self, epoch):
+        slot = epoch % self.size
+        if self.epochs[slot] < epoch:
+            self.epochs[slot] = epoch
+            self.totals[slot] = 0
+            self.newest = max(self.newest, epoch)
+        return slot
+
+    def add(self, epoch, code, values):
+        if epoch <= self.newest - self.size:
+            return  # Older than the whole window
+        self.totals[self._claim(epoch), code] += values
+
+    # Vectorized add of many rounds (startup seeding)
+    def add_many(self, epochs, codes, values):
+        keep = epochs > max(int(epochs.max()), self.newest) - self.size
+        epochs, codes, values = epochs[keep], codes[keep], values[keep]
+        for epoch in np.unique(epochs).tolist():
+            self._claim(epoch)
+        np.add.at(self.totals, (epochs % self.size, codes), values)
+
+    def window(self, now):
+        epoch = int(now // self.width)
+        live = (self.epochs > epoch - self.size) & (self.epochs <= epoch)
+        return self.totals[live].sum(axis=0)
+
+
+class GameStats:
+    def __init__(self, games):
+        self.games = tuple(games)
+        self._codes = {game: code for code, game in enumerate(self.games)}
+        self.rings = {name: Ring(width, size, len(self.games)) for name, (width, size) in WINDOWS.items()}
+        self.expected = {}  # Fixed-odds game -> (RTP, variance of the net per unit staked), from simulator.measure
+
+    def clear(self):
+        for ring in self.rings.values():
+            ring.clear()
+
+    def set_expected(self, results):
+        self.expected = {result["game"]: (result["rtp"], result["variance"])
+                         for result in results if result["game"] in FIXED_ODDS_GAMES}
+
+    def record(self, game, stake, payout, timestamp=None):
+        code = self._codes.get(game)
+        if code is None or stake <= 0:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        if not timestamp:
+            return  # Legacy records have no time
+        values = np.array((1, payout > stake, stake, payout, stake * stake, payout >= BIG_WIN_MULTIPLE * stake), dtype=np.float64)
+        for ring in self.rings.values():
+            ring.add(int(timestamp // ring.width), code, values)
+
+    # Seed from ledger records: parallel arrays of game names, stakes, payouts and timestamps
+    def record_many(self, games, stakes, payouts, timestamps):
+        games = np.asarray(games)
+        codes = np.full(len(games), -1, dtype=np.int64)
+        for code, game in enumerate(self.games):
+            codes[games == game] = code
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        stakes = np.asarray(stakes)
+        keep = (codes >= 0) & (timestamps > 0) & (stakes > 0)
+        if not keep.any():
+            return
+        codes, timestamps = codes[keep], timestamps[keep]
+        values = _values(stakes[keep], np.asarray(payouts)[keep])
+        for ring in self.rings.values():
+            ring.add_many((timestamps // ring.width).astype(np.int64), codes, values)
+
+    # Per-game figures over one window, games without rounds left out
+    def summary(self, window, now=None):
+        now = time.time() if now is None else now
+        totals = self.rings[window].window(now)
+        rows = []
+        for code, game in enumerate(self.games):
+            rounds, hits, handle, payout, stake_sq, big_wins = totals[code].tolist()
+            if not rounds:
+                continue
+            row = {
+                "game": game, "rounds": int(rounds), "handle": int(handle), "payout": int(payout),
+                "house": int(handle - payout), "rtp": payout / handle, "hit_rate": hits / rounds,
+                "big_wins": int(big_wins), "expected_rtp": None, "z": None, "anomaly": False,
+            }
+            if game in self.expected:
+                rtp, variance = self.expected[game]
+                row["expected_rtp"] = rtp
+                spread = (variance * stake_sq) ** 0.5
+                if spread > 0:
+                    row["z"] = (payout - rtp * handle) / spread
+                    row["anomaly"] = rounds >= ANOMALY_MIN_ROUNDS and abs(row["z"]) >= ANOMALY_Z
+            rows.append(row)
+        return rows
+
+    def anomalies(self, window="1h", now=None):
+        return [row for row in self.summary(window, now) if row["anomaly"]]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from collections import deque
+
+# Discord allows roughly 5 edits per 5 seconds on an interaction's webhook route
+# before it starts answering 429s, and discord.py then queues every other request there.
+EDIT_BUDGET = 5
+EDIT_WINDOW = 5.0
+
+
+# Rate-limit-aware scheduler for cosmetic animation frames.
+# Every edit is recorded against a bucket (the interaction token, which is what the
+# edit route is limited on). Intermediate frames are only sent while the bucket has
+# room left, always keeping one edit for the final result, so a busy response gets
+# fewer frames (or none) instead of a queue of 429 retries.
+class AnimationScheduler:
+    def __init__(self, budget=EDIT_BUDGET, window=EDIT_WINDOW):
+        self.budget = budget
+        self.window = window
+        self._edits = {}  # bucket -> deque of edit timestamps
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def _recent(self, bucket, now):
+        edits = self._edits.get(bucket)
+        if edits is None:
+            return 0
+        while edits and edits[0] <= now - self.window:
+            edits.popleft()
+        if not edits:
+            del self._edits[bucket]
+            return 0
+        return len(edits)
+
+    def note_edit(self, bucket):
+        self._edits.setdefault(bucket, deque()).append(time.monotonic())
+
+    # How many of `wanted` intermediate frames the bucket can afford right now
+    def frames_for(self, bucket, wanted):
+        room = self.budget - self._recent(bucket, time.monotonic()) - 1  # Keep one for the result
+        return max(0, min(wanted, room))
+
+    async def edit(self, bucket, message, **kwargs):
+        self.note_edit(bucket)
+        await message.edit(**kwargs)
+
+    # Show as many of `frames` as the bucket allows, `delay` seconds apart.
+    # The last frames are dropped first, so the final edit follows quickly.
+    async def play(self, bucket, message, frames, delay):
+        frames = list(frames)
+        allowed = self.frames_for(bucket, len(frames))
+        self.frames_dropped += len(frames) - allowed
+        for content in frames[:allowed]:
+            await self.edit(bucket, message, content=content)
+            self.frames_sent += 1
+            await asyncio.sleep(delay)
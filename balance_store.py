@@ -0,0 +1,145 @@
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+# Snapshot layout: header, then the raw key and value arrays of the table
+SNAPSHOT_MAGIC = b"CBAL"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sIQQ")  # magic, version, capacity, size
+
+EMPTY = 0  # Discord snowflakes are never 0, so 0 marks a free slot
+MAX_LOAD = 0.6
+HASH_MULTIPLIER = 11400714819323198485  # 2^64 / golden ratio (Fibonacci hashing)
+MASK_64 = (1 << 64) - 1
+
+
+# Compact balance store keyed by the 64-bit user ID.
+# An open-addressing hash table over two flat arrays (uint64 ids, int64 balances):
+# 16 bytes per slot, no Python objects per user, O(1) lookups without str() keys,
+# and the table image is the snapshot, so loading is a single read.
+class BalanceStore:
+    def __init__(self, capacity=1024):
+        capacity = max(16, 1 << (capacity - 1).bit_length())  # Power of two
+        self._keys = array("Q", bytes(8 * capacity))
+        self._values = array("q", bytes(8 * capacity))
+        self._size = 0
+        self._set_capacity(capacity)
+
+    def _set_capacity(self, capacity):
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._max_size = int(capacity * MAX_LOAD)
+
+    def _slot(self, user_id):
+        keys = self._keys
+        mask = self._mask
+        i = ((user_id * HASH_MULTIPLIER) & MASK_64) >> self._shift
+        while True:
+            key = keys[i]
+            if key == user_id or key == EMPTY:
+                return i
+            i = (i + 1) & mask  # Linear probing
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, user_id):
+        return self._keys[self._slot(user_id)] == user_id
+
+    def get(self, user_id, default=0):
+        i = self._slot(user_id)
+        return self._values[i] if self._keys[i] == user_id else default
+
+    def set(self, user_id, value):
+        i = self._slot(user_id)
+        if self._keys[i] == EMPTY:
+            if self._size >= self._max_size:
+                self._grow()
+                i = self._slot(user_id)
+            self._keys[i] = user_id
+            self._size += 1
+        self._values[i] = value
+
+    # Add `amount` to a balance (creating it at 0) and return the new balance
+    def add(self, user_id, amount):
+        i = self._slot(user_id)
+        if self._keys[i] != user_id:
+            self.set(user_id, amount)
+            return amount
+        value = self._values[i] + amount
+        self._values[i] = value
+        return value
+
+    def items(self):
+        values = self._values
+        for i, key in enumerate(self._keys):
+            if key != EMPTY:
+                yield key, values[i]
+
+    # (user ids, balances) as parallel numpy arrays, e.g. to hand to another process
+    def arrays(self):
+        keys = np.frombuffer(self._keys, dtype=np.uint64)
+        occupied = keys != EMPTY
+        return keys[occupied].copy(), np.frombuffer(self._values, dtype=np.int64)[occupied].copy()
+
+    def _grow(self):
+        old_keys, old_values = self._keys, self._values
+        capacity = self._capacity * 2
+        self._keys = array("Q", bytes(8 * capacity))
+        self._values = array("q", bytes(8 * capacity))
+        self._set_capacity(capacity)
+        for i, key in enumerate(old_keys):
+            if key != EMPTY:
+                j = self._slot(key)
+                self._keys[j] = key
+                self._values[j] = old_values[i]
+
+    @classmethod
+    def from_dict(cls, balances):
+        store = cls(int(len(balances) / MAX_LOAD) + 1)
+        for user_id, value in balances.items():
+            store.set(int(user_id), int(value))
+        return store
+
+    # Copy of the table taken on the event loop; encode_snapshot() can run anywhere
+    def capture(self):
+        return self._capacity, self._size, self._keys.tobytes(), self._values.tobytes()
+
+    @staticmethod
+    def encode_snapshot(captured):
+        capacity, size, keys, values = captured
+        if sys.byteorder != "little":
+            keys, values = _swapped("Q", keys), _swapped("q", values)
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, capacity, size) + keys + values
+
+    @classmethod
+    def from_snapshot(cls, data):
+        magic, version, capacity, size = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a balance snapshot")
+        offset = SNAPSHOT_HEADER.size
+        if len(data) != offset + 16 * capacity:
+            raise ValueError("truncated balance snapshot")
+        store = cls.__new__(cls)
+        store._keys = array("Q", data[offset:offset + 8 * capacity])
+        store._values = array("q", data[offset + 8 * capacity:])
+        if sys.byteorder != "little":
+            store._keys.byteswap()
+            store._values.byteswap()
+        store._size = size
+        store._set_capacity(capacity)
+        return store
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_snapshot(file.read())
+
+
+def _swapped(typecode, data):
+    values = array(typecode, data)
+    values.byteswap()
+    return values.tobytes()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from engine import blackjack, coinflip, dice, highlow, rps, slots
+from engine import shoe as shoe_module
+
+# Microbenchmarks for the headless game engine: rounds/second per game.
+#
+#   python bench_engine.py                         # print rounds/second
+#   python bench_engine.py --save bench.json       # record a baseline
+#   python bench_engine.py --check bench.json      # fail if any game got >20% slower
+
+
+def bench_dice(rng, rounds):
+    for _ in range(rounds):
+        dice.play(100, rng)
+
+
+def bench_coinflip(rng, rounds):
+    for _ in range(rounds):
+        coinflip.play(100, "heads", rng)
+
+
+def bench_blackjack(rng, rounds):
+    shoe = shoe_module.Shoe()  # One shoe for the whole run, reshuffled at penetration like a table's
+    for _ in range(rounds):
+        game = blackjack.BlackjackGame(100, rng, shoe)
+        while not game.game_over and game.player_total < 17:
+            game.hit()
+        if not game.game_over:
+            game.stand()
+        sink = game.payout  # Settle the hand too, so payout's cost is part of the timing
+
+
+def bench_slots(rng, rounds):
+    multiplier = slots.SLOTS_FIRST_MULTIPLIER
+    for _ in range(rounds):
+        multiplier = slots.spin(100, multiplier, rng).next_multiplier
+
+
+def bench_rps(rng, rounds):
+    for _ in range(rounds):
+        rps.play(100, "🪨", rng)
+
+
+def bench_highlow(rng, rounds):
+    for _ in range(rounds):
+        highlow.guess(100, highlow.draw_card(rng), "higher", rng)
+
+
+BENCHMARKS = {
+    "dice": bench_dice,
+    "coinflip": bench_coinflip,
+    "blackjack": bench_blackjack,
+    "slots": bench_slots,
+    "rps": bench_rps,
+    "highlow": bench_highlow,
+}
+
+
+# Best of `repeat` runs, in rounds per second
+def run(game, rounds, repeat, seed):
+    best = 0.0
+    for _ in range(repeat):
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        BENCHMARKS[game](rng, rounds)
+        best = max(best, rounds / (time.perf_counter() - started))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rounds/second per game for the headless engine")
+    parser.add_argument("--rounds", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save", metavar="FILE", help="Write results as a JSON baseline")
+    parser.add_argument("--check", metavar="FILE", help="Compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for game in BENCHMARKS:
+        results[game] = run(game, args.rounds, args.repeat, args.seed)
+        print(f"{game:<10} {results[game]:>12,.0f} rounds/s")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.check:
+        with open(args.check) as file:
+            baseline = json.load(file)
+        slower = [
+            game for game, rate in results.items()
+            if game in baseline and rate < baseline[game] * (1 - args.tolerance)
+        ]
+        for game in slower:
+            print(f"❌ {game} regressed: {results[game]:,.0f} vs baseline {baseline[game]:,.0f} rounds/s")
+        if slower:
+            sys.exit(1)
+        print("✅ No engine regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,107 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Before the imports, so they show in the startup timings
+
 import discord
-import random
 import os
 import json
-import openpyxl
-import signal
+import hashlib
 import asyncio
-import pandas as pd
+import math
+import datetime
+import sys
+import signal
+import traceback
+from collections import OrderedDict
+import numpy as np
 from dotenv import load_dotenv
 from discord import app_commands
 from discord.ext import commands
+from ledger import GAMES, Ledger, LedgerReader, describe
+from history import HistoryIndex
+from leaderboard import LEADERBOARD_SIZE, WINDOWS, BigWins, TopK
+from snapshot import write_atomic
+from wallet import Wallet
+from balance_store import BalanceStore
+from coordinator import CoordinatedWallet, CoordinatorClient
+from sessions import SessionJournal, SessionManager, decode_id, encode_id
+from components import GameButton, action, buttons, set_check
+from admission import SHED_LOOP_LAG, SHED_OUTBOUND, AdmissionControl, parse_limits
+import metrics
+from review_queue import ReviewQueue
+from notifier import OutboundQueue
+from rng import RngService
+import export
+import analytics
+import simulator
+from profiler import LoopWatchdog, SamplingProfiler
+from animation import AnimationScheduler
+from storage import config_from_env, load_or_seed, open_backend
+from engine import blackjack as blackjack_engine
+from engine.shoe import Shoe, card_label
+from engine import coinflip as coinflip_engine
+from engine import dice as dice_engine
+from engine import highlow as highlow_engine
+from engine import rps as rps_engine
+from engine import slots as slots_engine
+from engine.rules import SLOTS_FIRST_MULTIPLIER, SLOTS_MULTIPLIER_AFTER_LOSS, SLOTS_MULTIPLIER_AFTER_WIN
+
+# Startup timing: each phase is measured from the end of the previous one
+startup_marks = [("start", STARTUP_STARTED)]
+
+
+def startup_phase(name):
+    startup_marks.append((name, time.perf_counter()))
+
+
+def startup_report():
+    parts = [f"{name} {(end - start) * 1000:.0f} ms" for (_, start), (name, end) in zip(startup_marks, startup_marks[1:])]
+    total = startup_marks[-1][1] - STARTUP_STARTED
+    return f"⏱️ Startup {total:.2f}s: " + ", ".join(parts)
+
+
+startup_phase("imports")
+
+# Load environment variables from a .env file
+load_dotenv()
+BOT_KEY = os.getenv("BOT_TOKEN")
+
+# Sharded deployment (see cluster.py): this process runs SHARD_IDS out of SHARD_COUNT
+# shards, and balances and the ledger belong to the coordinator at COORDINATOR
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(shard) for shard in os.getenv("SHARD_IDS", "").split(",") if shard]
+COORDINATOR = os.getenv("COORDINATOR")
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
 
 # Bot setup
 intents = discord.Intents.default()
 intents.messages = True
 intents.guilds = True
 intents.members = True  # Enable members intent
-bot = commands.Bot(command_prefix="/", intents=intents)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix="/", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None)
+else:
+    bot = commands.Bot(command_prefix="/", intents=intents)
+
+
+# Every bot process of a sharded deployment keeps its own copy of the local state files
+def cluster_file(path):
+    if not COORDINATOR:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{CLUSTER_ID}{extension}"
+
 
 # File paths
-BALANCES_FILE = "balances.json"
-TRANSACTIONS_FILE = "transactions.json"
+BALANCES_FILE = "balances.json"  # Legacy JSON balances, imported into the binary snapshot once
+BALANCES_SNAPSHOT = "balances.bin"
+TRANSACTIONS_FILE = "transactions.json"  # Legacy full-dump history, imported into the ledger once
+LEGACY_LEDGER_FILE = "transactions.log"  # Legacy JSON-lines ledger, imported once as well
+LEDGER_FILE = "transactions.ledger"
+REVIEW_QUEUE_FILE = cluster_file("review_queue.json")  # Pending deposit/withdrawal requests
+FAIRNESS_FILE = cluster_file("fairness.json")  # Current server seed (secret until revealed) and revealed seeds
+OUTBOUND_FILE = cluster_file("outbound.json")  # DMs and staff message edits not yet delivered
+SESSION_JOURNAL_FILE = cluster_file("sessions.journal")  # Rounds in play, closed at the next start after a crash
+COMMAND_SYNC_FILE = "command_sync.json"  # Hash of the last command set pushed to Discord
 STAFF_CHANNEL_ID = 1358055200748998816
 
 # Load data from file
@@ -37,44 +119,298 @@ def load_data(file_path):
         return {}
 
 
-# Save data to file
+# Save data to file (temp file + atomic rename, never a half-written file)
 def save_data(file_path, data):
-    with open(file_path, "w") as file:
-        json.dump(data, file, indent=4)
+    write_atomic(file_path, json.dumps(data, indent=4).encode("utf-8"))
 
 
-# Load environment variables from a .env file
-load_dotenv()
-BOT_KEY = os.getenv("BOT_TOKEN")
-
 tree = bot.tree
+bot.add_dynamic_items(GameButton)  # One dispatcher for every game button
+
+# Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics (METRICS_PORT=0 disables)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+if METRICS_PORT and COORDINATOR:
+    METRICS_PORT += CLUSTER_ID  # One endpoint per bot process
+metrics_server = None
+metrics.instrument_responses()  # Time to the first response of every interaction
+
+
+# Per-user and per-guild token buckets for game commands and their buttons, and load
+# shedding while the event loop lags or the outbound queue backs up (see admission.py)
+admission = AdmissionControl(
+    parse_limits(os.getenv("RATE_LIMITS")),
+    overloaded=lambda: loop_watchdog.lag > SHED_LOOP_LAG or len(outbound) > SHED_OUTBOUND,
+)
+COMMAND_GROUPS = {"roll_dice": "dice"}  # Commands sharing a bucket with their game's buttons
+UNTHROTTLED_BUTTONS = ("review",)  # Staff buttons
+THROTTLED_MESSAGES = {
+    "user": "⏳ Slow down! You can play again in {seconds}s.",
+    "guild": "⏳ This server is playing a lot right now, please try again in {seconds}s.",
+    "overload": "🚧 The casino is very busy right now, please try again in a moment.",
+}
+
+
+# Charge a request to its buckets. False (after a short ephemeral reply) if it's turned away.
+async def admit(interaction: discord.Interaction, group):
+    rejected = admission.admit(interaction.user.id, interaction.guild_id, group)
+    if rejected is None:
+        return True
+    reason, retry_after = rejected
+    metrics.THROTTLED.labels(group, reason).inc()
+    await interaction.response.send_message(THROTTLED_MESSAGES[reason].format(seconds=math.ceil(retry_after)), ephemeral=True)
+    return False
+
+
+# Every slash command passes through here first: stamp the start for the latency
+# histogram, then admission control. Staff and admin commands (the ones with
+# permission checks) are never throttled.
+async def check_interaction(interaction: discord.Interaction):
+    interaction.extras["started"] = time.perf_counter()
+    command = interaction.command
+    if command is None or command.checks:
+        return True
+    return await admit(interaction, COMMAND_GROUPS.get(command.name, command.name))
+
+
+async def check_button(interaction: discord.Interaction, game):
+    return game in UNTHROTTLED_BUTTONS or await admit(interaction, game)
+
+tree.interaction_check = check_interaction
+set_check(check_button)
+
+
+def command_seconds(interaction):
+    return time.perf_counter() - interaction.extras.get("started", time.perf_counter())
+
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    metrics.COMMAND_SECONDS.labels(command.qualified_name).observe(command_seconds(interaction))
+
+
+@tree.error
+async def on_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    cause = error.original if isinstance(error, app_commands.CommandInvokeError) else error
+    metrics.COMMAND_ERRORS.labels(name, type(cause).__name__).inc()
+    metrics.COMMAND_SECONDS.labels(name).observe(command_seconds(interaction))
+    print(f"⚠️ /{name} failed: {cause!r}")
+    traceback.print_exception(type(error), error, error.__traceback__)
 
 # Maximum bet limit
 MAX_BET = 10000  # Change this value to adjust the betting limit
+MAX_ROUNDS = 1000  # Per batched /coinflip or /roll_dice
+
+# Storage backend: "file" (binary snapshot + ledger), "sqlite" (WAL) or "mongo"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file")
+STORAGE_CONFIG = config_from_env(snapshot_path=BALANCES_SNAPSHOT, legacy_loader=lambda: load_data(BALANCES_FILE))
+
+if COORDINATOR:
+    # Sharded deployment: the coordinator owns balances and the ledger. This process
+    # keeps a read cache of both, filled when it connects (see setup_bot).
+    storage = None
+    balances = BalanceStore()
+    ledger = LedgerReader(LEDGER_FILE)
+else:
+    storage = open_backend(STORAGE_BACKEND, **STORAGE_CONFIG)
+
+    # User balances and transactions
+    balances = load_or_seed(storage, **STORAGE_CONFIG)
+    print(f"✅ Loaded {len(balances)} balances from the {storage.name} backend.")
+
+    # Transaction history lives in an append-only ledger of structured records
+    ledger = Ledger(LEDGER_FILE)
+    if ledger.is_empty():
+        imported = ledger.import_legacy_files((LEGACY_LEDGER_FILE, TRANSACTIONS_FILE))
+        if imported:
+            print(f"✅ Imported {imported[1]} transactions from {imported[0]} into {LEDGER_FILE}.")
+startup_phase("storage")
+history_index = HistoryIndex(ledger)  # Per-user record offsets for /history
+startup_phase("history index")
+
+# Leaderboards, kept up to date on every balance change and settled round
+PLAY_GAMES = ("dice", "coinflip", "blackjack", "slots", "rps", "highlow")
+richest = TopK(LEADERBOARD_SIZE, source=lambda: balances.items())
+big_wins = BigWins()
+
+
+# Seed the big-win boards from recent ledger history (one vectorized pass)
+def load_big_wins():
+    view = ledger.view()
+    if len(view) == 0:
+        return
+    net = view["payout"] - view["stake"]
+    is_play = np.isin(view["game"], [GAMES.index(game) for game in PLAY_GAMES])
+    recent = view["timestamp"] >= datetime.datetime.now().timestamp() - max(WINDOWS.values())
+    for game in PLAY_GAMES:
+        in_game = is_play & (view["game"] == GAMES.index(game)) & (net > 0)
+        # All-time board: only the top few matter, and legacy records have no timestamp
+        candidates = np.flatnonzero(in_game & ~recent)
+        if len(candidates) > LEADERBOARD_SIZE:
+            candidates = candidates[np.argpartition(-net[candidates], LEADERBOARD_SIZE)[:LEADERBOARD_SIZE]]
+        for i in np.concatenate([candidates, np.flatnonzero(in_game & recent)]).tolist():
+            big_wins.record(game, int(view["user"][i]), int(net[i]), float(view["timestamp"][i]))
+
+
+load_big_wins()
+startup_phase("leaderboards")
+
+# Rolling per-game RTP and house profit for /stats, updated as rounds settle
+EXPECTED_RTP_ROUNDS = 200_000  # Simulated rounds per game for the theoretical RTP
+PAYOUT_CHECK_INTERVAL = 60
+game_stats = analytics.GameStats(PLAY_GAMES)
+
+
+# Seed the stats windows from the last week of the ledger (one vectorized pass)
+def load_game_stats():
+    view = ledger.view()
+    if len(view) == 0:
+        return
+    recent = view[view["timestamp"] >= time.time() - max(width * size for width, size in analytics.WINDOWS.values())]
+    game_stats.record_many(np.array(GAMES)[recent["game"]], recent["stake"], recent["payout"], recent["timestamp"])
+
+
+load_game_stats()
+startup_phase("game stats")
+
+# Log a settled round or balance change for a user.
+# stake is what the user put in, payout what they got back (stake included).
+def log_transaction(user_id, game, stake, payout, outcome):
+    user_id = int(user_id)
+    log_rows([(user_id, game, stake, payout, outcome, get_balance(user_id))])
+
+
+# Log a batch of rounds of one game, settled together, as a single ledger write.
+# Each record gets the balance the user had right after that round.
+def log_transactions(user_id, game, stake, payouts, outcomes):
+    user_id = int(user_id)
+    running = get_balance(user_id) - sum(payouts) + stake * len(payouts)  # Balance before the batch
+    rows = []
+    for payout, outcome in zip(payouts, outcomes):
+        running += payout - stake
+        rows.append((user_id, game, stake, payout, outcome, running))
+    log_rows(rows)
+
+
+# Write prepared rows (user_id, game, stake, payout, outcome, balance_after), possibly
+# for several users, as one ledger batch
+def log_rows(rows):
+    timestamp = datetime.datetime.now().timestamp()
+    if coordinator is not None:
+        coordinator.log(rows, timestamp)  # Indexed when the coordinator reports them (index_rows)
+        return
+    first = ledger.append_many(rows, timestamp)  # Fsynced by the group commit task
+    for offset, row in enumerate(rows):
+        storage.stage_transaction((first + offset, timestamp, *row))
+    index_rows(first, timestamp, rows)
 
-# User balances and transactions
-balances = load_data(BALANCES_FILE)  # Ensure it loads
-transactions = load_data(TRANSACTIONS_FILE)  # Ensure it loads
-
-# Log transactions for each user
-def log_transaction(user_id, description):
-    if user_id not in transactions:
-        transactions[user_id] = []  # Ensure user has a transaction list
 
-    transactions[user_id].append(description)  # Log the new transaction
-    save_data(TRANSACTIONS_FILE, transactions)  # Save immediately
+# Make ledger records from `first` on visible to /history and the big-win boards
+def index_rows(first, timestamp, rows):
+    for offset, row in enumerate(rows):
+        user_id, game, stake, payout = row[:4]
+        history_index.add(user_id, first + offset)
+        if game in PLAY_GAMES:
+            big_wins.record(game, user_id, payout - stake, timestamp)
+            game_stats.record(game, stake, payout, timestamp)
 
 
 # Helper function to get balance
 def get_balance(user_id):
-    user_id_str = str(user_id)  # Ensure we are checking string keys
-    return balances.get(user_id_str, 0)  # Fetch using string key
+    return balances.get(int(user_id))  # Keyed by the integer snowflake
 
 
 # Helper function to update balance
 def update_balance(user_id, amount):
-    user_id_str = str(user_id)  # Convert user ID to string for consistency
-    balances[user_id_str] = get_balance(user_id_str) + amount
+    user_id = int(user_id)
+    new_balance = balances.add(user_id, amount)
+    storage.stage_balance(user_id, amount)
+    richest.update(user_id, new_balance)
+
+
+# Balance cache of a sharded bot process, kept current by the coordinator
+def cache_balance(user_id, balance):
+    balances.set(user_id, balance)
+    richest.update(user_id, balance)
+
+
+# (Re)connected to the coordinator: replace the caches with its current state. Rare,
+# and each rebuild is a single vectorized pass.
+def load_coordinator_state(state):
+    global balances, big_wins
+    balances = BalanceStore.from_dict(dict(state["balances"]))
+    ledger.count = state["ledger_count"]
+    history_index.rebuild()
+    big_wins = BigWins()
+    load_big_wins()
+    game_stats.clear()
+    load_game_stats()
+    richest.rebuild()
+    print(f"✅ Coordinator state: {len(balances)} balances and {ledger.count} transactions.")
+
+
+def coordinator_logged(first, timestamp, rows):
+    ledger.count = max(ledger.count, first + len(rows))
+    index_rows(first, timestamp, rows)
+
+
+# All bets and payouts go through the wallet: per-user locks, holds and idempotency keys.
+# In a sharded deployment the coordinator applies them, so every shard sees one balance.
+if COORDINATOR:
+    coordinator = CoordinatorClient(COORDINATOR, on_connect=load_coordinator_state, on_balance=cache_balance, on_logged=coordinator_logged)
+    wallet = CoordinatedWallet(coordinator, get_balance)
+else:
+    coordinator = None
+    wallet = Wallet(get_balance, update_balance)
+
+# Rounds waiting on a button click. Abandoned ones (timed out, replaced by a new hand,
+# or still open at shutdown) are closed by game, so walking away never beats playing
+# on: a blackjack hand is stood and settled, a highlow round whose card was shown is
+# lost, and rps, which shows nothing before the click, follows SESSION_EXPIRY_POLICY.
+SESSION_EXPIRY_POLICY = os.getenv("SESSION_EXPIRY_POLICY", "refund")  # "refund" or "forfeit"
+SESSION_POLICIES = {"blackjack": "finish", "highlow": "forfeit"}
+
+
+# Play out an abandoned round the way a click would have ended it
+async def finish_session(session):
+    if session.game == "blackjack":
+        game = session.state
+        if not game.game_over:
+            game.stand()
+        await finish_blackjack(session.user_id, game, session.hold)
+
+
+sessions = SessionManager(
+    wallet,
+    on_forfeit=lambda session: log_transaction(session.user_id, session.game, session.hold.amount, 0, "loss"),
+    on_finish=finish_session,
+    policy=SESSION_EXPIRY_POLICY,
+    policies=SESSION_POLICIES,
+    journal=SessionJournal(SESSION_JOURNAL_FILE),
+    codecs={"blackjack": (blackjack_engine.BlackjackGame.to_dict, blackjack_engine.BlackjackGame.from_dict)},
+)
+
+
+# Track a new round, or give the bet back if the session table is full
+async def open_session(user_id, game, hold, state=None, ttl=None):
+    session = sessions.open(user_id, game, hold, state, ttl)
+    if session is None:
+        await wallet.refund(hold)
+    return session
+
+SESSIONS_FULL = "🚧 Too many games in progress right now, please try again in a moment."
+
+# Every game outcome is drawn from the provably fair RNG (see rng.py and /fairness)
+fair_rng = RngService(FAIRNESS_FILE)
+
+
+# Integers packed into a button arg ("100.15.1"), or None if it doesn't parse
+def button_args(arg, count):
+    parts = arg.split(".")
+    if len(parts) != count or not all(part.isdigit() for part in parts):
+        return None
+    return [int(part) for part in parts]
 
 
 # Command to check balance
@@ -96,171 +432,296 @@ async def adjust_balance(interaction: discord.Interaction, user: discord.User, a
         return
     
     if action.lower() == "increase":
-        update_balance(user.id, amount)
-        log_transaction(user.id, f"Admin increased balance by ${amount}")
+        await wallet.credit(user.id, amount, key=interaction.id)
+        log_transaction(user.id, "admin", 0, amount, "credit")
     else:
-        update_balance(user.id, -amount)
-        log_transaction(user.id, f"Admin decreased balance by ${amount}")
+        await wallet.credit(user.id, -amount, key=interaction.id)
+        log_transaction(user.id, "admin", amount, 0, "debit")
     
     await interaction.followup.send(f"✅ {user.mention}'s balance has been {'increased' if action.lower() == 'increase' else 'decreased'} by **${amount}**.", ephemeral=True)
 
 
 
+# Transaction history
+HISTORY_PAGE_SIZE = 10
+
+
+# Parse a YYYY-MM-DD date (UTC) into a unix timestamp
+def parse_date(text):
+    date = datetime.datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    return date.timestamp()
+
+
+async def send_history(interaction: discord.Interaction, user: discord.abc.User, page, game, since, until):
+    if game is not None and game.lower() not in GAMES:
+        await interaction.response.send_message(f"⚠️ Unknown game! Use one of: {', '.join(GAMES)}.", ephemeral=True)
+        return
+    try:
+        since_ts = parse_date(since) if since else None
+        until_ts = parse_date(until) + 86400 if until else None  # Include the whole end day
+    except ValueError:
+        await interaction.response.send_message("⚠️ Dates must look like `2025-04-30`.", ephemeral=True)
+        return
+
+    page = max(page, 1)
+    records, total = history_index.page(
+        user.id, page, HISTORY_PAGE_SIZE,
+        game=game.lower() if game else None, since=since_ts, until=until_ts,
+    )
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+
+    embed = discord.Embed(title=f"📜 Transaction History: {user.display_name}", color=discord.Color.blurple())
+    if not records:
+        embed.description = "No transactions found."
+    else:
+        lines = []
+        for record in records:
+            when = f"<t:{int(record['timestamp'])}:d>" if record["timestamp"] else "`legacy`"
+            lines.append(f"{when} {describe(record)} • balance ${int(record['balance_after'])}")
+        embed.description = "\n".join(lines)
+    embed.set_footer(text=f"Page {min(page, pages)}/{pages} • {total} transactions")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@tree.command(name="history", description="View your transaction history")
+@app_commands.describe(page="Page number", game="Only show one game", since="From date (YYYY-MM-DD)", until="To date (YYYY-MM-DD)")
+async def history(interaction: discord.Interaction, page: int = 1, game: str = None, since: str = None, until: str = None):
+    await send_history(interaction, interaction.user, page, game, since, until)
+
+
+@tree.command(name="user_history", description="View any user's transaction history (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(user="User to inspect", page="Page number", game="Only show one game", since="From date (YYYY-MM-DD)", until="To date (YYYY-MM-DD)")
+async def user_history(interaction: discord.Interaction, user: discord.User, page: int = 1, game: str = None, since: str = None, until: str = None):
+    await send_history(interaction, user, page, game, since, until)
+
+
+# Leaderboards
+@tree.command(name="leaderboard", description="Show the richest players or the biggest wins per game")
+@app_commands.describe(category="'richest' or a game name", window="day, week or all (big wins only)")
+async def leaderboard(interaction: discord.Interaction, category: str = "richest", window: str = "all"):
+    category, window = category.lower(), window.lower()
+    if category != "richest" and category not in PLAY_GAMES:
+        await interaction.response.send_message(f"⚠️ Category must be 'richest' or one of: {', '.join(PLAY_GAMES)}.", ephemeral=True)
+        return
+    if window != "all" and window not in WINDOWS:
+        await interaction.response.send_message(f"⚠️ Window must be 'all' or one of: {', '.join(WINDOWS)}.", ephemeral=True)
+        return
+
+    if category == "richest":
+        title = "🏆 Richest Players"
+        lines = [f"**{rank}.** <@{user_id}> — ${value}" for rank, (user_id, value) in enumerate(richest.top(), 1)]
+    else:
+        title = f"🏆 Biggest {category.title()} Wins ({'all time' if window == 'all' else 'last ' + window})"
+        entries = big_wins.top(category, WINDOWS.get(window))
+        lines = [f"**{rank}.** <@{user_id}> — +${net}" for rank, (net, _, user_id) in enumerate(entries, 1)]
+
+    embed = discord.Embed(title=title, description="\n".join(lines) or "Nobody here yet!", color=discord.Color.gold())
+    await interaction.response.send_message(embed=embed)
+
+
+# Batched rounds: one settlement, one ledger batch and one summary embed for the whole run
+async def settle_batch(interaction, hold, game, bet, batch, title, draws):
+    rounds = len(batch.payouts)
+    total = sum(batch.payouts)
+    await wallet.settle(hold, total)
+    log_transactions(interaction.user.id, game, bet, batch.payouts, batch.outcomes)
+    
+    net = total - bet * rounds
+    embed = discord.Embed(title=title, color=discord.Color.green() if net > 0 else discord.Color.red())
+    embed.add_field(name="🎯 Rounds", value=f"{rounds} × ${bet}", inline=True)
+    embed.add_field(name="🏆 Wins", value=f"{batch.wins} ({batch.wins / rounds:.0%})", inline=True)
+    embed.add_field(name="💰 Net", value=f"{'+' if net >= 0 else '-'}${abs(net)}", inline=True)
+    embed.set_footer(text=f"Balance: ${get_balance(interaction.user.id)} • 🔐 {draws.proof}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
 # Roll Dice game
 @tree.command(name="roll_dice", description="Roll a dice against the bot. If both rolls match, you win 3x your bet!")
-async def roll_dice(interaction: discord.Interaction, bet: int):
+@app_commands.describe(bet="Amount to bet per round", rounds=f"Play this many rounds in one go (1-{MAX_ROUNDS})")
+async def roll_dice(interaction: discord.Interaction, bet: int, rounds: int = 1):
     if bet <= 0 or bet > MAX_BET:
         await interaction.response.send_message(f"❌ Invalid bet amount! Must be between 1 and ${MAX_BET}.", ephemeral=True)
         return
+    if rounds < 1 or rounds > MAX_ROUNDS:
+        await interaction.response.send_message(f"❌ Rounds must be between 1 and {MAX_ROUNDS}.", ephemeral=True)
+        return
     
-    user_balance = get_balance(interaction.user.id)
-    if bet > user_balance:
+    # The whole batch is staked up front, so it either plays out completely or not at all
+    hold = await wallet.reserve(interaction.user.id, bet * rounds, key=interaction.id)
+    if hold is None:
         await interaction.response.send_message("❌ You don't have enough Redmont Dollars to place this bet!", ephemeral=True)
         return
     
-    user_roll = random.randint(1, 6)
-    bot_roll = random.randint(1, 6)
+    if rounds > 1:
+        draws = fair_rng.round("dice", 2 * rounds)
+        batch = dice_engine.play_many(bet, rounds, draws)
+        await settle_batch(interaction, hold, "dice", bet, batch, f"🎲 Roll Dice x{rounds} 🎲", draws)
+        return
+    
+    draws = fair_rng.round("dice")
+    roll = dice_engine.play(bet, draws)
+    await wallet.settle(hold, roll.payout)  # Stake back plus net gain on a win
+    log_transaction(interaction.user.id, "dice", bet, roll.payout, roll.outcome)
     
-    if user_roll == bot_roll:
-        winnings = bet * 2
-        update_balance(interaction.user.id, winnings-bet)  # Net gain
-        log_transaction(interaction.user.id, f"Rolled {user_roll}, Bot rolled {bot_roll}. Won ${winnings}")
-        result = f"🎉 You rolled a {user_roll}, and the bot rolled a {bot_roll}. You win **${winnings}**!"
+    if roll.outcome == "win":
+        result = f"🎉 You rolled a {roll.user_roll}, and the bot rolled a {roll.bot_roll}. You win **${roll.payout}**!"
     else:
-        update_balance(interaction.user.id, -bet)
-        log_transaction(interaction.user.id, f"Rolled {user_roll}, Bot rolled {bot_roll}. Lost ${bet}")
-        result = f"😞 You rolled a {user_roll}, and the bot rolled a {bot_roll}. You lose **${bet}**."
+        result = f"😞 You rolled a {roll.user_roll}, and the bot rolled a {roll.bot_roll}. You lose **${bet}**."
     
-    embed = discord.Embed(title="🎲 Roll Dice 🎲", description=result, color=discord.Color.green() if user_roll == bot_roll else discord.Color.red())
+    embed = discord.Embed(title="🎲 Roll Dice 🎲", description=result, color=discord.Color.green() if roll.outcome == "win" else discord.Color.red())
+    embed.set_footer(text=f"🔐 {draws.proof}")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 # Coinflip game
 @tree.command(name="coinflip", description="Flip a coin and bet on heads or tails")
-async def coinflip(interaction: discord.Interaction, bet: int, choice: str):
+@app_commands.describe(bet="Amount to bet per flip", choice="heads or tails", rounds=f"Flip this many times in one go (1-{MAX_ROUNDS})")
+async def coinflip(interaction: discord.Interaction, bet: int, choice: str, rounds: int = 1):
     user_id = interaction.user.id
-    if choice.lower() not in ["heads", "tails"]:
+    if choice.lower() not in coinflip_engine.SIDES:
         await interaction.response.send_message("⚠️ Choose either 'heads' or 'tails'!", ephemeral=True)
         return
     if bet <= 0 or bet > MAX_BET:
         await interaction.response.send_message(f"⚠️ Bet must be between 1 and {MAX_BET}!", ephemeral=True)
         return
-    if bet > get_balance(user_id):
+    if rounds < 1 or rounds > MAX_ROUNDS:
+        await interaction.response.send_message(f"⚠️ Rounds must be between 1 and {MAX_ROUNDS}!", ephemeral=True)
+        return
+    hold = await wallet.reserve(user_id, bet * rounds, key=interaction.id)
+    if hold is None:
         await interaction.response.send_message("💸 You don't have enough Redmont Dollars!", ephemeral=True)
         return
     
-    result = random.choice(["heads", "tails"])
-    embed = discord.Embed(title="🪙 Coin Flip 🪙", description=f"The coin landed on **{result}**!", color=discord.Color.orange())
+    if rounds > 1:
+        draws = fair_rng.round("coinflip", rounds)
+        batch = coinflip_engine.play_many(bet, choice, rounds, draws)
+        await settle_batch(interaction, hold, "coinflip", bet, batch, f"🪙 Coin Flip x{rounds} 🪙", draws)
+        return
+    
+    draws = fair_rng.round("coinflip")
+    flip = coinflip_engine.play(bet, choice, draws)
+    await wallet.settle(hold, flip.payout)  # Stake back plus net gain on a win
+    log_transaction(user_id, "coinflip", bet, flip.payout, flip.outcome)
+    embed = discord.Embed(title="🪙 Coin Flip 🪙", description=f"The coin landed on **{flip.result}**!", color=discord.Color.orange())
     
-    if result == choice.lower():
-        winnings = bet * 2
-        update_balance(user_id, winnings-bet)  # Net gain
-        log_transaction(user_id, f"Bet on {choice}, landed {result}. Won ${winnings}")
-        embed.add_field(name="🎉 You Win!", value=f"You won **${winnings}**!", inline=False)
+    if flip.outcome == "win":
+        embed.add_field(name="🎉 You Win!", value=f"You won **${flip.payout}**!", inline=False)
     else:
-        update_balance(user_id, -bet)
-        log_transaction(user_id, f"Bet on {choice}, landed {result}. Lost ${bet}")
         embed.add_field(name="😢 You Lost", value=f"You lost **${bet}**.", inline=False)
+    embed.set_footer(text=f"🔐 {draws.proof}")
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 # Blackjack game
-class BlackjackGame:
-    def __init__(self, user_id, bet):
-        self.user_id = user_id
-        self.bet = bet
-        self.player_hand = [random.randint(1, 11), random.randint(1, 11)]
-        self.bot_hand = [random.randint(1, 11), random.randint(1, 11)]
-        self.game_over = False
-
-    def hit(self):
-        self.player_hand.append(random.randint(1, 11))
-        if sum(self.player_hand) > 21:
-            self.game_over = True
-        return self.player_hand
-
-    def stand(self):
-        while sum(self.bot_hand) < 17:
-            self.bot_hand.append(random.randint(1, 11))
-        self.game_over = True
-        return self.bot_hand
-
-    def get_winner(self):
-        player_total = sum(self.player_hand)
-        bot_total = sum(self.bot_hand)
-        if player_total > 21:
-            return "bot"
-        elif bot_total > 21 or player_total > bot_total:
-            return "player"
-        elif player_total < bot_total:
-            return "bot"
-        else:
-            return "tie"
-
-games = {}
-
-class BlackjackView(discord.ui.View):
-    def __init__(self, user_id):
-        super().__init__()
-        self.user_id = user_id
-
-    @discord.ui.button(label="Hit", style=discord.ButtonStyle.primary)
-    async def hit_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        user_id = interaction.user.id
-        if user_id not in games:
-            await interaction.response.send_message("⚠️ No active blackjack game found!", ephemeral=True)
-            return
+BLACKJACK_TTL = 180  # Seconds between clicks before an unfinished hand expires
+MAX_SHOES = 5000  # Each player keeps their own shoe between hands; least recently used go first
+blackjack_shoes = OrderedDict()  # user id -> Shoe
+
+
+def blackjack_shoe(user_id):
+    shoe = blackjack_shoes.pop(user_id, None)
+    if shoe is None:
+        shoe = Shoe()
+    blackjack_shoes[user_id] = shoe
+    if len(blackjack_shoes) > MAX_SHOES:
+        blackjack_shoes.popitem(last=False)
+    # A full shoe shuffle from the provably fair pool, again whenever the seed it came
+    # from has been rotated out: once revealed, that seed would give away the whole order
+    if shoe.needs_shuffle or shoe.epoch != fair_rng.epoch:
+        shoe.shuffle(fair_rng.round("blackjack"))
+    return shoe
+
+
+def format_hand(cards):
+    return "[" + ", ".join(card_label(card) for card in cards) + "]"
 
-        game = games[user_id]
-        game.hit()
-        if game.game_over:
-            winner = game.get_winner()
-            result = "🎉 You win!" if winner == "player" else "😢 You lose." if winner == "bot" else "🤝 It's a tie!"
-            if winner == "player":
-                winnings = game.bet * 2
-                update_balance(user_id, winnings)
-                log_transaction(user_id, f"Blackjack win: +${winnings}")
-            else:
-                log_transaction(user_id, f"Blackjack loss: -${game.bet}")
-            del games[user_id]
-            for item in self.children:
-                item.disabled = True
-        else:
-            result = "Hit or Stand?"
-        
-        embed = discord.Embed(title="🃏 Blackjack 🃏", color=discord.Color.green())
-        embed.add_field(name="Your Hand", value=f"{game.player_hand} (Total: {sum(game.player_hand)})", inline=False)
-        embed.add_field(name="Bot's Hand", value=f"[{game.bot_hand[0]}, ?]", inline=False)
-        embed.add_field(name="Game Status", value=result, inline=False)
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="Stand", style=discord.ButtonStyle.danger)
-    async def stand_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        user_id = interaction.user.id
-        if user_id not in games:
-            await interaction.response.send_message("⚠️ No active blackjack game found!", ephemeral=True)
-            return
 
-        game = games[user_id]
-        game.stand()
-        winner = game.get_winner()
-        result = "🎉 You win!" if winner == "player" else "😢 You lose." if winner == "bot" else "🤝 It's a tie!"
-        if winner == "player":
-            winnings = game.bet * 2
-            update_balance(user_id, winnings)
-            log_transaction(user_id, f"Blackjack win: +${winnings}")
-        else:
-            log_transaction(user_id, f"Blackjack loss: -${game.bet}")
-        del games[user_id]
-        for item in self.children:
-            item.disabled = True
-        
-        embed = discord.Embed(title="🃏 Blackjack 🃏", color=discord.Color.green())
-        embed.add_field(name="Your Hand", value=f"{game.player_hand} (Total: {sum(game.player_hand)})", inline=False)
-        embed.add_field(name="Bot's Hand", value=f"{game.bot_hand} (Total: {sum(game.bot_hand)})", inline=False)
-        embed.add_field(name="Game Status", value=result, inline=False)
-        await interaction.response.edit_message(embed=embed, view=self)
+def blackjack_embed(game, status, reveal):
+    embed = discord.Embed(title="🃏 Blackjack 🃏", color=discord.Color.green())
+    embed.add_field(name="Your Hand", value=f"{format_hand(game.player_hand)} (Total: {game.player_total})", inline=False)
+    if reveal:
+        embed.add_field(name="Bot's Hand", value=f"{format_hand(game.bot_hand)} (Total: {game.bot_total})", inline=False)
+    else:
+        embed.add_field(name="Bot's Hand", value=f"[{card_label(game.bot_hand[0])}, ?]", inline=False)
+    embed.add_field(name="Game Status", value=status, inline=False)
+    shoe = game.shoe
+    embed.set_footer(text=f"🔐 Shoe shuffled with {shoe.shuffle_proof} • this hand: cards {game.first_card}-{shoe.position - 1} of {shoe.size}")
+    return embed
+
+
+# Settle a finished hand and return its status line
+async def finish_blackjack(user_id, game, hold):
+    await wallet.settle(hold, game.payout)
+    log_transaction(user_id, "blackjack", game.bet, game.payout, game.outcome)
+    winner = game.get_winner()
+    return "🎉 You win!" if winner == "player" else "😢 You lose." if winner == "bot" else "🤝 It's a tie!"
+
+
+def blackjack_buttons(session_id, disabled=False):
+    sid = encode_id(session_id)
+    return buttons(
+        GameButton("blackjack", "hit", sid, label="Hit", style=discord.ButtonStyle.primary, disabled=disabled),
+        GameButton("blackjack", "stand", sid, label="Stand", style=discord.ButtonStyle.danger, disabled=disabled),
+        GameButton("blackjack", "odds", sid, label="Show Odds", style=discord.ButtonStyle.secondary, disabled=disabled),
+    )
+
+
+async def blackjack_session(interaction, arg):
+    session = sessions.get(decode_id(arg))
+    if session is None or session.game != "blackjack" or session.user_id != interaction.user.id:
+        await interaction.response.send_message("⚠️ No active blackjack game found!", ephemeral=True)
+        return None
+    return session
+
+
+@action("blackjack", "hit")
+async def blackjack_hit(interaction: discord.Interaction, arg: str):
+    session = await blackjack_session(interaction, arg)
+    if session is None:
+        return
+
+    game = session.state
+    game.hit()
+    if game.game_over:
+        sessions.take(session.id)
+        result = await finish_blackjack(session.user_id, game, session.hold)
+    else:
+        sessions.touch(session, BLACKJACK_TTL)
+        result = "Hit or Stand?"
+    
+    view = blackjack_buttons(session.id, disabled=game.game_over)
+    await interaction.response.edit_message(embed=blackjack_embed(game, result, reveal=False), view=view)
+
+
+@action("blackjack", "stand")
+async def blackjack_stand(interaction: discord.Interaction, arg: str):
+    session = await blackjack_session(interaction, arg)
+    if session is None:
+        return
+
+    sessions.take(session.id)
+    game = session.state
+    game.stand()
+    result = await finish_blackjack(session.user_id, game, session.hold)
+    
+    view = blackjack_buttons(session.id, disabled=True)
+    await interaction.response.edit_message(embed=blackjack_embed(game, result, reveal=True), view=view)
+
+@action("blackjack", "odds")
+async def blackjack_odds(interaction: discord.Interaction, arg: str):
+    session = await blackjack_session(interaction, arg)
+    if session is None:
+        return
+
+    odds = session.state.odds()  # Dealer outcome table lookup for this shoe; the hole card stays hidden
+    await interaction.response.send_message(
+        f"📊 If you stand: win **{odds['win']:.0%}** • tie **{odds['push']:.0%}** • lose **{odds['lose']:.0%}**\n"
+        f"🃏 If you hit: **{odds['bust_on_hit']:.0%}** chance to bust",
+        ephemeral=True,
+    )
+
 
 @tree.command(name="blackjack", description="Play a game of blackjack against the bot")
 async def blackjack(interaction: discord.Interaction, bet: int):
@@ -268,28 +729,244 @@ async def blackjack(interaction: discord.Interaction, bet: int):
     if bet <= 0 or bet > MAX_BET:
         await interaction.response.send_message(f"⚠️ Bet must be between 1 and {MAX_BET}!", ephemeral=True)
         return
-    if bet > get_balance(user_id):
+    hold = await wallet.reserve(user_id, bet, key=interaction.id)
+    if hold is None:
         await interaction.response.send_message("💸 You don't have enough Redmont Dollars!", ephemeral=True)
         return
 
-    games[user_id] = BlackjackGame(user_id, bet)
-    game = games[user_id]
-    update_balance(user_id, -bet)
-    
-    embed = discord.Embed(title="🃏 Blackjack 🃏", color=discord.Color.green())
-    embed.add_field(name="Your Hand", value=f"{game.player_hand} (Total: {sum(game.player_hand)})", inline=False)
-    embed.add_field(name="Bot's Hand", value=f"[{game.bot_hand[0]}, ?]", inline=False)
-    embed.add_field(name="Game Status", value="Hit or Stand?", inline=False)
+    previous = sessions.latest(user_id, "blackjack")
+    if previous is not None:
+        await sessions.expire(previous)  # A new hand replaces the unfinished one, which is stood first
+
+    game = blackjack_engine.BlackjackGame(bet, shoe=blackjack_shoe(user_id))
+    session = await open_session(user_id, "blackjack", hold, game, ttl=BLACKJACK_TTL)
+    if session is None:
+        await interaction.response.send_message(SESSIONS_FULL, ephemeral=True)
+        return
+    embed = blackjack_embed(game, "Hit or Stand?", reveal=False)
     
-    view = BlackjackView(user_id)
+    view = blackjack_buttons(session.id)
     await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
 
+# Provably fair seeds
+@tree.command(name="fairness", description="Show the current server seed hash and the revealed seeds")
+async def fairness(interaction: discord.Interaction):
+    embed = discord.Embed(title="🔐 Provably Fair", color=discord.Color.blurple())
+    embed.add_field(
+        name=f"Current epoch {fair_rng.epoch}",
+        value=f"Seed hash `{fair_rng.seed_hash}`\nRotates <t:{int(fair_rng.started + fair_rng.rotate_seconds)}:R>",
+        inline=False,
+    )
+    for entry in fair_rng.revealed[:5]:
+        embed.add_field(name=f"Epoch {entry['epoch']} (revealed)", value=f"Seed `{entry['seed']}`", inline=False)
+    embed.set_footer(text="Every result shows its draws; replay them with: python rng.py --seed <seed> --game <game> --start <first draw> --count <n>")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@tree.command(name="fairness_rotate", description="Reveal the current server seed and start a new one (Admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+async def fairness_rotate(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True, thinking=True)  # Open hands are settled first
+    revealed = await rotate_fairness()
+    await interaction.followup.send(
+        f"🔐 Epoch {revealed['epoch']} seed revealed: `{revealed['seed']}`\nNew seed hash: `{fair_rng.seed_hash}`",
+        ephemeral=True,
+    )
+
+
+# Reveal the running seed and commit to a new one. Nothing that seed decided may still
+# be in play once it is public, and nothing here yields to the event loop until that
+# holds: open blackjack hands are stood (the result is fixed before the reveal and paid
+# right after), highlow rounds get their hidden next card redrawn from the new seed,
+# and every shoe is dropped so the next hand shuffles a new one.
+async def rotate_fairness():
+    stood = []
+    for session in sessions.live("blackjack"):
+        sessions.take(session.id)
+        if not session.state.game_over:
+            session.state.stand()
+        stood.append(session)
+    revealed = fair_rng.rotate()
+    blackjack_shoes.clear()
+    for session in sessions.live("highlow"):
+        card, _ = session.state
+        session.state = (card, fair_rng.round("highlow", 1))  # Just the next card
+    for session in stood:
+        result = await finish_blackjack(session.user_id, session.state, session.hold)
+        notify_user(session.user_id, f"🃏 Your unfinished blackjack hand was stood for the fairness seed rotation. {result}")
+    return revealed
+
+
+async def rotate_seeds():
+    while True:
+        await asyncio.sleep(60)
+        if fair_rng.due:
+            revealed = await rotate_fairness()
+            print(f"🔐 Revealed seed for epoch {revealed['epoch']}; now committed to {fair_rng.seed_hash}.")
+
+
+# Logs the stack whenever something blocks the event loop for longer than LOOP_STALL_MS
+LOOP_STALL_MS = int(os.getenv("LOOP_STALL_MS", "250"))
+MAX_PROFILE_SECONDS = 120
+PROFILING = os.getenv("PROFILING", "1") != "0"  # 0 leaves /profile off (the loop watchdog still runs)
+loop_watchdog = LoopWatchdog(threshold=LOOP_STALL_MS / 1000, on_lag=metrics.LOOP_LAG_SECONDS.observe)
+profiler = None  # Created in on_ready, once the loop thread is known
+
+
+@tree.command(name="profile", description="Sample the event loop for a while and upload a flamegraph dump (Admin only)")
+@app_commands.describe(seconds=f"How long to sample (1-{MAX_PROFILE_SECONDS})")
+@app_commands.checks.has_permissions(administrator=True)
+async def profile(interaction: discord.Interaction, seconds: int = 10):
+    if profiler is None:
+        await interaction.response.send_message("⚠️ Profiling is disabled in this deployment.", ephemeral=True)
+        return
+    if profiler.running:
+        await interaction.response.send_message("⚠️ A profile is already running.", ephemeral=True)
+        return
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    path, samples, hottest = await profiler.profile(seconds)
+    lines = [f"🔬 {samples} samples over {seconds}s, saved to `{path}`.",
+             f"🐢 Loop stalls over {LOOP_STALL_MS} ms so far: {loop_watchdog.stalls} (worst lag {loop_watchdog.worst * 1000:.0f} ms)"]
+    if hottest:
+        lines.append("Busiest frames:")
+        lines += [f"`{count:>5}` {frame}" for frame, count in hottest]
+    else:
+        lines.append("The loop was idle the whole time.")
+    await interaction.followup.send("\n".join(lines), file=discord.File(path), ephemeral=True)
+
+
+# Theoretical RTP of the fixed-odds games, simulated once off the event loop
+async def measure_expected_rtp():
+    if not game_stats.expected:
+        results = await asyncio.to_thread(
+            lambda: [simulator.measure(game, EXPECTED_RTP_ROUNDS, seed=0) for game in analytics.FIXED_ODDS_GAMES])
+        game_stats.set_expected(results)
+
+
+# Warn when a game's payouts over the last hour drift from its theoretical RTP
+async def watch_payouts():
+    await measure_expected_rtp()
+    flagged = set()
+    while True:
+        anomalies = {row["game"]: row for row in game_stats.anomalies("1h")}
+        for game in anomalies.keys() - flagged:
+            row = anomalies[game]
+            print(f"🚨 {game} paid back {row['rtp']:.1%} of ${row['handle']} over the last hour "
+                  f"(expected {row['expected_rtp']:.1%}, z={row['z']:+.1f}, {row['rounds']} rounds).")
+        flagged = set(anomalies)
+        await asyncio.sleep(PAYOUT_CHECK_INTERVAL)
+
+
+@tree.command(name="stats", description="Per-game RTP, house profit and big wins over a rolling window (Admin only)")
+@app_commands.describe(window="How far back to look")
+@app_commands.choices(window=[app_commands.Choice(name=name, value=name) for name in analytics.WINDOWS])
+@app_commands.checks.has_permissions(administrator=True)
+async def stats(interaction: discord.Interaction, window: str = "24h"):
+    await measure_expected_rtp()  # Instant after the first time
+    rows = game_stats.summary(window)
+    handle = sum(row["handle"] for row in rows)
+    house = sum(row["house"] for row in rows)
+    anomalous = any(row["anomaly"] for row in rows)
+    description = (f"Handle ${handle} · House {'+' if house >= 0 else '-'}${abs(house)}" if rows
+                   else "No rounds settled in this window.")
+    if anomalous:
+        description += f"\n🚨 = payouts far from the theoretical RTP (|z| ≥ {analytics.ANOMALY_Z:g})"
+    embed = discord.Embed(title=f"📊 Game Stats (last {window})", description=description,
+                          color=discord.Color.red() if anomalous else discord.Color.blurple())
+    for row in rows:
+        expected = f" (expected {row['expected_rtp']:.1%})" if row["expected_rtp"] is not None else ""
+        embed.add_field(
+            name=f"{'🚨 ' if row['anomaly'] else ''}{row['game'].title()}",
+            value=(f"RTP **{row['rtp']:.1%}**{expected} · Hit rate {row['hit_rate']:.1%}\n"
+                   f"{row['rounds']} rounds · Handle ${row['handle']} · Paid ${row['payout']}\n"
+                   f"House {'+' if row['house'] >= 0 else '-'}${abs(row['house'])} · "
+                   f"{row['big_wins']} big win(s) (≥{analytics.BIG_WIN_MULTIPLE}x)"),
+            inline=False,
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+# Ledger/balance exports are built by export.py in a fresh interpreter: nothing of this
+# process (its threads, locks, the gateway connection) is inherited, and only the path
+# of the finished file comes back. One export runs at a time.
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "export.py")
+export_lock = asyncio.Lock()
+export_process = None
+
+
+# Returns (path, seconds); raises RuntimeError if the export process fails
+async def run_export(fmt, count, user_ids, amounts, since):
+    global export_process
+    os.makedirs(export.EXPORT_DIR, exist_ok=True)
+    balances_path = os.path.join(export.EXPORT_DIR, f"balances-{os.getpid()}-{time.monotonic_ns()}.npz")
+    await asyncio.to_thread(np.savez, balances_path, user_ids=user_ids, amounts=amounts)
+    args = [sys.executable, EXPORT_SCRIPT, fmt, "--ledger", LEDGER_FILE, "--count", str(count),
+            "--balances", balances_path, "--directory", export.EXPORT_DIR]
+    if since is not None:
+        args += ["--since", str(since)]
+    try:
+        export_process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await export_process.communicate()
+    finally:
+        export_process = None
+        os.remove(balances_path)
+    lines = stdout.decode().strip().splitlines()
+    if not lines:
+        error = stderr.decode().strip().splitlines()
+        raise RuntimeError(error[-1] if error else "the export process exited without output")
+    result = json.loads(lines[-1])
+    return result["path"], result["seconds"]
+
+
+@tree.command(name="export", description="Export the ledger, balances and per-game/per-day totals (Admin only)")
+@app_commands.describe(format="xlsx workbook or a zip of CSV files", days="Only the last N days of transactions (default: all)")
+@app_commands.choices(format=[app_commands.Choice(name=name, value=name) for name in export.FORMATS])
+@app_commands.checks.has_permissions(administrator=True)
+async def export_data(interaction: discord.Interaction, format: str = "xlsx", days: int = 0):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    async with export_lock:
+        count = len(ledger.view())  # Flushes buffered records so the export process sees them
+        user_ids, amounts = balances.arrays()
+        since = time.time() - days * 86400 if days > 0 else None
+        try:
+            path, seconds = await run_export(format, count, user_ids, amounts, since)
+        except RuntimeError as e:
+            await interaction.followup.send(f"⚠️ Export failed: {e}", ephemeral=True)
+            return
+
+    # `path` is this export's own file: it is uploaded and removed here, or left on the
+    # server only when it is too large to upload
+    keep = False
+    try:
+        size = os.path.getsize(path)
+        limit = interaction.guild.filesize_limit if interaction.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        scope = f"transactions from the last {days} days" if days > 0 else f"all {count} ledger records"
+        summary = f"📤 Exported {scope} and {len(user_ids)} balances in {seconds:.1f}s ({size / 1e6:.1f} MB)."
+        if size > limit:
+            keep = True
+            await interaction.followup.send(f"{summary}\nToo large to upload here, saved on the server as `{path}`.", ephemeral=True)
+            return
+        await interaction.followup.send(summary, file=discord.File(path), ephemeral=True)
+    finally:
+        if not keep:
+            os.remove(path)
+
+
 # Graceful shutdown function
 def handle_shutdown():
     print("🔴 Saving data before shutdown...")
-    save_data(BALANCES_FILE, balances)
-    save_data(TRANSACTIONS_FILE, transactions)
+    if storage is not None:  # The coordinator saves balances in a sharded deployment
+        storage.flush_sync()
+        storage.close()
+    review_queue.snapshots.flush_sync()
+    outbound.snapshots.flush_sync()
+    sessions.close()
+    ledger.close()
+    if export_process is not None and export_process.returncode is None:
+        export_process.kill()
     print("✅ Data saved successfully. Bot is shutting down.")
 
 
@@ -298,70 +975,274 @@ def handle_shutdown():
 @app_commands.checks.has_permissions(administrator=True)
 async def shutdown(interaction: discord.Interaction):
     await interaction.response.send_message("🔴 Shutting down the bot safely...", ephemeral=True)
-    handle_shutdown()
-    await bot.close()
+    await shut_down()
+
+
+# /shutdown, SIGTERM (deploys, process managers) and Ctrl+C all end the same way:
+# unfinished rounds are closed by policy, everything is saved, then the bot disconnects
+async def shut_down():
+    global shutting_down
+    if shutting_down:
+        return
+    shutting_down = True
+    try:
+        expired = await sessions.expire_all()  # Nobody can finish these rounds after the restart
+        print(f"⌛ Closed {expired} unfinished game(s).")
+    finally:
+        handle_shutdown()  # Rounds left open stay in the session journal for the next start
+        await bot.close()
+
+
+shutting_down = False
+
+
+def install_signal_handlers():
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: loop.create_task(shut_down(), name="shut_down"))
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still stops the bot, without the drain
 
 
 # Auto-save task
 async def auto_save_data():
     while True:
         await asyncio.sleep(3)
-        save_data(BALANCES_FILE, balances)
-        save_data(TRANSACTIONS_FILE, transactions)
+        try:
+            started = time.perf_counter()
+            if await storage.flush():  # Skips idle cycles; one batched write off the event loop
+                elapsed = time.perf_counter() - started
+                metrics.FLUSH_SECONDS.labels(storage.name).observe(elapsed)
+                if elapsed * 1000 > LOOP_STALL_MS:
+                    print(f"🐢 Auto-save took {elapsed * 1000:.0f} ms ({storage.name} backend).")
+        except Exception as e:
+            print(f"⚠️ Auto-save failed: {e}")
 
 
 # Run the bot
 @bot.event
 async def on_ready():
-    global balances, transactions  # Ensure global variables are updated
+    # on_ready fires again after every gateway reconnect. State is loaded once at
+    # startup and the background tasks are already running, so there is nothing to redo.
+    global started_up
+    if started_up:
+        print(f"🔁 Reconnected as {bot.user}")
+        return
+    started_up = True
+    startup_phase("connect")
 
-    # Load balances
-    loaded_balances = load_data(BALANCES_FILE)
-    if isinstance(loaded_balances, dict):
-        balances.update(loaded_balances)  # Use update() instead of replacing the dict
-        print("✅ Balances successfully loaded from file.")
-    else:
-        print("⚠️ Balances failed to load. Using default empty dictionary.")
+    print(f"✅ {len(balances)} balances and {ledger.count} transactions in memory.")
+    await sync_commands()
+    startup_phase("command sync")
+    print(f'✅ Logged in as {bot.user}')
 
-    # Load transactions
-    loaded_transactions = load_data(TRANSACTIONS_FILE)
-    if isinstance(loaded_transactions, dict):
-        transactions.update(loaded_transactions)
-        print("✅ Transactions successfully loaded from file.")
+    # Named, so a stall report says which task was holding the loop
+    if storage is not None:
+        bot.loop.create_task(auto_save_data(), name="auto_save_data")  # Start auto-save task
+        bot.loop.create_task(ledger.run_group_commit(), name="ledger_group_commit")  # Batched ledger fsyncs
+    bot.loop.create_task(sessions.run_expiry(), name="session_expiry")  # Close abandoned rounds by their game's policy
+    bot.loop.create_task(outbound.run(), name="outbound_queue")  # Throttled DMs and staff message edits
+    bot.loop.create_task(rotate_seeds(), name="rotate_seeds")  # Daily provably fair seed rotation
+    bot.loop.create_task(watch_payouts(), name="watch_payouts")  # Flag games paying far off their RTP
+    start_profiling()
+    if len(review_queue):
+        print(f"📋 {len(review_queue)} deposit/withdrawal request(s) waiting for staff review.")
+    await start_metrics_server()
+    print(startup_report())
+
+
+started_up = False
+
+
+# Before the gateway connects: join the coordinator (sharded deployment) so the balance
+# cache is filled before the first interaction arrives, then close the rounds a crash
+# or kill left open, so no new round starts before they are settled
+async def setup_bot():
+    if coordinator is not None:
+        await coordinator.start()
+        startup_phase("coordinator")
+    recovered = await sessions.recover()
+    if recovered:
+        print(f"♻️ Closed {recovered} game(s) left open by the last run.")
+    install_signal_handlers()
+
+bot.setup_hook = setup_bot
+
+
+# Hash of everything Discord knows about our commands (names, options, permissions...)
+def command_signature():
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda command: command["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Push the global command set only when it changed since the last successful sync.
+# A global sync is rate limited and slow; most restarts don't touch any command.
+# Set FORCE_COMMAND_SYNC=1 to push anyway (e.g. after editing commands in the portal).
+async def sync_commands():
+    if CLUSTER_ID != 0:
+        return  # Commands are global: bot process 0 syncs them for the whole deployment
+    signature = {"application_id": bot.application_id, "hash": command_signature()}
+    unchanged = os.path.exists(COMMAND_SYNC_FILE) and load_data(COMMAND_SYNC_FILE) == signature
+    if unchanged and os.getenv("FORCE_COMMAND_SYNC") != "1":
+        print("✅ Slash commands unchanged, skipped sync.")
+        return
+    synced = await tree.sync()
+    save_data(COMMAND_SYNC_FILE, signature)
+    print(f"✅ Synced {len(synced)} slash commands.")
+
+
+# Watchdog and profiler sample the thread running bot.loop (on_ready runs on it)
+def start_profiling():
+    global profiler
+    loop_watchdog.start(bot.loop)  # No-op after a reconnect
+    if profiler is None and PROFILING:
+        profiler = SamplingProfiler(loop_watchdog.thread_id)
+
+
+# Once per process: on_ready fires again after every reconnect
+async def start_metrics_server():
+    global metrics_server
+    if metrics_server is not None or not METRICS_PORT:
+        return
+    try:
+        metrics_server = await metrics.serve(METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started: {e}")
+        return
+    print(f"📈 Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+
+# Live state, read when Prometheus scrapes
+if storage is not None:
+    ledger.on_sync = metrics.FLUSH_SECONDS.labels("ledger").observe
+metrics.registry.gauge("casino_live_sessions", "Unfinished game rounds", lambda: sessions.stats()["live_by_game"], ["game"])
+metrics.registry.gauge("casino_outbound_pending", "Queued DMs and staff message edits", lambda: len(outbound))
+metrics.registry.gauge("casino_outbound_results", "Outbound notifications by result since start", lambda: outbound.stats(), ["result"])
+metrics.registry.gauge("casino_review_pending", "Deposits/withdrawals waiting for staff", lambda: len(review_queue))
+metrics.registry.gauge("casino_ledger_unsynced", "Ledger records waiting for fsync", lambda: ledger.pending)
+metrics.registry.gauge("casino_balances", "Users with a balance", lambda: len(balances))
+metrics.registry.gauge("casino_rate_buckets", "Token buckets in use", lambda: len(admission))
+metrics.registry.gauge("casino_game_rtp", "Paid back per unit staked over the last hour",
+                       lambda: {row["game"]: row["rtp"] for row in game_stats.summary("1h")}, ["game"])
+metrics.registry.gauge("casino_loop_lag_smoothed_seconds", "Event loop lag used for load shedding", lambda: loop_watchdog.lag)
+
+
+# Deposits and withdrawals wait in a persisted queue until staff decide them, either
+# with the buttons on the staff message or in bulk with /review_approve and /review_reject.
+# DMs and staff message edits go out through the throttled outbound queue.
+review_queue = ReviewQueue(REVIEW_QUEUE_FILE)
+
+
+async def deliver(notification):
+    if notification.kind == "dm":
+        user = bot.get_user(notification.target) or await bot.fetch_user(notification.target)
+        await user.send(notification.content)
     else:
-        print("⚠️ Transactions failed to load. Using default empty dictionary.")
+        channel_id, message_id = notification.target
+        channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+        await channel.get_partial_message(message_id).edit(content=notification.content, view=None)
 
-    await bot.tree.sync()
-    print(f'✅ Logged in as {bot.user}')
-    
-    bot.loop.create_task(auto_save_data())  # Start auto-save task
 
+outbound = OutboundQueue(deliver, OUTBOUND_FILE)
 
-#Deposit accept/reject
-class DepositView(discord.ui.View):
-    def __init__(self, user: discord.User, amount: int):
-        super().__init__(timeout=None)
-        self.user = user
-        self.amount = amount
 
-    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success)
-    async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not interaction.user.guild_permissions.manage_guild:
-            await interaction.response.send_message("⛔ You don't have permission to do this.", ephemeral=True)
-            return
+def notify_user(user_id, content):
+    outbound.dm(user_id, content)
 
-        update_balance(self.user.id, self.amount)
-        await interaction.response.edit_message(content=f"✅ Deposit of ${self.amount} accepted for {self.user.mention}.", view=None)
-        await self.user.send(f"✅ Your deposit of ${self.amount} has been **accepted**!")
 
-    @discord.ui.button(label="Reject", style=discord.ButtonStyle.danger)
-    async def reject(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not interaction.user.guild_permissions.manage_guild:
-            await interaction.response.send_message("⛔ You don't have permission to do this.", ephemeral=True)
-            return
+# Staff message line and user DM for a decided request
+def review_messages(request, approved):
+    mention = f"<@{request.user_id}>"
+    if request.kind == "deposit" and approved:
+        return (f"✅ Deposit of ${request.amount} accepted for {mention}.",
+                f"✅ Your deposit of ${request.amount} has been **accepted**!")
+    if request.kind == "deposit":
+        return (f"❌ Deposit of ${request.amount} rejected for {mention}.",
+                f"❌ Your deposit of ${request.amount} has been **rejected**.")
+    if approved:
+        return (f"✅ Withdrawal of ${request.amount} approved for {mention}.",
+                f"✅ Your withdrawal of ${request.amount} has been **approved**!\nIn-game name: `{request.ign}`")
+    return (f"❌ Withdrawal of ${request.amount} rejected for {mention}.",
+            f"❌ Your withdrawal of ${request.amount} has been **rejected**.")
+
+
+def close_review_message(request, content):
+    if request.message_id is None:
+        return
+    outbound.edit(request.channel_id, request.message_id, content)
+
+
+# Apply decisions for requests already taken off the queue. Every balance change lands in
+# one ledger batch; withdrawals the user can no longer cover go back to the queue.
+# Returns (decided, failed).
+async def decide_reviews(requests, approved, edit_messages=True):
+    decided, failed, rows = [], [], []
+    for request in requests:
+        if approved and request.kind == "withdrawal":
+            if not await wallet.debit(request.user_id, request.amount, key=f"withdrawal:{request.id}"):
+                review_queue.restore(request)
+                failed.append(request)
+                continue
+            rows.append((request.user_id, "withdrawal", request.amount, 0, "debit", get_balance(request.user_id)))
+        elif approved:
+            await wallet.credit(request.user_id, request.amount, key=f"deposit:{request.id}")
+            rows.append((request.user_id, "deposit", 0, request.amount, "credit", get_balance(request.user_id)))
+        decided.append(request)
+    if rows:
+        log_rows(rows)
+    await review_queue.save()
+
+    for request in decided:
+        staff_text, dm_text = review_messages(request, approved)
+        if edit_messages:
+            close_review_message(request, staff_text)
+        notify_user(request.user_id, dm_text)
+    return decided, failed
+
+
+def review_buttons(request):
+    return buttons(
+        GameButton("review", "accept", str(request.id), label="Accept", style=discord.ButtonStyle.success),
+        GameButton("review", "reject", str(request.id), label="Reject", style=discord.ButtonStyle.danger),
+    )
+
+
+async def review_button(interaction: discord.Interaction, arg: str, approved: bool):
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.response.send_message("⛔ You don't have permission to do this.", ephemeral=True)
+        return
+
+    request = review_queue.take(int(arg)) if arg.isdigit() else None
+    if request is None:
+        await interaction.response.send_message("⚠️ This request was already processed.", ephemeral=True)
+        return
+
+    decided, failed = await decide_reviews([request], approved, edit_messages=False)
+    if failed:
+        await interaction.response.send_message(f"❌ <@{request.user_id}> no longer has ${request.amount} to withdraw.", ephemeral=True)
+        return
+    staff_text, _ = review_messages(request, approved)
+    await interaction.response.edit_message(content=staff_text, view=None)
+
+
+@action("review", "accept")
+async def review_accept(interaction: discord.Interaction, arg: str):
+    await review_button(interaction, arg, approved=True)
+
+
+@action("review", "reject")
+async def review_reject_button(interaction: discord.Interaction, arg: str):
+    await review_button(interaction, arg, approved=False)
+
+
+# Post a new request to the staff channel and remember the message
+async def submit_review(guild, request, embed):
+    staff_channel = guild.get_channel(STAFF_CHANNEL_ID)
+    message = await staff_channel.send(content=f"Request #{request.id}", embed=embed, view=review_buttons(request))
+    review_queue.attach(request, staff_channel.id, message.id)
+    await review_queue.save()
 
-        await interaction.response.edit_message(content=f"❌ Deposit of ${self.amount} rejected for {self.user.mention}.", view=None)
-        await self.user.send(f"❌ Your deposit of ${self.amount} has been **rejected**.")
 
 @bot.tree.command(name="deposit", description="Submit a deposit request with proof")
 @app_commands.describe(amount="Amount to deposit", proof="Upload a screenshot as proof")
@@ -375,39 +1256,12 @@ async def deposit(interaction: discord.Interaction, amount: int, proof: discord.
     embed.add_field(name="Amount", value=f"${amount}", inline=False)
     embed.set_image(url=proof.url)
 
-    staff_channel = interaction.guild.get_channel(STAFF_CHANNEL_ID)
-    await staff_channel.send(embed=embed, view=DepositView(interaction.user, amount))
+    request = review_queue.submit("deposit", interaction.user.id, amount, proof_url=proof.url)
+    await submit_review(interaction.guild, request, embed)
 
     await interaction.response.send_message("✅ Your deposit request has been submitted for review.", ephemeral=True)
 
 
-#Withdrawal accept/reject
-class WithdrawalView(discord.ui.View):
-    def __init__(self, user: discord.User, amount: int, ign: str):
-        super().__init__(timeout=None)
-        self.user = user
-        self.amount = amount
-        self.ign = ign
-
-    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success)
-    async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not interaction.user.guild_permissions.manage_guild:
-            await interaction.response.send_message("⛔ You don't have permission to do this.", ephemeral=True)
-            return
-
-        update_balance(self.user.id, -self.amount)
-        await interaction.response.edit_message(content=f"✅ Withdrawal of ${self.amount} approved for {self.user.mention}.", view=None)
-        await self.user.send(f"✅ Your withdrawal of ${self.amount} has been **approved**!\nIn-game name: `{self.ign}`")
-
-    @discord.ui.button(label="Reject", style=discord.ButtonStyle.danger)
-    async def reject(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not interaction.user.guild_permissions.manage_guild:
-            await interaction.response.send_message("⛔ You don't have permission to do this.", ephemeral=True)
-            return
-
-        await interaction.response.edit_message(content=f"❌ Withdrawal of ${self.amount} rejected for {self.user.mention}.", view=None)
-        await self.user.send(f"❌ Your withdrawal of ${self.amount} has been **rejected**.")
-
 @bot.tree.command(name="withdraw", description="Submit a withdrawal request")
 @app_commands.describe(amount="Amount to withdraw", ign="Your in-game name")
 async def withdraw(interaction: discord.Interaction, amount: int, ign: str):
@@ -428,181 +1282,297 @@ async def withdraw(interaction: discord.Interaction, amount: int, ign: str):
     embed.add_field(name="Amount", value=f"${amount}", inline=False)
     embed.add_field(name="IGN", value=ign, inline=False)
 
-    staff_channel = interaction.guild.get_channel(STAFF_CHANNEL_ID)
-    await staff_channel.send(embed=embed, view=WithdrawalView(interaction.user, amount, ign))
+    request = review_queue.submit("withdrawal", interaction.user.id, amount, ign=ign)
+    await submit_review(interaction.guild, request, embed)
 
     await interaction.followup.send("✅ Your withdrawal request has been submitted for review.", ephemeral=True)
 
 
+REVIEW_LIST_LIMIT = 20
+
+
+# "all" or a list of request numbers such as "3, 7 12"
+def parse_request_ids(text):
+    if text.strip().lower() == "all":
+        return None
+    ids = text.replace(",", " ").replace("#", " ").split()
+    if not ids or not all(part.isdigit() for part in ids):
+        raise ValueError
+    return [int(part) for part in ids]
+
+
+@tree.command(name="review_pending", description="List pending deposit and withdrawal requests (Staff only)")
+@app_commands.describe(kind="Only deposits or withdrawals")
+@app_commands.choices(kind=[app_commands.Choice(name="deposit", value="deposit"), app_commands.Choice(name="withdrawal", value="withdrawal")])
+@app_commands.checks.has_permissions(manage_guild=True)
+async def review_pending(interaction: discord.Interaction, kind: str = None):
+    pending = review_queue.pending(kind)
+    if not pending:
+        await interaction.response.send_message("📭 No pending requests.", ephemeral=True)
+        return
+    lines = []
+    for request in pending[:REVIEW_LIST_LIMIT]:
+        line = f"**#{request.id}** {request.kind} • <@{request.user_id}> • ${request.amount}"
+        if request.ign:
+            line += f" • IGN `{request.ign}`"
+        lines.append(line)
+    if len(pending) > REVIEW_LIST_LIMIT:
+        lines.append(f"… and {len(pending) - REVIEW_LIST_LIMIT} more")
+    embed = discord.Embed(title=f"📋 Pending Requests ({len(pending)})", description="\n".join(lines), color=discord.Color.gold())
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def bulk_review(interaction, requests, kind, approved):
+    try:
+        ids = parse_request_ids(requests)
+    except ValueError:
+        await interaction.response.send_message("⚠️ Give request numbers like `3, 7, 12` or `all`.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    if ids is None:
+        ids = [request.id for request in review_queue.pending(kind)]
+    taken = []
+    for request_id in ids:
+        request = review_queue.get(request_id)
+        if request is not None and (kind is None or request.kind == kind):
+            taken.append(review_queue.take(request_id))
+    decided, failed = await decide_reviews(taken, approved)
+
+    verb = "approved" if approved else "rejected"
+    total = sum(request.amount for request in decided)
+    text = f"✅ {len(decided)} request(s) {verb} (${total})."
+    if failed:
+        text += "\n❌ Left pending, balance too low: " + ", ".join(f"#{request.id}" for request in failed)
+    skipped = len(ids) - len(taken)
+    if skipped:
+        text += f"\n⚠️ {skipped} request(s) were not pending."
+    await interaction.followup.send(text, ephemeral=True)
+
+
+@tree.command(name="review_approve", description="Approve pending requests in bulk (Staff only)")
+@app_commands.describe(requests="Request numbers (e.g. 3, 7, 12) or 'all'", kind="Only deposits or withdrawals")
+@app_commands.choices(kind=[app_commands.Choice(name="deposit", value="deposit"), app_commands.Choice(name="withdrawal", value="withdrawal")])
+@app_commands.checks.has_permissions(manage_guild=True)
+async def review_approve(interaction: discord.Interaction, requests: str, kind: str = None):
+    await bulk_review(interaction, requests, kind, approved=True)
+
+
+@tree.command(name="review_reject", description="Reject pending requests in bulk (Staff only)")
+@app_commands.describe(requests="Request numbers (e.g. 3, 7, 12) or 'all'", kind="Only deposits or withdrawals")
+@app_commands.choices(kind=[app_commands.Choice(name="deposit", value="deposit"), app_commands.Choice(name="withdrawal", value="withdrawal")])
+@app_commands.checks.has_permissions(manage_guild=True)
+async def review_reject(interaction: discord.Interaction, requests: str, kind: str = None):
+    await bulk_review(interaction, requests, kind, approved=False)
+
+
 #Slots games
-EMOJIS = ["🍒", "🍋", "🍉", "⭐", "🔔", "🍇"]
-class SlotsView(discord.ui.View):
-    def __init__(self, user: discord.User, bet: int, multiplier: float, message: discord.Message):
-        super().__init__(timeout=60)
-        self.user = user
-        self.bet = bet
-        self.multiplier = multiplier
-        self.message = message
-
-    @discord.ui.button(label="Play Again", style=discord.ButtonStyle.primary)
-    async def play_again(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user.id:
-            await interaction.response.send_message("⚠️ This button isn't for you!", ephemeral=True)
-            return
+MAX_AUTO_SPINS = 100
+SPIN_FRAMES = 3
+SPIN_FRAME_DELAY = 0.4
+slot_animations = AnimationScheduler()  # Drops spin frames when a response's edit bucket is hot
 
-        balance = get_balance(self.user.id)
-        if balance < self.bet:
-            await interaction.response.send_message("❌ Not enough Redmont Dollars to play again.", ephemeral=True)
-            return
 
-        await interaction.response.defer()  # Acknowledge button press
+# Animate one spin on `message`, settle it, and return the result text and next multiplier
+async def run_slots_spin(message, bucket, user_id, bet, multiplier, hold):
+    frames = [f"🎰 {' | '.join(slots_engine.spinning_frame())}" for _ in range(SPIN_FRAMES)]
+    await slot_animations.play(bucket, message, frames, SPIN_FRAME_DELAY)
+
+    draws = fair_rng.round("slots")
+    spin = slots_engine.spin(bet, multiplier, draws)
+    await wallet.settle(hold, spin.payout)  # Stake back plus winnings on a win
+    log_transaction(user_id, "slots", bet, spin.payout, spin.outcome)
+
+    result_str = " | ".join(spin.reels)
+    if spin.outcome == "win":
+        text = f"🎉 You won! You got **{result_str}**\n💵 You earned **${spin.winnings}** Redmont Dollars!"
+    else:
+        text = f"😢 You lost. You got **{result_str}**\nBetter luck next time!"
+    return f"{text}\n-# 🔐 {draws.proof}", spin.next_multiplier
+
+
+# Turbo mode: play `spins` spins against one hold for the whole stake, settle once
+# and return a summary. Multipliers chain exactly like pressing Play Again.
+async def run_slots_turbo(user_id, bet, spins, multiplier, hold):
+    draws = fair_rng.round("slots", 3 * spins)
+    results = []
+    for _ in range(spins):
+        spin = slots_engine.spin(bet, multiplier, draws)
+        results.append(spin)
+        multiplier = spin.next_multiplier
+
+    payouts = [spin.payout for spin in results]
+    await wallet.settle(hold, sum(payouts))
+    log_transactions(user_id, "slots", bet, payouts, [spin.outcome for spin in results])
+
+    wins = [spin for spin in results if spin.outcome == "win"]
+    net = sum(payouts) - bet * spins
+    text = (
+        f"🎰 **Auto-spin x{spins}** at ${bet} per spin\n"
+        f"🎉 Wins: **{len(wins)}**"
+        + (f" (best: **{' | '.join(max(wins, key=lambda spin: spin.winnings).reels)}**)" if wins else "")
+        + f"\n{'💵 Net: **+' if net >= 0 else '😢 Net: **-'}${abs(net)}** Redmont Dollars"
+        + f"\n-# 🔐 {draws.proof}"
+    )
+    return text, multiplier
 
-        for _ in range(3):
-            spinning = " | ".join(random.choices(EMOJIS, k=3))
-            await self.message.edit(content=f"🎰 {spinning}")
-            await asyncio.sleep(0.4)
 
-        result = [random.choice(EMOJIS) for _ in range(3)]
-        result_str = " | ".join(result)
+SLOTS_MULTIPLIERS = {SLOTS_FIRST_MULTIPLIER, SLOTS_MULTIPLIER_AFTER_WIN, SLOTS_MULTIPLIER_AFTER_LOSS}
 
-        if result[0] == result[1] == result[2]:
-            winnings = int(self.bet * self.multiplier)
-            update_balance(self.user.id, winnings)
-            message = f"🎉 You won! You got **{result_str}**\n💵 You earned **${winnings}** Redmont Dollars!"
-            next_multiplier = 1.5
-        else:
-            update_balance(self.user.id, -self.bet)
-            message = f"😢 You lost. You got **{result_str}**\nBetter luck next time!"
-            next_multiplier = 2.0
 
-        await self.message.edit(content=message, view=SlotsView(self.user, self.bet, next_multiplier, self.message))
+# Play Again carries the bet, the next multiplier (in tenths) and the auto-spin count
+def slots_buttons(bet, multiplier, spins=1):
+    return buttons(GameButton("slots", "again", f"{bet}.{round(multiplier * 10)}.{spins}", label="Play Again"))
+
+
+@action("slots", "again")
+async def slots_again(interaction: discord.Interaction, arg: str):
+    args = button_args(arg, 3)
+    if args is None or args[0] <= 0 or not 1 <= args[2] <= MAX_AUTO_SPINS or args[1] / 10 not in SLOTS_MULTIPLIERS:
+        await interaction.response.send_message("⚠️ This button is no longer valid.", ephemeral=True)
+        return
+    bet, multiplier, spins = args[0], args[1] / 10, args[2]
+    user_id = interaction.user.id
+
+    hold = await wallet.reserve(user_id, bet * spins, key=interaction.id)
+    if hold is None:
+        await interaction.response.send_message("❌ Not enough Redmont Dollars to play again.", ephemeral=True)
+        return
+
+    if spins > 1:
+        message, next_multiplier = await run_slots_turbo(user_id, bet, spins, multiplier, hold)
+        await interaction.response.edit_message(content=message, view=slots_buttons(bet, next_multiplier, spins))  # Single edit, no animation
+        return
+
+    await interaction.response.defer()  # Acknowledge button press
+    slots_message = await interaction.original_response()  # The message this button is on
+
+    message, next_multiplier = await run_slots_spin(slots_message, interaction.token, user_id, bet, multiplier, hold)
+    slot_animations.note_edit(interaction.token)
+    await slots_message.edit(content=message, view=slots_buttons(bet, next_multiplier))
 
 @bot.tree.command(name="slots", description="Play the slot machine!")
-@app_commands.describe(bet="Amount to bet")
-async def slots(interaction: discord.Interaction, bet: int):
+@app_commands.describe(bet="Amount to bet", spins=f"Auto-spin this many times in one go (1-{MAX_AUTO_SPINS})")
+async def slots(interaction: discord.Interaction, bet: int, spins: int = 1):
     if bet <= 0:
         await interaction.response.send_message("⚠️ Bet must be greater than zero.", ephemeral=True)
         return
+    if spins < 1 or spins > MAX_AUTO_SPINS:
+        await interaction.response.send_message(f"⚠️ Spins must be between 1 and {MAX_AUTO_SPINS}.", ephemeral=True)
+        return
 
-    balance = get_balance(interaction.user.id)
-    if balance < bet:
+    hold = await wallet.reserve(interaction.user.id, bet * spins, key=interaction.id)
+    if hold is None:
         await interaction.response.send_message("❌ You don't have enough Redmont Dollars.", ephemeral=True)
         return
 
+    if spins > 1:
+        msg_text, multiplier = await run_slots_turbo(interaction.user.id, bet, spins, SLOTS_FIRST_MULTIPLIER, hold)
+        # One response for the whole batch; turbo replays edit it through the button interaction
+        await interaction.response.send_message(msg_text, view=slots_buttons(bet, multiplier, spins), ephemeral=True)
+        return
+
     await interaction.response.send_message("🎰 Spinning...", ephemeral=True)
+    slot_animations.note_edit(interaction.token)
     message = await interaction.original_response()
 
-    for _ in range(3):
-        spinning = " | ".join(random.choices(EMOJIS, k=3))
-        await message.edit(content=f"🎰 {spinning}")
-        await asyncio.sleep(0.4)
+    msg_text, multiplier = await run_slots_spin(message, interaction.token, interaction.user.id, bet, SLOTS_FIRST_MULTIPLIER, hold)
+    slot_animations.note_edit(interaction.token)
+    await message.edit(content=msg_text, view=slots_buttons(bet, multiplier))
+
+
+#Rock Paper Scissors game
+def rps_buttons(session_id):
+    sid = encode_id(session_id)
+    return buttons(
+        GameButton("rps", "rock", sid, label="🪨"),
+        GameButton("rps", "paper", sid, label="📄"),
+        GameButton("rps", "scissors", sid, label="✂️"),
+    )
+
+
+async def play_rps(interaction: discord.Interaction, arg: str, user_choice: str):
+    session = sessions.get(decode_id(arg))
+    if session is not None and session.user_id != interaction.user.id:
+        await interaction.response.send_message("This isn't your game!", ephemeral=True)
+        return
 
-    result = [random.choice(EMOJIS) for _ in range(3)]
-    result_str = " | ".join(result)
+    if session is None or sessions.take(session.id) is None:
+        await interaction.response.send_message("⚠️ This round is already over.", ephemeral=True)
+        return
 
-    if result[0] == result[1] == result[2]:
-        winnings = bet * 2
-        update_balance(interaction.user.id, winnings)
-        msg_text = f"🎉 You won! You got **{result_str}**\n💵 You earned **${winnings}** Redmont Dollars!"
-        multiplier = 1.5
+    bet = session.hold.amount
+    draws = fair_rng.round("rps")
+    rps_round = rps_engine.play(bet, user_choice, draws)
+    await wallet.settle(session.hold, rps_round.payout)  # A tie pays the stake back
+    log_transaction(session.user_id, "rps", bet, rps_round.payout, rps_round.outcome)
+    result_message = f"You chose {user_choice} | Bot chose {rps_round.bot_choice}\n"
+
+    if rps_round.outcome == "win":
+        result_message += f"🎉 You won {rps_round.payout} Redmont Dollars!"
+    elif rps_round.outcome == "loss":
+        result_message += f"😢 You lost {bet} Redmont Dollars!"
     else:
-        update_balance(interaction.user.id, -bet)
-        msg_text = f"😢 You lost. You got **{result_str}**\nBetter luck next time!"
-        multiplier = 2.0
+        result_message += "🤝 It's a tie! Your bet has been returned."
+    result_message += f"\n-# 🔐 {draws.proof}"
 
-    await message.edit(content=msg_text, view=SlotsView(interaction.user, bet, multiplier, message))
+    view = buttons(GameButton("rps", "again", str(bet), label="🔁 Play Again", style=discord.ButtonStyle.success))
+    await interaction.response.edit_message(content=result_message, view=view)
 
 
-#Rock Paper Scissors game
-class RPSButtons(discord.ui.View):
-    def __init__(self, user_id, bet):
-        super().__init__(timeout=900)
-        self.user_id = user_id
-        self.bet = bet
-        self.play_ended = False
-
-    async def play_rps(self, interaction: discord.Interaction, user_choice: str):
-        if str(interaction.user.id) != self.user_id:
-            await interaction.response.send_message("This isn't your game!", ephemeral=True)
-            return
+@action("rps", "rock")
+async def rps_rock(interaction: discord.Interaction, arg: str):
+    await play_rps(interaction, arg, "🪨")
 
-        choices = ["🪨", "📄", "✂️"]
-        bot_choice = random.choice(choices)
-        outcome = self.determine_winner(user_choice, bot_choice)
-        result_message = f"You chose {user_choice} | Bot chose {bot_choice}\n"
-
-        if outcome == "win":
-            winnings = self.bet * 2
-            update_balance(self.user_id, winnings)
-            result_message += f"🎉 You won {winnings} Redmont Dollars!"
-        elif outcome == "lose":
-            result_message += f"😢 You lost {self.bet} Redmont Dollars!"
-        else:
-            update_balance(self.user_id, self.bet)
-            result_message += "🤝 It's a tie! Your bet has been returned."
-
-        self.clear_items()
-        self.add_item(PlayAgainButton(self.user_id, self.bet))
-        await interaction.response.edit_message(content=result_message, view=self)
-        self.play_ended = True
-
-    def determine_winner(self, user, bot):
-        wins = {"🪨": "✂️", "📄": "🪨", "✂️": "📄"}
-        if user == bot:
-            return "tie"
-        elif wins[user] == bot:
-            return "win"
-        else:
-            return "lose"
-
-    @discord.ui.button(label="🪨", style=discord.ButtonStyle.primary)
-    async def rock(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.play_rps(interaction, "🪨")
-
-    @discord.ui.button(label="📄", style=discord.ButtonStyle.primary)
-    async def paper(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.play_rps(interaction, "📄")
-
-    @discord.ui.button(label="✂️", style=discord.ButtonStyle.primary)
-    async def scissors(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.play_rps(interaction, "✂️")
-
-class PlayAgainButton(discord.ui.Button):
-    def __init__(self, user_id, bet):
-        super().__init__(label="🔁 Play Again", style=discord.ButtonStyle.success)
-        self.user_id = user_id
-        self.bet = bet
-
-    async def callback(self, interaction: discord.Interaction):
-        if str(interaction.user.id) != self.user_id:
-            await interaction.response.send_message("You can't restart someone else's game!", ephemeral=True)
-            return
 
-        balance = get_balance(self.user_id)
-        if balance < self.bet:
-            await interaction.response.send_message("❌ You don't have enough Redmont Dollars to play again.", ephemeral=True)
-            return
+@action("rps", "paper")
+async def rps_paper(interaction: discord.Interaction, arg: str):
+    await play_rps(interaction, arg, "📄")
+
+
+@action("rps", "scissors")
+async def rps_scissors(interaction: discord.Interaction, arg: str):
+    await play_rps(interaction, arg, "✂️")
 
-        update_balance(self.user_id, -self.bet)
-        view = RPSButtons(user_id=self.user_id, bet=self.bet)
-        await interaction.response.edit_message(content="Let's play again!\nChoose your move:", view=view)
+
+@action("rps", "again")
+async def rps_again(interaction: discord.Interaction, arg: str):
+    user_id = interaction.user.id
+    bet = int(arg) if arg.isdigit() else 0
+    if bet <= 0:
+        await interaction.response.send_message("⚠️ This button is no longer valid.", ephemeral=True)
+        return
+
+    hold = await wallet.reserve(user_id, bet, key=interaction.id)
+    if hold is None:
+        await interaction.response.send_message("❌ You don't have enough Redmont Dollars to play again.", ephemeral=True)
+        return
+
+    session = await open_session(user_id, "rps", hold)
+    if session is None:
+        await interaction.response.send_message(SESSIONS_FULL, ephemeral=True)
+        return
+    await interaction.response.edit_message(content="Let's play again!\nChoose your move:", view=rps_buttons(session.id))
 
 @bot.tree.command(name="rps", description="Play Rock Paper Scissors and win Redmont Dollars!")
 @app_commands.describe(bet="Amount of Redmont Dollars to bet")
 async def rps(interaction: discord.Interaction, bet: int):
     user_id = str(interaction.user.id)
-    balance = get_balance(user_id)
 
     if bet <= 0:
         await interaction.response.send_message("❌ Bet must be greater than 0.", ephemeral=True)
         return
 
-    if balance < bet:
+    hold = await wallet.reserve(user_id, bet, key=interaction.id)
+    if hold is None:
         await interaction.response.send_message("❌ You don't have enough Redmont Dollars!", ephemeral=True)
         return
 
-    update_balance(user_id, -bet)
-    view = RPSButtons(user_id=user_id, bet=bet)
+    session = await open_session(user_id, "rps", hold)
+    if session is None:
+        await interaction.response.send_message(SESSIONS_FULL, ephemeral=True)
+        return
+    view = rps_buttons(session.id)
 
     await interaction.response.send_message(
         content="Let's play Rock Paper Scissors!\nChoose your move:",
@@ -613,115 +1583,92 @@ async def rps(interaction: discord.Interaction, bet: int):
 
 
 #HighLow Game
-# === High-Low Game Logic ===
-card_values = {
-    "2": 2, "3": 3, "4": 4, "5": 5, "6": 6,
-    "7": 7, "8": 8, "9": 9, "10": 10,
-    "J": 11, "Q": 12, "K": 13, "A": 14
-}
+def highlow_buttons(session_id):
+    sid = encode_id(session_id)
+    return buttons(
+        GameButton("highlow", "higher", sid, label="Higher", emoji="🔼"),
+        GameButton("highlow", "lower", sid, label="Lower", emoji="🔽"),
+    )
 
-# === Pay Table ===
-pay_table = {  # ← Pay table for win multiplier
-    1: 1.0,
-    2: 1.2,
-    3: 1.4,
-    4: 1.6,
-    5: 1.8,
-    6: 2.0,
-    7: 2.5,
-    8: 3.0,
-    9: 4.0,
-    10: 5.0,
-    11: 7.0,
-    12: 10.0,
-    13: 15.0
-}
 
-def draw_card():
-    return random.choice(list(card_values.keys()))
+async def play_highlow(interaction: discord.Interaction, arg: str, choice: str):
+    session = sessions.get(decode_id(arg))
+    if session is not None and session.user_id != interaction.user.id:
+        return await interaction.response.send_message("🚫 You can't play this game!", ephemeral=True)
 
-class HighLowButtons(discord.ui.View):
-    def __init__(self, user_id, bet, current_card):
-        super().__init__(timeout=900)
-        self.user_id = user_id
-        self.bet = bet
-        self.current_card = current_card
+    if session is None or sessions.take(session.id) is None:
+        return await interaction.response.send_message("⚠️ This round is already over.", ephemeral=True)
 
-    async def play_highlow(self, interaction, choice):
-        new_card = draw_card()
-        old_val = card_values[self.current_card]
-        new_val = card_values[new_card]
+    bet = session.hold.amount
+    current_card, draws = session.state
+    hl_round = highlow_engine.guess(bet, current_card, choice, draws)
+    winnings = hl_round.payout
 
-        outcome = "win" if (choice == "higher" and new_val > old_val) or (choice == "lower" and new_val < old_val) else "lose"
+    await wallet.settle(session.hold, winnings)
+    log_transaction(session.user_id, "highlow", bet, winnings, hl_round.outcome)
 
-        multiplier = pay_table[abs(old_val - new_val)] if outcome == "win" else 0
-        winnings = int(self.bet * multiplier)
+    msg = (
+        f"🎴 Your card: `{current_card}`\n"
+        f"🃏 New card: `{hl_round.new_card}`\n"
+        f"💸 Result: {'🎉 You won' if hl_round.outcome == 'win' else '😢 You lost'} {f'`+${winnings}`' if winnings else ''}\n"
+        f"-# 🔐 {draws.proof}"
+    )
 
-        update_balance(self.user_id, winnings)
+    view = buttons(GameButton("highlow", "again", str(bet), label="Play Again", emoji="🔁", style=discord.ButtonStyle.success))
+    await interaction.response.edit_message(content=msg, view=view)
 
-        msg = (
-            f"🎴 Your card: `{self.current_card}`\n"
-            f"🃏 New card: `{new_card}`\n"
-            f"💸 Result: {'🎉 You won' if outcome == 'win' else '😢 You lost'} {f'`+${winnings}`' if winnings else ''}"
-        )
 
-        view = PlayAgainView(self.user_id, self.bet)
-        await interaction.response.edit_message(content=msg, view=view)
-
-    @discord.ui.button(label="Higher", style=discord.ButtonStyle.primary, emoji="🔼")
-    async def higher(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id:
-            return await interaction.response.send_message("🚫 You can't play this game!", ephemeral=True)
-        await self.play_highlow(interaction, "higher")
-
-    @discord.ui.button(label="Lower", style=discord.ButtonStyle.primary, emoji="🔽")
-    async def lower(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id:
-            return await interaction.response.send_message("🚫 You can't play this game!", ephemeral=True)
-        await self.play_highlow(interaction, "lower")
-
-class PlayAgainView(discord.ui.View):
-    def __init__(self, user_id, bet):
-        super().__init__(timeout=900)
-        self.user_id = user_id
-        self.bet = bet
-
-    @discord.ui.button(label="Play Again", style=discord.ButtonStyle.success, emoji="🔁")
-    async def play_again(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.user_id:
-            return await interaction.response.send_message("🚫 Only you can restart your game.", ephemeral=True)
-
-        balance = get_balance(self.user_id)
-        if self.bet > balance:
-            return await interaction.response.send_message("❌ You don't have enough balance to play again.", ephemeral=True)
-
-        update_balance(self.user_id, -self.bet)
-
-        card = draw_card()
-        view = HighLowButtons(self.user_id, self.bet, card)
-        await interaction.response.send_message(
-            content=f"🎴 Your card is `{card}`\nWill the next card be 🔼 higher or 🔽 lower?",
-            view=view,
-            ephemeral=True
-        )
+@action("highlow", "higher")
+async def highlow_higher(interaction: discord.Interaction, arg: str):
+    await play_highlow(interaction, arg, "higher")
+
+
+@action("highlow", "lower")
+async def highlow_lower(interaction: discord.Interaction, arg: str):
+    await play_highlow(interaction, arg, "lower")
+
+
+@action("highlow", "again")
+async def highlow_again(interaction: discord.Interaction, arg: str):
+    user_id = interaction.user.id
+    bet = int(arg) if arg.isdigit() else 0
+    if bet <= 0:
+        return await interaction.response.send_message("⚠️ This button is no longer valid.", ephemeral=True)
+
+    hold = await wallet.reserve(user_id, bet, key=interaction.id)
+    if hold is None:
+        return await interaction.response.send_message("❌ You don't have enough balance to play again.", ephemeral=True)
+
+    draws = fair_rng.round("highlow")  # The dealt card and the next one
+    card = highlow_engine.draw_card(draws)
+    session = await open_session(user_id, "highlow", hold, (card, draws))
+    if session is None:
+        return await interaction.response.send_message(SESSIONS_FULL, ephemeral=True)
+    await interaction.response.send_message(
+        content=f"🎴 Your card is `{card}`\nWill the next card be 🔼 higher or 🔽 lower?",
+        view=highlow_buttons(session.id),
+        ephemeral=True
+    )
 
 # === Slash Command for High-Low ===
 @bot.tree.command(name="highlow", description="Play High-Low card game!")
 @app_commands.describe(bet="How much you want to bet")
 async def highlow(interaction: discord.Interaction, bet: int):
     user_id = interaction.user.id
-    balance = get_balance(user_id)
 
     if bet <= 0:
         return await interaction.response.send_message("❌ Bet must be greater than 0.", ephemeral=True)
 
-    if bet > balance:
+    hold = await wallet.reserve(user_id, bet, key=interaction.id)
+    if hold is None:
         return await interaction.response.send_message("❌ You don't have enough balance to bet that amount.", ephemeral=True)
 
-    update_balance(user_id, -bet)
-
-    card = draw_card()
-    view = HighLowButtons(user_id, bet, card)
+    draws = fair_rng.round("highlow")  # The dealt card and the next one
+    card = highlow_engine.draw_card(draws)
+    session = await open_session(user_id, "highlow", hold, (card, draws))
+    if session is None:
+        return await interaction.response.send_message(SESSIONS_FULL, ephemeral=True)
+    view = highlow_buttons(session.id)
 
     await interaction.response.send_message(
         content=f"🎴 Your card is `{card}`\nWill the next card be 🔼 higher or 🔽 lower?",
@@ -731,8 +1678,5 @@ async def highlow(interaction: discord.Interaction, bet: int):
 
 
 
+startup_phase("state")
 bot.run(BOT_KEY)
-@bot.event
-async def on_ready():
-    await bot.tree.sync()
-    print(f"Bot is online as {bot.user}")
@@ -0,0 +1,120 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from coordinator import COORDINATOR_ADDRESS, parse_address
+
+# Launch a sharded deployment: one balance coordinator (coordinator.py) plus CLUSTERS
+# bot processes, each running its share of SHARD_COUNT shards with AutoShardedBot.
+#
+#   CLUSTERS=4 SHARD_COUNT=8 python cluster.py
+#
+# With CLUSTERS=1 (the default) this simply runs casino_bot.py as a single process.
+# A bot process that crashes is restarted; one stopped with /shutdown stays down. If
+# the coordinator dies, everything stops.
+
+RESTART_DELAY = 5
+COORDINATOR_START_TIMEOUT = 60
+
+
+# Contiguous shard ids for each bot process, e.g. 8 shards / 3 processes -> 3, 3, 2
+def shard_slices(shard_count, clusters):
+    base, extra = divmod(shard_count, clusters)
+    slices, start = [], 0
+    for cluster_id in range(clusters):
+        size = base + (1 if cluster_id < extra else 0)
+        slices.append(list(range(start, start + size)))
+        start += size
+    return slices
+
+
+def wait_for_port(host, port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_bot(cluster_id, shard_ids, shard_count, address):
+    env = dict(os.environ, COORDINATOR=address, CLUSTER_ID=str(cluster_id),
+               SHARD_COUNT=str(shard_count), SHARD_IDS=",".join(map(str, shard_ids)))
+    print(f"🚀 Bot process {cluster_id}: shards {shard_ids[0]}-{shard_ids[-1]} of {shard_count}", flush=True)
+    return subprocess.Popen([sys.executable, "casino_bot.py"], env=env)
+
+
+def stop(process, sig=signal.SIGTERM):
+    if process.poll() is None:
+        process.send_signal(sig)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    clusters = int(os.getenv("CLUSTERS", "1"))
+    if clusters <= 1:
+        os.execv(sys.executable, [sys.executable, "casino_bot.py"])
+
+    shard_count = int(os.getenv("SHARD_COUNT", str(clusters)))
+    if shard_count < clusters:
+        sys.exit(f"SHARD_COUNT ({shard_count}) must be at least CLUSTERS ({clusters})")
+    address = os.getenv("COORDINATOR", COORDINATOR_ADDRESS)
+    host, port = parse_address(address)
+
+    coordinator = subprocess.Popen([sys.executable, "coordinator.py", "--listen", address])
+    if not wait_for_port(host, port, coordinator, COORDINATOR_START_TIMEOUT):
+        stop(coordinator)
+        sys.exit("❌ The balance coordinator did not start.")
+
+    stopping = False
+
+    def request_stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    slices = shard_slices(shard_count, clusters)
+    bots = {cluster_id: start_bot(cluster_id, shard_ids, shard_count, address) for cluster_id, shard_ids in enumerate(slices)}
+    restart_at = {}  # cluster id -> monotonic time
+    exit_code = 0
+    while not stopping and bots:
+        time.sleep(1)
+        if coordinator.poll() is not None:
+            print(f"❌ The balance coordinator exited ({coordinator.returncode}), stopping all bot processes.", flush=True)
+            exit_code = 1
+            break
+        now = time.monotonic()
+        for cluster_id, process in list(bots.items()):
+            if process.poll() is None:
+                continue
+            if process.returncode == 0:
+                print(f"🔴 Bot process {cluster_id} shut down.", flush=True)
+                del bots[cluster_id]
+            elif cluster_id not in restart_at:
+                print(f"⚠️ Bot process {cluster_id} exited ({process.returncode}), restarting in {RESTART_DELAY}s.", flush=True)
+                restart_at[cluster_id] = now + RESTART_DELAY
+            elif now >= restart_at[cluster_id]:
+                del restart_at[cluster_id]
+                bots[cluster_id] = start_bot(cluster_id, slices[cluster_id], shard_count, address)
+
+    # Bot processes first, so their last ledger rows reach the coordinator before it saves
+    for process in bots.values():
+        stop(process, signal.SIGINT)  # discord.py closes the gateway cleanly on Ctrl+C
+    stop(coordinator)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
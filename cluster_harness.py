@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from balance_store import BalanceStore
+from cluster import wait_for_port
+from coordinator import CoordinatedWallet, CoordinatorClient
+from ledger import HEADER, RECORD
+
+# Local multi-process check of the balance coordinator, no Discord needed:
+#
+#   python cluster_harness.py --workers 4 --tasks 16 --ops 2000 --users 20
+#
+# Starts a coordinator on a temporary directory and several worker processes that
+# bet, settle, refund, credit and debit concurrently on the same few users, the way
+# bot processes on different shards would. Each worker reports the net change it
+# caused per user; the harness then checks that the coordinator's balances equal the
+# sum, that no balance ever went negative, that every ledger row arrived, that a
+# client following the push stream ended with the same balances, and that the saved
+# snapshot matches after a clean shutdown.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START_BALANCE = 1000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def hello(address):
+    state = {}
+    client = CoordinatorClient(address, on_connect=state.update)
+    await client.start()
+    await client.close()
+    return dict(state["balances"]), state["ledger_count"]
+
+
+async def worker(address, worker_id, tasks, ops, users, seed):
+    cache = {}
+    client = CoordinatorClient(address, on_connect=lambda state: cache.update(state["balances"]),
+                               on_balance=cache.__setitem__)
+    await client.start()
+    balance_of = lambda user_id: cache.get(user_id, 0)
+    wallet = CoordinatedWallet(client, balance_of)
+    net = {}
+    counts = {"rounds": 0, "short": 0, "rows": 0, "duplicates": 0, "negative": 0}
+
+    def change(user_id, amount):
+        net[user_id] = net.get(user_id, 0) + amount
+
+    async def play(task_id):
+        rng = random.Random(seed * 1000 + task_id)
+        for op in range(ops):
+            user_id = rng.randint(1, users)
+            roll = rng.random()
+            key = f"{worker_id}:{task_id}:{op}"
+            if roll < 0.7:  # A game round
+                stake = rng.randint(1, 300)
+                hold = await wallet.reserve(user_id, stake, key=key)
+                if hold is None:
+                    counts["short"] += 1
+                    continue
+                change(user_id, -stake)
+                await asyncio.sleep(0)  # Let other rounds interleave, like a button click would
+                if rng.random() < 0.1:
+                    await wallet.refund(hold)
+                    change(user_id, stake)
+                    continue
+                payout = rng.choice((0, 0, stake * 2, stake * 3))
+                await wallet.settle(hold, payout)
+                change(user_id, payout)
+                client.log([(user_id, "dice", stake, payout, "win" if payout else "loss", cache[user_id])], time.time())
+                counts["rows"] += 1
+                counts["rounds"] += 1
+            elif roll < 0.85:  # Deposit, sometimes delivered twice
+                amount = rng.randint(1, 200)
+                if await wallet.credit(user_id, amount, key=f"credit:{key}"):
+                    change(user_id, amount)
+                if rng.random() < 0.2:
+                    # Same key from a fresh wallet (another shard): the coordinator must refuse it
+                    other = CoordinatedWallet(client, balance_of)
+                    if await other.credit(user_id, amount, key=f"credit:{key}"):
+                        change(user_id, amount)
+                    else:
+                        counts["duplicates"] += 1
+            else:  # Withdrawal
+                amount = rng.randint(1, 500)
+                if await wallet.debit(user_id, amount, key=key):
+                    change(user_id, -amount)
+                else:
+                    counts["short"] += 1
+            if cache.get(user_id, 0) < 0:
+                counts["negative"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(play(task_id) for task_id in range(tasks)))
+    seconds = time.perf_counter() - started
+    await asyncio.sleep(0.2)  # Let the last log rows leave the socket
+    await client.close()
+    print(json.dumps({"net": net, "counts": counts, "seconds": seconds}))
+
+
+# Follows the push stream for the whole run; its cache must end up exact
+class Observer:
+    def __init__(self, address):
+        self.balances = {}
+        self.logged = 0
+        self.client = CoordinatorClient(address, on_connect=self.connected, on_balance=self.balances.__setitem__,
+                                        on_logged=self.rows)
+
+    def connected(self, state):
+        self.balances.clear()
+        self.balances.update(state["balances"])
+
+    def rows(self, first, timestamp, rows):
+        self.logged += len(rows)
+
+
+async def seed_users(address, users):
+    client = CoordinatorClient(address)
+    await client.start()
+    wallet = CoordinatedWallet(client, lambda user_id: 0)
+    for user_id in range(1, users + 1):
+        await wallet.credit(user_id, START_BALANCE, key=f"seed:{user_id}")
+    await client.close()
+
+
+async def run_workers(args, address):
+    observer = Observer(address)
+    await observer.client.start()
+    await seed_users(address, args.users)
+
+    processes = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(HERE, "cluster_harness.py"), "--worker", str(worker_id),
+            "--address", address, "--tasks", str(args.tasks), "--ops", str(args.ops),
+            "--users", str(args.users), "--seed", str(args.seed),
+            stdout=asyncio.subprocess.PIPE,
+        )
+        for worker_id in range(args.workers)
+    ]
+    started = time.perf_counter()
+    reports = []
+    for process in processes:
+        stdout, _ = await process.communicate()
+        reports.append(json.loads(stdout.decode().strip().splitlines()[-1]))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.5)  # Pushes for the last operations
+    final, ledger_count = await hello(address)
+    await observer.client.close()
+    return reports, elapsed, final, ledger_count, observer
+
+
+def check(name, ok, detail=""):
+    print(f"{'✅' if ok else '❌'} {name}{f': {detail}' if detail else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process test of the balance coordinator")
+    parser.add_argument("--workers", type=int, default=4, help="Processes, like bot processes on different shards")
+    parser.add_argument("--tasks", type=int, default=16, help="Concurrent players per process")
+    parser.add_argument("--ops", type=int, default=500, help="Operations per player")
+    parser.add_argument("--users", type=int, default=20, help="Shared users (fewer means more contention)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--address", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        asyncio.run(worker(args.address, args.worker, args.tasks, args.ops, args.users, args.seed + args.worker))
+        return
+
+    directory = tempfile.mkdtemp(prefix="casino-cluster-")
+    address = f"127.0.0.1:{free_port()}"
+    coordinator = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "coordinator.py"), "--listen", address, "--storage", "file",
+         "--snapshot", "balances.bin", "--ledger", "transactions.ledger"],
+        cwd=directory,
+    )
+    try:
+        host, port = address.rsplit(":", 1)
+        if not wait_for_port(host, int(port), coordinator, 30):
+            sys.exit("❌ Coordinator did not start")
+        reports, elapsed, final, ledger_count, observer = asyncio.run(run_workers(args, address))
+    finally:
+        coordinator.send_signal(signal.SIGTERM)
+        coordinator.wait(30)
+
+    expected = {user_id: START_BALANCE for user_id in range(1, args.users + 1)}
+    totals = {"rounds": 0, "short": 0, "rows": 0, "duplicates": 0, "negative": 0}
+    for report in reports:
+        for user_id, amount in report["net"].items():
+            expected[int(user_id)] += amount
+        for name in totals:
+            totals[name] += report["counts"][name]
+    operations = args.workers * args.tasks * args.ops
+
+    print(f"{args.workers} processes x {args.tasks} players x {args.ops} ops on {args.users} users: "
+          f"{operations} operations in {elapsed:.2f}s ({operations / elapsed:.0f}/s)")
+    print(f"{totals['rounds']} rounds, {totals['short']} refused for funds, {totals['duplicates']} duplicate deposits refused")
+    saved = dict(BalanceStore.load(os.path.join(directory, "balances.bin")).items())
+    saved_records = (os.path.getsize(os.path.join(directory, "transactions.ledger")) - HEADER.size) // RECORD.size
+    results = [
+        check("balances equal the sum of every process's changes", final == expected),
+        check("no balance went negative", min(final.values()) >= 0 and totals["negative"] == 0, f"lowest {min(final.values())}"),
+        check("every ledger row arrived", ledger_count == totals["rows"], f"{ledger_count} of {totals['rows']}"),
+        check("push stream kept a follower exact", observer.balances == final and observer.logged == totals["rows"]),
+        check("snapshot and ledger on disk match after shutdown", saved == final and saved_records == ledger_count),
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+
+import discord
+
+import metrics
+
+# Bot buttons (game rounds, staff reviews) are not backed by View objects. Each button
+# carries its routing in the custom_id ("casino:<game>:<action>:<arg>"), and one
+# registered DynamicItem dispatches every click to the handler for (game, action).
+# The arg is a session id (see sessions.py), a request number, or the few values a
+# stateless button needs, e.g. the bet for Play Again.
+# Nothing is kept per message, and the buttons keep routing across restarts.
+
+CUSTOM_ID_TEMPLATE = r"casino:(?P<game>[a-z]+):(?P<action>[a-z]+):(?P<arg>[0-9a-z.]+)"
+
+_handlers = {}  # (game, action) -> async handler(interaction, arg)
+_check = None  # async check(interaction, game) -> bool, run before every handler
+
+
+# Register the handler for one button: @action("rps", "play")
+def action(game, name):
+    def register(handler):
+        _handlers[(game, name)] = handler
+        return handler
+    return register
+
+
+# Run `check` before every click; when it returns False the handler is skipped (the
+# check is expected to have responded to the interaction itself)
+def set_check(check):
+    global _check
+    _check = check
+
+
+class GameButton(discord.ui.DynamicItem[discord.ui.Button], template=CUSTOM_ID_TEMPLATE):
+    def __init__(self, game, action, arg, label=None, style=discord.ButtonStyle.primary, emoji=None, disabled=False):
+        super().__init__(discord.ui.Button(
+            label=label,
+            style=style,
+            emoji=emoji,
+            disabled=disabled,
+            custom_id=f"casino:{game}:{action}:{arg}",
+        ))
+        self.game = game
+        self.action = action
+        self.arg = arg
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["game"], match["action"], match["arg"])
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return _check is None or await _check(interaction, self.game)
+
+    async def callback(self, interaction: discord.Interaction):
+        handler = _handlers.get((self.game, self.action))
+        if handler is None:
+            await interaction.response.send_message("⚠️ This button is no longer supported.", ephemeral=True)
+            return
+        name = f"{self.game}:{self.action}"
+        started = time.perf_counter()
+        try:
+            await handler(interaction, self.arg)
+        except Exception as e:
+            metrics.COMPONENT_ERRORS.labels(name, type(e).__name__).inc()
+            # Dynamic items never reach a View's on_error: discord.py logs the exception
+            # in ViewStore.schedule_dynamic_item_call
+            raise
+        finally:
+            metrics.COMPONENT_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+# A View only used to render buttons. It is stopped before sending, so discord.py
+# never keeps it in its view store; clicks go through GameButton instead.
+def buttons(*items):
+    view = discord.ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    view.stop()
+    return view
@@ -0,0 +1,402 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+from collections import OrderedDict
+
+from ledger import Ledger
+from storage import config_from_env, load_or_seed, open_backend
+from wallet import Hold, Wallet
+
+# Balance coordinator for a sharded deployment (see cluster.py).
+#
+# Bot processes each run a slice of the shards and keep balances in a local read
+# cache, but every balance change and every ledger record goes through this one
+# process. It applies requests one at a time on a single event loop, so updates to a
+# user are serialized across all shards, debits can never overdraw, and the ledger and
+# balance snapshot keep a single writer. Changes are pushed to every bot process to
+# keep their caches (leaderboards, /history) current.
+#
+# The protocol is newline-delimited JSON over TCP:
+#
+#   -> {"id": 1, "op": "hello"}                   <- {"id": 1, "balances": [[user, balance], ...], "ledger_count": n}
+#   -> {"id": 2, "op": "adjust", "user": u, "delta": -50, "floor": 0, "key": "..."}
+#                                                 <- {"id": 2, "ok": true, "balance": 950, "duplicate": false}
+#   -> {"op": "cancel", "key": "..."}            (undo that adjust, or make sure it never applies)
+#   -> {"op": "log", "timestamp": t, "rows": [[user, game, stake, payout, outcome, balance_after], ...]}
+#   <- {"event": "balance", "user": u, "balance": b}        (changes made by other processes)
+#   <- {"event": "logged", "first": n, "timestamp": t, "rows": [...]}
+
+COORDINATOR_ADDRESS = "127.0.0.1:7400"
+STREAM_LIMIT = 256 * 1024 * 1024  # The hello reply carries every balance
+FLUSH_INTERVAL = 3  # Seconds between storage flushes, like the bot's auto-save
+MAX_KEYS = 200000  # Idempotency keys remembered
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 30
+ADJUST_ATTEMPTS = 5  # Tries to reserve, settle or refund across coordinator reconnects
+
+
+def load_legacy_balances(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class CoordinatorServer:
+    def __init__(self, storage, ledger, balances, max_keys=MAX_KEYS):
+        self.storage = storage
+        self.ledger = ledger
+        self.balances = balances
+        self.max_keys = max_keys
+        self._results = OrderedDict()  # idempotency key -> result of the first call
+        self._clients = set()  # StreamWriters
+        self.adjusted = 0
+        self.rejected = 0
+        self.logged = 0
+
+    async def serve(self, host, port):
+        return await asyncio.start_server(self._connection, host, port, limit=STREAM_LIMIT)
+
+    async def _connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            while line := await reader.readline():
+                reply = self.handle(json.loads(line), writer)
+                if reply is not None:
+                    writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            print(f"⚠️ Coordinator connection {peer} failed: {e}")
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    # One request, start to finish, without yielding to the event loop
+    def handle(self, message, sender=None):
+        op = message.get("op")
+        if op == "adjust":
+            result = self.adjust(message["user"], message["delta"], message.get("floor"), message.get("key"), sender)
+            return {"id": message["id"], **result}
+        if op == "cancel":
+            self.cancel(message["key"], sender)
+            return None
+        if op == "log":
+            self.log(message["rows"], message["timestamp"])
+            return None
+        if op == "hello":
+            self._clients.add(sender)  # Pushes start after this reply, so nothing is missed
+            return {"id": message["id"], "balances": [list(item) for item in self.balances.items()], "ledger_count": self.ledger.count}
+        return {"id": message.get("id"), "error": f"unknown op {op!r}"}
+
+    # Add `delta` to a balance, unless that would take it below `floor`. A request with
+    # an already applied `key` returns the first result instead of applying again.
+    def adjust(self, user_id, delta, floor=None, key=None, sender=None):
+        if key is not None and key in self._results:
+            return {**self._results[key], "balance": self.balances.get(user_id), "duplicate": True}
+        balance = self.balances.get(user_id)
+        if floor is not None and balance + delta < floor:
+            self.rejected += 1
+            return {"ok": False, "balance": balance, "duplicate": False}
+        balance = self.balances.add(user_id, delta)
+        self.storage.stage_balance(user_id, delta)
+        self.adjusted += 1
+        result = {"ok": True, "balance": balance, "user": user_id, "delta": delta}
+        if key is not None:
+            self._remember(key, result)
+        self._broadcast({"event": "balance", "user": user_id, "balance": balance}, skip=sender)
+        return {**result, "duplicate": False}
+
+    # Undo the adjust made with `key`, or, if it has not arrived (yet), make sure it is
+    # never applied. For a request the bot gave up on without knowing whether it went
+    # through. Cancelling twice does nothing.
+    def cancel(self, key, sender=None):
+        result = self._results.get(key)
+        if result is None:
+            self._remember(key, {"ok": False, "cancelled": True})
+            return
+        if not result["ok"]:
+            return
+        self._results[key] = {"ok": False, "cancelled": True}
+        user_id, delta = result["user"], -result["delta"]
+        balance = self.balances.add(user_id, delta)
+        self.storage.stage_balance(user_id, delta)
+        self.adjusted += 1
+        self._broadcast({"event": "balance", "user": user_id, "balance": balance}, skip=sender)
+
+    def _remember(self, key, result):
+        self._results[key] = result
+        if len(self._results) > self.max_keys:
+            self._results.popitem(last=False)
+
+    def log(self, rows, timestamp):
+        first = self.ledger.append_many(rows, timestamp)
+        for offset, row in enumerate(rows):
+            self.storage.stage_transaction((first + offset, timestamp, *row))
+        self.ledger.flush()  # Bot processes read the file as soon as they hear about it
+        self.logged += len(rows)
+        self._broadcast({"event": "logged", "first": first, "timestamp": timestamp, "rows": rows})
+
+    def _broadcast(self, message, skip=None):
+        data = encode(message)
+        for writer in self._clients:
+            if writer is not skip:
+                writer.write(data)
+
+    async def run_flush(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.storage.flush()
+            except Exception as e:
+                print(f"⚠️ Coordinator flush failed: {e}")
+
+
+# Connection from a bot process. Requests wait for their reply; ledger rows and
+# cancels are sent without waiting and, like replies, stay in order. While the
+# connection is down, adjust() raises ConnectionError and rows and cancels are kept
+# until it is back.
+#
+#   on_connect(state)          after every (re)connect, with the hello reply
+#   on_balance(user, balance)  whenever a balance changed, here or in another process
+#   on_logged(first, timestamp, rows)
+class CoordinatorClient:
+    def __init__(self, address, on_connect=None, on_balance=None, on_logged=None):
+        self.host, self.port = parse_address(address)
+        self.on_connect = on_connect
+        self.on_balance = on_balance
+        self.on_logged = on_logged
+        self._ids = itertools.count(1)
+        self._waiting = {}  # request id -> Future
+        self._writer = None
+        self._backlog = []  # Encoded log messages not sent yet
+        self._task = None
+
+    # Connect (waiting for the first connection) and keep reconnecting in the background
+    async def start(self):
+        reader = await self._connect()
+        self._task = asyncio.get_running_loop().create_task(self._run(reader), name="coordinator_client")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        writer.write(encode({"id": 0, "op": "hello"}))
+        state = json.loads(await reader.readline())
+        self._writer = writer
+        if self.on_connect is not None:
+            self.on_connect(state)
+        for data in self._backlog:
+            writer.write(data)
+        self._backlog = []
+        return reader
+
+    async def _run(self, reader):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                while line := await reader.readline():
+                    self._dispatch(json.loads(line))
+                raise ConnectionError("coordinator closed the connection")
+            except (ConnectionError, ValueError) as e:
+                self._disconnected(e)
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    reader = await self._connect()
+                    delay = RECONNECT_DELAY
+                    print("✅ Reconnected to the balance coordinator.")
+                    break
+                except OSError as e:
+                    delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                    print(f"⚠️ Balance coordinator unreachable ({e}), retrying in {delay}s.")
+
+    def _disconnected(self, error):
+        print(f"⚠️ Lost the balance coordinator: {error}")
+        self._writer = None
+        waiting, self._waiting = self._waiting, {}
+        for future in waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError("balance coordinator disconnected"))
+
+    def _dispatch(self, message):
+        event = message.get("event")
+        if event == "balance":
+            if self.on_balance is not None:
+                self.on_balance(message["user"], message["balance"])
+        elif event == "logged":
+            if self.on_logged is not None:
+                self.on_logged(message["first"], message["timestamp"], message["rows"])
+        else:
+            future = self._waiting.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+
+    async def _request(self, message):
+        if self._writer is None:
+            raise ConnectionError("not connected to the balance coordinator")
+        message["id"] = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[message["id"]] = future
+        self._writer.write(encode(message))
+        reply = await future
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    async def adjust(self, user_id, delta, floor=None, key=None):
+        reply = await self._request({"op": "adjust", "user": int(user_id), "delta": delta, "floor": floor, "key": key})
+        if self.on_balance is not None:
+            self.on_balance(int(user_id), reply["balance"])
+        return reply
+
+    # rows: (user_id, game, stake, payout, outcome, balance_after)
+    def log(self, rows, timestamp):
+        self._send(encode({"op": "log", "timestamp": timestamp, "rows": [list(row) for row in rows]}))
+
+    # Sent without waiting, like log()
+    def cancel(self, key):
+        self._send(encode({"op": "cancel", "key": key}))
+
+    def _send(self, data):
+        if self._writer is None:
+            self._backlog.append(data)
+        else:
+            self._writer.write(data)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Wallet whose balance changes are applied by the coordinator. Holds, locks and
+# idempotency keys work as in Wallet; the coordinator decides whether a debit is
+# covered, so two shards can't both spend the same balance.
+class CoordinatedWallet(Wallet):
+    def __init__(self, client, get_balance, max_keys=50000):
+        super().__init__(get_balance, None, max_keys)
+        self.client = client
+
+    # The debit is keyed on the new hold's id, so a retry after a lost reply gets the
+    # first result back. If every try fails the debit may or may not have gone through:
+    # it is cancelled by that key, which the coordinator applies once it is reachable.
+    async def reserve(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key):
+                return self._results[key]
+            if amount <= 0:
+                return None
+            hold = Hold(user_id, amount, key)
+            debit_key = f"reserve:{hold.id}"
+            try:
+                reply = await self._adjust(user_id, -amount, floor=0, key=debit_key)
+            except ConnectionError:
+                self.client.cancel(debit_key)
+                raise
+            if not reply["ok"]:
+                return None
+            self._remember(key, hold)
+            return hold
+
+    async def settle(self, hold, payout):
+        return await self._close(hold, payout, "settled")
+
+    async def refund(self, hold):
+        return await self._close(hold, hold.amount, "refunded")
+
+    # Settle and refund both send the hold id as idempotency key: resending after a
+    # lost reply, or refunding a hold whose settle reply never came, applies at most
+    # one of them once.
+    async def _close(self, hold, amount, state):
+        async with self.lock(hold.user_id):
+            if not hold.open:
+                return False
+            if amount:
+                await self._adjust(hold.user_id, amount, key=f"hold:{hold.id}")
+            hold.state = state
+            return True
+
+    # A keyed adjust, retried while the client reconnects; the coordinator answers a
+    # repeat with the first result
+    async def _adjust(self, user_id, delta, floor=None, key=None):
+        for attempt in range(1, ADJUST_ATTEMPTS + 1):
+            try:
+                return await self.client.adjust(user_id, delta, floor=floor, key=key)
+            except ConnectionError:
+                if attempt == ADJUST_ATTEMPTS:
+                    raise
+                await asyncio.sleep(min(RECONNECT_DELAY * 2 ** attempt, RECONNECT_DELAY_MAX))
+
+    async def credit(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key):
+                return False
+            reply = await self.client.adjust(user_id, amount, key=key)
+            self._remember(key, True)
+            return not reply["duplicate"]
+
+    async def debit(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key):
+                return False
+            reply = await self.client.adjust(user_id, -amount, floor=0, key=key)
+            if not reply["ok"] or reply["duplicate"]:
+                return False
+            self._remember(key, True)
+            return True
+
+
+async def run(args):
+    storage_config = config_from_env(snapshot_path=args.snapshot, legacy_loader=lambda: load_legacy_balances(args.legacy_balances))
+    storage = open_backend(args.storage, **storage_config)
+    balances = load_or_seed(storage, **storage_config)
+    ledger = Ledger(args.ledger)
+    if ledger.is_empty() and (os.path.exists("transactions.log") or os.path.exists("transactions.json")):
+        print("⚠️ The ledger is empty but legacy history exists: start the bot once without COORDINATOR to import it.")
+    server = CoordinatorServer(storage, ledger, balances)
+    host, port = parse_address(args.listen)
+    tcp = await server.serve(host, port)
+
+    loop = asyncio.get_running_loop()
+    tasks = [loop.create_task(ledger.run_group_commit()), loop.create_task(server.run_flush())]
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"✅ Balance coordinator on {host}:{port}: {len(balances)} balances, {ledger.count} transactions ({storage.name} backend).", flush=True)
+    await stop.wait()
+
+    tcp.close()
+    for task in tasks:
+        task.cancel()
+    storage.flush_sync()
+    storage.close()
+    ledger.close()
+    print(f"✅ Coordinator stopped: {server.adjusted} changes ({server.rejected} rejected), {server.logged} records.", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balance coordinator for a sharded deployment")
+    parser.add_argument("--listen", default=os.getenv("COORDINATOR", COORDINATOR_ADDRESS), help="host:port")
+    parser.add_argument("--storage", default=os.getenv("STORAGE_BACKEND", "file"), help="file, sqlite or mongo")
+    parser.add_argument("--snapshot", default="balances.bin", help="Balance snapshot (file backend)")
+    parser.add_argument("--legacy-balances", default="balances.json", help="Imported once if there is no snapshot yet")
+    parser.add_argument("--ledger", default="transactions.ledger")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
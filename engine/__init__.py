@@ -0,0 +1,14 @@
+# Headless game engine: every game's rules as plain Python, with no discord.py
+# dependency. Each game draws from an injected `rng` (anything with randint,
+# choice and choices, e.g. random.Random(seed)), so rounds are deterministic
+# under a seeded generator and can be tested and benchmarked without Discord.
+from engine import blackjack, coinflip, dice, highlow, rps, slots
+
+GAMES = {
+    "dice": dice,
+    "coinflip": coinflip,
+    "blackjack": blackjack,
+    "slots": slots,
+    "rps": rps,
+    "highlow": highlow,
+}
@@ -0,0 +1,93 @@
+import random
+
+from engine.rules import BLACKJACK_PAYOUT, DEALER_STANDS_ON
+from engine.shoe import Shoe, hand_total, odds
+
+
+# One blackjack hand as a state machine: "playing" until the player busts or
+# stands, then "finished" with a winner and a payout.
+# Cards come from `shoe` (a fresh one shuffled with `rng` if none is given); a shoe
+# past its penetration is reshuffled with `rng` before the deal.
+class BlackjackGame:
+    def __init__(self, bet, rng=random, shoe=None):
+        self.bet = bet
+        self.shoe = shoe if shoe is not None else Shoe()
+        if self.shoe.needs_shuffle:
+            self.shoe.shuffle(rng)
+        self.first_card = self.shoe.position
+        self.player_hand = [self.shoe.deal(), self.shoe.deal()]
+        self.bot_hand = [self.shoe.deal(), self.shoe.deal()]
+        self.state = "playing"
+
+    # Plain data for saving a hand in play (the session journal), and back
+    def to_dict(self):
+        return {"bet": self.bet, "shoe": self.shoe.to_dict(), "first_card": self.first_card,
+                "player_hand": self.player_hand, "bot_hand": self.bot_hand, "state": self.state}
+
+    @classmethod
+    def from_dict(cls, data):
+        game = cls.__new__(cls)
+        game.bet = data["bet"]
+        game.shoe = Shoe.from_dict(data["shoe"])
+        game.first_card = data["first_card"]
+        game.player_hand = list(data["player_hand"])
+        game.bot_hand = list(data["bot_hand"])
+        game.state = data["state"]
+        return game
+
+    @property
+    def game_over(self):
+        return self.state == "finished"
+
+    @property
+    def player_total(self):
+        return hand_total(self.player_hand)[0]
+
+    @property
+    def bot_total(self):
+        return hand_total(self.bot_hand)[0]
+
+    def hit(self):
+        if self.game_over:
+            raise ValueError("hand is already finished")
+        self.player_hand.append(self.shoe.deal())
+        if self.player_total > 21:
+            self.state = "finished"
+        return self.player_hand
+
+    # The dealer draws to DEALER_STANDS_ON, standing on soft totals as well
+    def stand(self):
+        if self.game_over:
+            raise ValueError("hand is already finished")
+        while self.bot_total < DEALER_STANDS_ON:
+            self.bot_hand.append(self.shoe.deal())
+        self.state = "finished"
+        return self.bot_hand
+
+    # Stand/hit odds for the player, from the dealer tables (the hole card stays hidden)
+    def odds(self):
+        composition = list(self.shoe.composition())
+        composition[self.bot_hand[1] - 1] += 1
+        return odds(self.player_hand, self.bot_hand[0], tuple(composition))
+
+    def get_winner(self):
+        player_total = self.player_total
+        bot_total = self.bot_total
+        if player_total > 21:
+            return "bot"
+        elif bot_total > 21 or player_total > bot_total:
+            return "player"
+        elif player_total < bot_total:
+            return "bot"
+        else:
+            return "tie"
+
+    # Ledger outcome for a finished hand
+    @property
+    def outcome(self):
+        return {"player": "win", "bot": "loss", "tie": "tie"}[self.get_winner()]
+
+    # Returned to the player, stake included (a tie loses the stake)
+    @property
+    def payout(self):
+        return self.bet * BLACKJACK_PAYOUT if self.get_winner() == "player" else 0
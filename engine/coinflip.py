@@ -0,0 +1,42 @@
+import random
+from typing import NamedTuple
+
+import numpy as np
+
+from engine.rules import COINFLIP_PAYOUT
+
+SIDES = ["heads", "tails"]
+
+
+class CoinflipRound(NamedTuple):
+    choice: str
+    result: str
+    outcome: str  # "win" or "loss"
+    payout: int  # Returned to the player, stake included
+
+
+def play(bet, choice, rng=random):
+    choice = choice.lower()
+    if choice not in SIDES:
+        raise ValueError(f"choice must be one of {SIDES}")
+    result = rng.choice(SIDES)
+    if result == choice:
+        return CoinflipRound(choice, result, "win", bet * COINFLIP_PAYOUT)
+    return CoinflipRound(choice, result, "loss", 0)
+
+
+class CoinflipBatch(NamedTuple):
+    payouts: list  # Per round, stake included
+    outcomes: list
+    wins: int
+
+
+# Many flips on the same call, drawn in one vectorized step (numpy Generator)
+def play_many(bet, choice, rounds, generator=None):
+    choice = choice.lower()
+    if choice not in SIDES:
+        raise ValueError(f"choice must be one of {SIDES}")
+    generator = np.random.default_rng() if generator is None else generator
+    won = generator.integers(0, len(SIDES), rounds) == SIDES.index(choice)
+    payouts = np.where(won, bet * COINFLIP_PAYOUT, 0)
+    return CoinflipBatch(payouts.tolist(), np.where(won, "win", "loss").tolist(), int(won.sum()))
@@ -0,0 +1,37 @@
+import random
+from typing import NamedTuple
+
+import numpy as np
+
+from engine.rules import DICE_PAYOUT, DICE_SIDES
+
+
+class DiceRound(NamedTuple):
+    user_roll: int
+    bot_roll: int
+    outcome: str  # "win" or "loss"
+    payout: int  # Returned to the player, stake included
+
+
+# Both roll a die; matching rolls pay DICE_PAYOUT times the bet
+def play(bet, rng=random):
+    user_roll = rng.randint(1, DICE_SIDES)
+    bot_roll = rng.randint(1, DICE_SIDES)
+    if user_roll == bot_roll:
+        return DiceRound(user_roll, bot_roll, "win", bet * DICE_PAYOUT)
+    return DiceRound(user_roll, bot_roll, "loss", 0)
+
+
+class DiceBatch(NamedTuple):
+    payouts: list  # Per round, stake included
+    outcomes: list
+    wins: int
+
+
+# Many rounds drawn in one vectorized step (numpy Generator)
+def play_many(bet, rounds, generator=None):
+    generator = np.random.default_rng() if generator is None else generator
+    rolls = generator.integers(1, DICE_SIDES + 1, (2, rounds))
+    won = rolls[0] == rolls[1]
+    payouts = np.where(won, bet * DICE_PAYOUT, 0)
+    return DiceBatch(payouts.tolist(), np.where(won, "win", "loss").tolist(), int(won.sum()))
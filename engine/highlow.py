@@ -0,0 +1,32 @@
+import random
+from typing import NamedTuple
+
+from engine.rules import card_values, pay_table
+
+CARDS = list(card_values.keys())
+
+
+class HighLowRound(NamedTuple):
+    old_card: str
+    new_card: str
+    choice: str  # "higher" or "lower"
+    outcome: str  # "win" or "loss"
+    multiplier: float
+    payout: int  # Returned to the player, stake included
+
+
+def draw_card(rng=random):
+    return rng.choice(CARDS)
+
+
+# Guess whether the next card is higher or lower; a win pays by the gap between the cards
+def guess(bet, current_card, choice, rng=random):
+    if choice not in ("higher", "lower"):
+        raise ValueError("choice must be 'higher' or 'lower'")
+    new_card = draw_card(rng)
+    old_val = card_values[current_card]
+    new_val = card_values[new_card]
+
+    won = (choice == "higher" and new_val > old_val) or (choice == "lower" and new_val < old_val)
+    multiplier = pay_table[abs(old_val - new_val)] if won else 0
+    return HighLowRound(current_card, new_card, choice, "win" if won else "loss", multiplier, int(bet * multiplier))
@@ -0,0 +1,33 @@
+import random
+from typing import NamedTuple
+
+from engine.rules import RPS_PAYOUT
+
+CHOICES = ["🪨", "📄", "✂️"]
+BEATS = {"🪨": "✂️", "📄": "🪨", "✂️": "📄"}
+
+
+class RPSRound(NamedTuple):
+    user_choice: str
+    bot_choice: str
+    outcome: str  # "win", "loss" or "tie"
+    payout: int  # Returned to the player, stake included
+
+
+def determine_winner(user, bot):
+    if user == bot:
+        return "tie"
+    elif BEATS[user] == bot:
+        return "win"
+    else:
+        return "loss"
+
+
+# Win pays RPS_PAYOUT times the bet, a tie returns the stake
+def play(bet, user_choice, rng=random):
+    if user_choice not in BEATS:
+        raise ValueError(f"choice must be one of {CHOICES}")
+    bot_choice = rng.choice(CHOICES)
+    outcome = determine_winner(user_choice, bot_choice)
+    payout = {"win": bet * RPS_PAYOUT, "tie": bet, "loss": 0}[outcome]
+    return RPSRound(user_choice, bot_choice, outcome, payout)
@@ -0,0 +1,43 @@
+# Game rules and payouts shared by the bot and the simulator.
+# Change a payout here and both the live games and simulator.py pick it up.
+
+# Payout multipliers are the total returned on a win, stake included
+DICE_SIDES = 6
+DICE_PAYOUT = 2  # Both rolls match
+COINFLIP_PAYOUT = 2
+RPS_PAYOUT = 2  # A tie returns the stake
+BLACKJACK_PAYOUT = 2  # A tie loses the stake
+BLACKJACK_DECKS = 6  # Cards come from a shoe of this many decks
+BLACKJACK_PENETRATION = 0.75  # Reshuffle before the next hand once this share is dealt
+DEALER_STANDS_ON = 17  # Including soft 17
+
+# Slots: three matching symbols win. The first spin pays 2x the bet on top of the
+# stake; "Play Again" spins pay 1.5x after a win and 2x after a loss.
+EMOJIS = ["🍒", "🍋", "🍉", "⭐", "🔔", "🍇"]
+SLOTS_FIRST_MULTIPLIER = 2.0
+SLOTS_MULTIPLIER_AFTER_WIN = 1.5
+SLOTS_MULTIPLIER_AFTER_LOSS = 2.0
+
+# === High-Low Game Logic ===
+card_values = {
+    "2": 2, "3": 3, "4": 4, "5": 5, "6": 6,
+    "7": 7, "8": 8, "9": 9, "10": 10,
+    "J": 11, "Q": 12, "K": 13, "A": 14
+}
+
+# === Pay Table ===
+pay_table = {  # ← Pay table for win multiplier
+    1: 1.0,
+    2: 1.2,
+    3: 1.4,
+    4: 1.6,
+    5: 1.8,
+    6: 2.0,
+    7: 2.5,
+    8: 3.0,
+    9: 4.0,
+    10: 5.0,
+    11: 7.0,
+    12: 10.0,
+    13: 15.0
+}
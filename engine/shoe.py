@@ -0,0 +1,132 @@
+import random
+from array import array
+from functools import lru_cache
+
+from engine.rules import BLACKJACK_DECKS, BLACKJACK_PENETRATION, DEALER_STANDS_ON
+
+# Card ranks by blackjack value: 1 is the ace (counted 11 while that doesn't bust),
+# 10 covers tens and faces
+RANKS = range(1, 11)
+CARDS_PER_DECK = {rank: 16 if rank == 10 else 4 for rank in RANKS}
+DEALER_FINALS = ("17", "18", "19", "20", "21", "bust")
+
+
+# Best total of a hand and whether an ace is being counted as 11
+def hand_total(cards):
+    total = sum(cards)
+    if 1 in cards and total + 10 <= 21:
+        return total + 10, True
+    return total, False
+
+
+def card_label(rank):
+    return "A" if rank == 1 else str(rank)
+
+
+# An N-deck shoe as a byte array of ranks plus remaining counts per rank.
+# Shuffled with Fisher-Yates from the last card down (card i swaps with
+# floor(rng.random() * (i + 1))), starting from the cards in rank order.
+class Shoe:
+    def __init__(self, decks=BLACKJACK_DECKS, penetration=BLACKJACK_PENETRATION, rng=None):
+        self.decks = decks
+        self.penetration = penetration
+        self.full = tuple(CARDS_PER_DECK[rank] * decks for rank in RANKS)
+        self.size = sum(self.full)
+        self.cards = array("B")
+        self.counts = array("H", (0,) * 11)  # Remaining cards by rank, index 0 unused
+        self.position = self.size  # Next card to deal; a new shoe starts out needing a shuffle
+        self.shuffles = 0
+        self.shuffle_proof = None  # Draws used for the last shuffle, if the rng reports them (rng.RoundDraws)
+        self.epoch = None  # Seed epoch of the last shuffle, likewise
+        if rng is not None:
+            self.shuffle(rng)
+
+    @property
+    def needs_shuffle(self):
+        return self.position >= self.size * self.penetration
+
+    def shuffle(self, rng=random):
+        cards = array("B", (rank for rank, count in zip(RANKS, self.full) for _ in range(count)))
+        for i in range(self.size - 1, 0, -1):
+            j = int(rng.random() * (i + 1))
+            cards[i], cards[j] = cards[j], cards[i]
+        self.cards = cards
+        self.counts = array("H", (0, *self.full))
+        self.position = 0
+        self.shuffles += 1
+        self.shuffle_proof = getattr(rng, "proof", None)
+        self.epoch = getattr(rng, "epoch", None)
+
+    # Plain data for saving a shoe in play (the session journal), and back
+    def to_dict(self):
+        return {"decks": self.decks, "penetration": self.penetration, "cards": self.cards.tobytes().hex(),
+                "position": self.position, "shuffles": self.shuffles, "shuffle_proof": self.shuffle_proof,
+                "epoch": self.epoch}
+
+    @classmethod
+    def from_dict(cls, data):
+        shoe = cls(data["decks"], data["penetration"])
+        shoe.cards = array("B", bytes.fromhex(data["cards"]))
+        shoe.position = data["position"]
+        shoe.shuffles = data["shuffles"]
+        shoe.shuffle_proof = data["shuffle_proof"]
+        shoe.epoch = data.get("epoch")
+        counts = [0, *shoe.full]
+        for rank in shoe.cards[:shoe.position]:
+            counts[rank] -= 1  # Dealt already
+        shoe.counts = array("H", counts)
+        return shoe
+
+    def deal(self):
+        if self.position >= self.size:
+            raise RuntimeError("shoe is empty")
+        rank = self.cards[self.position]
+        self.position += 1
+        self.counts[rank] -= 1
+        return rank
+
+    # Remaining cards by rank (ace .. ten), the key for dealer_table()
+    def composition(self):
+        return tuple(self.counts[1:])
+
+
+# Probability of each dealer final (17..21, bust) for every upcard, when the dealer draws
+# from a shoe with this composition. Each draw uses the composition's rank frequencies,
+# which is exact for the first card and a close approximation after that. Cached per
+# composition, so all tables showing the same shoe state share one computation.
+@lru_cache(maxsize=4096)
+def dealer_table(composition):
+    remaining = sum(composition)
+    probs = [count / remaining for count in composition]
+    memo = {}
+
+    def finals(hard, ace):
+        best = hard + 10 if ace and hard + 10 <= 21 else hard
+        if best > 21:
+            return (0.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+        if best >= DEALER_STANDS_ON:
+            return tuple(1.0 if i == best - 17 else 0.0 for i in range(6))
+        key = (hard, ace)
+        if key not in memo:
+            total = [0.0] * 6
+            for rank, p in zip(RANKS, probs):
+                if p:
+                    for i, q in enumerate(finals(hard + rank, ace or rank == 1)):
+                        total[i] += p * q
+            memo[key] = tuple(total)
+        return memo[key]
+
+    return {upcard: finals(upcard, upcard == 1) for upcard in RANKS}
+
+
+# Odds of standing on `player_total` against `upcard`, and of busting on one more card.
+# `composition` must be what the player can't see: the shoe plus the dealer's hole card.
+def odds(player_cards, upcard, composition):
+    player_total, soft = hand_total(player_cards)
+    finals = dealer_table(composition)[upcard]
+    win = finals[5] + sum(p for total, p in zip(range(17, 22), finals[:5]) if total < player_total)
+    push = finals[player_total - 17] if 17 <= player_total <= 21 else 0.0
+    remaining = sum(composition)
+    hard = sum(player_cards)
+    bust = 0.0 if soft else sum(count for rank, count in zip(RANKS, composition) if hard + rank > 21) / remaining
+    return {"win": win, "push": push, "lose": 1.0 - win - push, "bust_on_hit": bust}
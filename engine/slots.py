@@ -0,0 +1,26 @@
+import random
+from typing import NamedTuple
+
+from engine.rules import EMOJIS, SLOTS_FIRST_MULTIPLIER, SLOTS_MULTIPLIER_AFTER_LOSS, SLOTS_MULTIPLIER_AFTER_WIN
+
+
+class SlotsRound(NamedTuple):
+    reels: list
+    outcome: str  # "win" or "loss"
+    winnings: int  # Paid on top of the stake
+    payout: int  # Returned to the player, stake included
+    next_multiplier: float  # Multiplier for the next "Play Again" spin
+
+
+# A random, purely cosmetic frame for the spin animation
+def spinning_frame(rng=random):
+    return rng.choices(EMOJIS, k=3)
+
+
+# Three matching symbols win `multiplier` times the bet on top of the stake
+def spin(bet, multiplier=SLOTS_FIRST_MULTIPLIER, rng=random):
+    reels = [rng.choice(EMOJIS) for _ in range(3)]
+    if reels[0] == reels[1] == reels[2]:
+        winnings = int(bet * multiplier)
+        return SlotsRound(reels, "win", winnings, bet + winnings, SLOTS_MULTIPLIER_AFTER_WIN)
+    return SlotsRound(reels, "loss", 0, 0, SLOTS_MULTIPLIER_AFTER_LOSS)
@@ -0,0 +1,222 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from ledger import GAMES, HEADER, OUTCOMES, RECORD_DTYPE
+
+# Ledger and balance exports for staff reconciliation, run by /export as a separate
+# process so the bot's event loop never waits on it:
+#
+#   python export.py csv --ledger transactions.ledger --count 1000 --balances balances.npz
+#
+# The ledger is read through a memmap in fixed-size chunks and
+# every row is streamed straight to the output, so memory stays flat however long the
+# ledger is; the per-game and per-day aggregates are accumulated chunk by chunk.
+#
+#   xlsx: one workbook (XlsxWriter constant_memory mode) with Transactions, Balances,
+#         By game and By day sheets
+#   csv:  a zip with one CSV per sheet
+
+CHUNK_ROWS = 65536
+XLSX_MAX_ROWS = 1048576  # Excel's limit per sheet, header row included
+EXPORT_DIR = "exports"
+FORMATS = ("xlsx", "csv")
+
+TRANSACTION_COLUMNS = ("Record", "Time (UTC)", "User", "Game", "Outcome", "Stake", "Payout", "Net", "Balance after")
+BALANCE_COLUMNS = ("User", "Balance")
+GAME_COLUMNS = ("Game", "Records", "Wagered", "Paid", "House net", "RTP")
+DAY_COLUMNS = ("Day (UTC)", "Records", "Wagered", "Paid", "House net", "Active users")
+
+
+def _time_label(timestamp):
+    if timestamp <= 0:
+        return ""  # Imported legacy records have no timestamp
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _day_label(day):
+    if day < 0:
+        return "undated"
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))).isoformat()
+
+
+def _rtp(wagered, paid):
+    return round(paid / wagered, 4) if wagered else ""
+
+
+# Per-game and per-day sums over the exported records, updated one chunk at a time
+class Totals:
+    def __init__(self):
+        size = len(GAMES)
+        self.game_records = np.zeros(size, dtype=np.int64)
+        self.game_stake = np.zeros(size, dtype=np.int64)
+        self.game_payout = np.zeros(size, dtype=np.int64)
+        self.days = {}  # day number (-1 undated) -> [records, stake, payout, set of users]
+
+    def add(self, chunk):
+        games = chunk["game"].astype(np.intp)
+        stake = chunk["stake"]
+        payout = chunk["payout"]
+        size = len(GAMES)
+        self.game_records += np.bincount(games, minlength=size)[:size]
+        self.game_stake += np.bincount(games, weights=stake, minlength=size)[:size].astype(np.int64)
+        self.game_payout += np.bincount(games, weights=payout, minlength=size)[:size].astype(np.int64)
+
+        timestamps = chunk["timestamp"]
+        days = np.where(timestamps > 0, np.floor(timestamps / 86400), -1).astype(np.int64)
+        for day in np.unique(days).tolist():
+            in_day = days == day
+            totals = self.days.setdefault(day, [0, 0, 0, set()])
+            totals[0] += int(in_day.sum())
+            totals[1] += int(stake[in_day].sum())
+            totals[2] += int(payout[in_day].sum())
+            totals[3].update(np.unique(chunk["user"][in_day]).tolist())
+
+    def game_rows(self):
+        for code, game in enumerate(GAMES):
+            records = int(self.game_records[code])
+            if not records:
+                continue
+            wagered, paid = int(self.game_stake[code]), int(self.game_payout[code])
+            yield game, records, wagered, paid, wagered - paid, _rtp(wagered, paid)
+
+    def day_rows(self):
+        for day in sorted(self.days):
+            records, wagered, paid, users = self.days[day]
+            yield _day_label(day), records, wagered, paid, wagered - paid, len(users)
+
+
+# Ledger records in chunks, optionally only those at or after `since` (unix time)
+def ledger_chunks(path, count, since=None):
+    if count == 0:
+        return
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+    for start in range(0, count, CHUNK_ROWS):
+        chunk = np.array(records[start:start + CHUNK_ROWS])  # Copy out of the map, one chunk at a time
+        numbers = np.arange(start + 1, start + 1 + len(chunk))
+        if since is not None:
+            keep = chunk["timestamp"] >= since
+            chunk, numbers = chunk[keep], numbers[keep]
+        if len(chunk):
+            yield chunk, numbers
+
+
+def transaction_rows(chunk, numbers):
+    columns = zip(numbers.tolist(), chunk["timestamp"].tolist(), chunk["user"].tolist(), chunk["game"].tolist(),
+                  chunk["outcome"].tolist(), chunk["stake"].tolist(), chunk["payout"].tolist(),
+                  chunk["balance_after"].tolist())
+    for number, timestamp, user, game, outcome, stake, payout, balance_after in columns:
+        # Ids as text: spreadsheets round integers beyond 15 digits
+        yield number, _time_label(timestamp), str(user), GAMES[game], OUTCOMES[outcome], stake, payout, payout - stake, balance_after
+
+
+# Richest first; `user_ids` and `amounts` are parallel arrays
+def balance_rows(user_ids, amounts):
+    order = np.argsort(-amounts, kind="stable")
+    for user, amount in zip(user_ids[order].tolist(), amounts[order].tolist()):
+        yield str(user), amount
+
+
+def _write_xlsx(path, ledger_path, count, user_ids, amounts, since):
+    import xlsxwriter  # Only the worker process needs it
+
+    totals = Totals()
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    bold = workbook.add_format({"bold": True})
+
+    def new_sheet(name, columns):
+        sheet = workbook.add_worksheet(name)
+        sheet.write_row(0, 0, columns, bold)
+        sheet.freeze_panes(1, 0)
+        return sheet
+
+    part = 1
+    sheet = new_sheet("Transactions", TRANSACTION_COLUMNS)
+    row = 1
+    for chunk, numbers in ledger_chunks(ledger_path, count, since):
+        totals.add(chunk)
+        for values in transaction_rows(chunk, numbers):
+            if row == XLSX_MAX_ROWS:
+                part += 1
+                sheet = new_sheet(f"Transactions {part}", TRANSACTION_COLUMNS)
+                row = 1
+            sheet.write_row(row, 0, values)
+            row += 1
+
+    for name, columns, rows in (
+        ("Balances", BALANCE_COLUMNS, balance_rows(user_ids, amounts)),
+        ("By game", GAME_COLUMNS, totals.game_rows()),
+        ("By day", DAY_COLUMNS, totals.day_rows()),
+    ):
+        sheet = new_sheet(name, columns)
+        for row, values in enumerate(rows, start=1):
+            sheet.write_row(row, 0, values)
+    workbook.close()
+
+
+def _write_csv(path, ledger_path, count, user_ids, amounts, since):
+    totals = Totals()
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        def write(name, columns, rows):
+            with archive.open(name, "w", force_zip64=True) as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as text:
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                writer.writerows(rows)
+
+        def all_transactions():
+            for chunk, numbers in ledger_chunks(ledger_path, count, since):
+                totals.add(chunk)
+                yield from transaction_rows(chunk, numbers)
+
+        write("transactions.csv", TRANSACTION_COLUMNS, all_transactions())
+        write("balances.csv", BALANCE_COLUMNS, balance_rows(user_ids, amounts))
+        write("by_game.csv", GAME_COLUMNS, totals.game_rows())
+        write("by_day.csv", DAY_COLUMNS, totals.day_rows())
+
+
+# `count` is the number of ledger records to export (records appended meanwhile are
+# left out); returns (path, seconds).
+def export(fmt, ledger_path, count, user_ids, amounts, since=None, directory=EXPORT_DIR):
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    extension = "xlsx" if fmt == "xlsx" else "zip"
+    # A unique name, however many exports (from however many processes) start in the same second
+    handle, path = tempfile.mkstemp(prefix=time.strftime("casino-export-%Y%m%d-%H%M%S-"), suffix=f".{extension}", dir=directory)
+    os.close(handle)  # The writer replaces the empty file
+    writer = _write_xlsx if fmt == "xlsx" else _write_csv
+    try:
+        writer(path, ledger_path, count, user_ids, amounts, since)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, time.perf_counter() - started
+
+
+# Prints {"path": ..., "seconds": ...} as the last line of output for the bot
+def main():
+    parser = argparse.ArgumentParser(description="Export the ledger, balances and per-game/per-day totals")
+    parser.add_argument("format", choices=FORMATS)
+    parser.add_argument("--ledger", required=True, help="Ledger file")
+    parser.add_argument("--count", type=int, required=True, help="Ledger records to export")
+    parser.add_argument("--balances", required=True, help=".npz file with user_ids and amounts arrays")
+    parser.add_argument("--since", type=float, help="Only transactions at or after this unix time")
+    parser.add_argument("--directory", default=EXPORT_DIR)
+    args = parser.parse_args()
+    with np.load(args.balances) as saved:
+        user_ids, amounts = saved["user_ids"], saved["amounts"]
+    path, seconds = export(args.format, args.ledger, args.count, user_ids, amounts, args.since, args.directory)
+    print(json.dumps({"path": path, "seconds": seconds}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from array import array
+
+import numpy as np
+
+from ledger import GAME_CODES
+
+
+# Per-user offset index into the ledger.
+# Maps user id -> the record numbers of that user's transactions, in append order,
+# so a page of history is a slice + a few memmap reads no matter how big the ledger is.
+class HistoryIndex:
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self._offsets = {}  # user id -> array("Q") of record numbers
+        self.rebuild()
+
+    # Build the index with one vectorized pass over the ledger
+    def rebuild(self):
+        self._offsets = {}
+        users = self.ledger.view()["user"]
+        if len(users) == 0:
+            return
+        order = np.argsort(users, kind="stable").astype(np.uint64)
+        sorted_users = users[order]
+        starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self._offsets[int(sorted_users[start])] = array("Q", order[start:end].tobytes())
+
+    def add(self, user_id, record_number):
+        offsets = self._offsets.get(user_id)
+        if offsets is None:
+            offsets = self._offsets[user_id] = array("Q")
+        offsets.append(record_number)
+
+    # One page of a user's records, newest first. Returns (records, total matching).
+    # Without filters this only touches the records on the page; filters scan just
+    # this user's records, never the whole ledger.
+    def page(self, user_id, page=1, per_page=10, game=None, since=None, until=None):
+        offsets = self._offsets.get(int(user_id))
+        if not offsets:
+            return [], 0
+        view = self.ledger.view()
+        offsets = np.frombuffer(offsets, dtype=np.uint64)
+
+        if game is not None or since is not None or until is not None:
+            records = view[offsets]
+            keep = np.ones(len(records), dtype=bool)
+            if game is not None:
+                keep &= records["game"] == GAME_CODES[game]
+            if since is not None:
+                keep &= records["timestamp"] >= since
+            if until is not None:
+                keep &= records["timestamp"] < until
+            offsets = offsets[keep]
+
+        total = len(offsets)
+        end = total - (page - 1) * per_page
+        if end <= 0:
+            return [], total
+        start = max(0, end - per_page)
+        return list(view[offsets[start:end]][::-1]), total
@@ -0,0 +1,101 @@
+import heapq
+import time
+
+LEADERBOARD_SIZE = 10
+WINDOWS = {"day": 86400, "week": 7 * 86400}
+BUCKET_SECONDS = 3600
+
+
+# Incrementally maintained top-K over a keyed value (e.g. balances).
+# Keeps a small candidate set of `capacity` keys; every key outside it is known to
+# be <= `floor`. Updates are O(1) amortized, queries sort only the candidates, and
+# a full rebuild from `source` happens only when too many candidates drop out.
+class TopK:
+    def __init__(self, k, source, slack=4):
+        self.k = k
+        self.capacity = k * slack
+        self.source = source  # Callable yielding every (key, value) pair
+        self._members = {}
+        self._floor = None  # None means nobody outside the candidate set
+        self._cache = None
+        self._stale = True
+
+    def rebuild(self):
+        top = heapq.nlargest(self.capacity + 1, self.source(), key=lambda item: item[1])
+        self._members = dict(top[:self.capacity])
+        self._floor = top[self.capacity][1] if len(top) > self.capacity else None
+        self._stale = False
+        self._cache = None
+
+    def update(self, key, value):
+        if self._stale:
+            return  # Next query rebuilds anyway
+        members = self._members
+        if key in members:
+            if self._floor is not None and value < self._floor:
+                del members[key]  # Could now rank below keys we don't track
+                if len(members) < self.k:
+                    self._stale = True
+            else:
+                members[key] = value
+        elif self._floor is None or value > self._floor:
+            members[key] = value
+            if len(members) > self.capacity:
+                evicted = min(members, key=members.get)
+                evicted_value = members.pop(evicted)
+                self._floor = evicted_value if self._floor is None else max(self._floor, evicted_value)
+        else:
+            return
+        self._cache = None
+
+    def top(self):
+        if self._stale:
+            self.rebuild()
+        if self._cache is None:
+            self._cache = sorted(self._members.items(), key=lambda item: item[1], reverse=True)[:self.k]
+        return self._cache
+
+
+# Biggest single-round wins per game, kept as a bounded min-heap per hourly bucket,
+# so a windowed query merges at most one small heap per hour in the window.
+class BigWins:
+    def __init__(self, k=LEADERBOARD_SIZE, max_window=max(WINDOWS.values())):
+        self.k = k
+        self.max_buckets = max_window // BUCKET_SECONDS + 1
+        self._buckets = {}  # game -> {bucket number: heap of (net, timestamp, user)}
+        self._all_time = {}  # game -> heap of (net, timestamp, user)
+
+    @staticmethod
+    def _push(heap, entry, k):
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def record(self, game, user_id, net, timestamp=None):
+        if net <= 0:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = (net, timestamp, user_id)
+        self._push(self._all_time.setdefault(game, []), entry, self.k)
+        if not timestamp:
+            return  # Legacy records have no time, they only count all-time
+        buckets = self._buckets.setdefault(game, {})
+        bucket = int(timestamp // BUCKET_SECONDS)
+        self._push(buckets.setdefault(bucket, []), entry, self.k)
+        if len(buckets) > self.max_buckets:
+            for old in [b for b in buckets if b <= bucket - self.max_buckets]:
+                del buckets[old]
+
+    # Top wins for a game in the last `window` seconds (None = all time)
+    def top(self, game, window=None, now=None):
+        if window is None:
+            return sorted(self._all_time.get(game, []), reverse=True)
+        now = time.time() if now is None else now
+        first_bucket = int((now - window) // BUCKET_SECONDS)
+        entries = [
+            entry
+            for bucket, heap in self._buckets.get(game, {}).items() if bucket >= first_bucket
+            for entry in heap if entry[1] >= now - window
+        ]
+        return heapq.nlargest(self.k, entries)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+# Game and outcome codes stored in each record (append only, never renumber)
+GAMES = ("legacy", "dice", "coinflip", "blackjack", "slots", "rps", "highlow", "admin", "deposit", "withdrawal")
+OUTCOMES = ("unknown", "win", "loss", "tie", "credit", "debit")
+GAME_CODES = {name: code for code, name in enumerate(GAMES)}
+OUTCOME_CODES = {name: code for code, name in enumerate(OUTCOMES)}
+
+# File layout: a 16 byte header followed by fixed-size little-endian records
+LEDGER_MAGIC = b"CLDG"
+LEDGER_VERSION = 1
+HEADER = struct.Struct("<4sII4x")  # magic, version, record size
+RECORD = struct.Struct("<dQqqqBB6x")  # timestamp, user, stake, payout, balance_after, game, outcome
+RECORD_DTYPE = np.dtype({
+    "names": ["timestamp", "user", "stake", "payout", "balance_after", "game", "outcome"],
+    "formats": ["<f8", "<u8", "<i8", "<i8", "<i8", "u1", "u1"],
+    "offsets": [0, 8, 16, 24, 32, 40, 41],
+    "itemsize": RECORD.size,
+})
+
+# Free-text descriptions written before records were structured
+LEGACY_PATTERNS = [
+    (re.compile(r"Rolled \d+, Bot rolled \d+\. Won \$(\d+)"), "dice", "win"),
+    (re.compile(r"Rolled \d+, Bot rolled \d+\. Lost \$(\d+)"), "dice", "loss"),
+    (re.compile(r"Bet on \w+, landed \w+\. Won \$(\d+)"), "coinflip", "win"),
+    (re.compile(r"Bet on \w+, landed \w+\. Lost \$(\d+)"), "coinflip", "loss"),
+    (re.compile(r"Blackjack win: \+\$(\d+)"), "blackjack", "win"),
+    (re.compile(r"Blackjack loss: -\$(\d+)"), "blackjack", "loss"),
+    (re.compile(r"Admin increased balance by \$(\d+)"), "admin", "credit"),
+    (re.compile(r"Admin decreased balance by \$(\d+)"), "admin", "debit"),
+]
+
+
+# Turn a legacy description into (game, stake, payout, outcome)
+def parse_legacy(description):
+    for pattern, game, outcome in LEGACY_PATTERNS:
+        match = pattern.fullmatch(description)
+        if not match:
+            continue
+        amount = int(match.group(1))
+        if outcome == "win":  # Old messages quoted the 2x payout, not the stake
+            return game, amount // 2, amount, outcome
+        if outcome == "credit":
+            return game, 0, amount, outcome
+        return game, amount, 0, outcome
+    return "legacy", 0, 0, "unknown"
+
+
+# Human readable one-liner for a record (numpy row or dict-like)
+def describe(record):
+    game = GAMES[record["game"]]
+    outcome = OUTCOMES[record["outcome"]]
+    stake, payout = int(record["stake"]), int(record["payout"])
+    if outcome == "credit":
+        return f"{game.title()}: +${payout}"
+    if outcome == "debit":
+        return f"{game.title()}: -${stake}"
+    net = payout - stake
+    sign = "+" if net >= 0 else "-"
+    return f"{game.title()} {outcome}: bet ${stake}, paid ${payout} ({sign}${abs(net)})"
+
+
+# Append-only transaction ledger of fixed-size structured records.
+# Records are struct-packed on append and read back through a numpy memmap, so
+# audits and aggregates are vector scans. fsync is batched (group commit): appends
+# only hit the file buffer, and run_group_commit() flushes + fsyncs them together.
+class Ledger:
+    def __init__(self, path, sync_interval=0.5, sync_batch=256):
+        self.path = path
+        self.sync_interval = sync_interval  # Max seconds a record may wait for fsync
+        self.sync_batch = sync_batch  # Pending records that trigger an early fsync
+        self.pending = 0
+        self.sync_count = 0
+        self.last_sync_seconds = 0.0
+        self.on_sync = None  # Optional callback(seconds) after each group commit
+        self._wakeup = asyncio.Event()
+        self._prepare_file()
+        self.count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        self._file = open(path, "ab")
+
+    # Write the header for a new file, or drop a torn last record left by a crash
+    def _prepare_file(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as file:
+                file.write(HEADER.pack(LEDGER_MAGIC, LEDGER_VERSION, RECORD.size))
+            return
+        with open(self.path, "rb+") as file:
+            magic, version, record_size = HEADER.unpack(file.read(HEADER.size))
+            if magic != LEDGER_MAGIC or version != LEDGER_VERSION or record_size != RECORD.size:
+                raise ValueError(f"{self.path} is not a version {LEDGER_VERSION} ledger")
+            size = os.path.getsize(self.path)
+            torn = (size - HEADER.size) % RECORD.size
+            if torn:
+                file.truncate(size - torn)
+                print(f"⚠️ Warning: dropped a partial record at the end of {self.path}.")
+
+    def is_empty(self):
+        return self.count == 0
+
+    def append(self, user_id, game, stake, payout, outcome, balance_after, timestamp=None):
+        self._file.write(RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            int(user_id), stake, payout, balance_after,
+            GAME_CODES[game], OUTCOME_CODES[outcome],
+        ))
+        index = self.count
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.sync_batch:
+            self._wakeup.set()
+        return index
+
+    # Append several records with one write; returns the record number of the first.
+    # rows: (user_id, game, stake, payout, outcome, balance_after)
+    def append_many(self, rows, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self._file.write(b"".join(
+            RECORD.pack(timestamp, int(user_id), stake, payout, balance_after, GAME_CODES[game], OUTCOME_CODES[outcome])
+            for user_id, game, stake, payout, outcome, balance_after in rows
+        ))
+        first = self.count
+        self.count += len(rows)
+        self.pending += len(rows)
+        if self.pending >= self.sync_batch:
+            self._wakeup.set()
+        return first
+
+    # Hand buffered records to the OS, so other readers of the file see them (no fsync)
+    def flush(self):
+        self._file.flush()
+
+    # Read-only memory-mapped view of every record written so far
+    def view(self):
+        self._file.flush()
+        if self.count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(self.count,))
+
+    # Import the first of `paths` that exists and has content. Returns (path, records
+    # imported), or None. List the newest format first: it contains the older ones.
+    def import_legacy_files(self, paths):
+        for path in paths:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                return path, self.import_legacy(path)
+        return None
+
+    # Import history from the legacy transactions.json dump or the JSON-lines log
+    # that preceded this format. Legacy entries have no timestamp or balance.
+    def import_legacy(self, path):
+        def merge_pairs(pairs):  # The old writer produced duplicate user keys
+            merged = {}
+            for key, value in pairs:
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                else:
+                    merged[key] = value
+            return merged
+
+        with open(path, "r", encoding="utf-8") as file:
+            if path.endswith(".json"):
+                entries = [
+                    (user_id, text)
+                    for user_id, texts in json.load(file, object_pairs_hook=merge_pairs).items()
+                    for text in texts
+                ]
+            else:
+                entries = []
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    entries.append((record["user"], record["text"]))
+
+        for user_id, text in entries:
+            game, stake, payout, outcome = parse_legacy(text)
+            self.append(user_id, game, stake, payout, outcome, 0, timestamp=0.0)
+        self.sync()
+        return len(entries)
+
+    # Flush and fsync everything appended so far (blocking)
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending = 0
+
+    # Group commit loop: one fsync per interval (or per full batch), off the event loop
+    async def run_group_commit(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.pending:
+                continue
+            started = time.perf_counter()
+            self._file.flush()  # Move buffered records to the OS on the loop thread
+            self.pending = 0
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+            self.sync_count += 1
+            self.last_sync_seconds = time.perf_counter() - started
+            if self.on_sync is not None:
+                self.on_sync(self.last_sync_seconds)
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+# Read-only view of a ledger appended to by another process (the coordinator in a
+# sharded deployment, see coordinator.py). `count` is advanced by the owner's
+# notifications; records past it may still be in flight and are not read.
+class LedgerReader:
+    pending = 0  # Nothing to fsync on this side
+
+    def __init__(self, path, count=0):
+        self.path = path
+        self.count = count
+
+    def is_empty(self):
+        return self.count == 0
+
+    def view(self):
+        if self.count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(self.count,))
+
+    def close(self):
+        pass
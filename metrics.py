@@ -0,0 +1,235 @@
+import bisect
+
+import discord
+
+# In-process metrics served in the Prometheus text format from a small aiohttp endpoint.
+#
+#   METRICS_PORT=9464 python casino_bot.py
+#   curl localhost:9464/metrics
+#
+# Histograms use fixed buckets and keep plain counts, so observe() is one bisect and two
+# additions. Gauges are read from callbacks at scrape time, so nothing has to keep them
+# up to date.
+
+# Discord fails an interaction that isn't answered within 3 seconds, hence the fine
+# resolution below and around that deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 2.5, 3.0, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if isinstance(value, int):
+        return str(value)
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = self.header()
+        for values, child in self._children.items():
+            lines.append(f"{self.name}_total{_labels(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = self.header()
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+# Value(s) read at scrape time: `read` returns a number, or {label values tuple: number}
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, read, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.read = read
+
+    def render(self):
+        lines = self.header()
+        value = self.read()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in samples:
+            if not isinstance(values, tuple):
+                values = (values,)
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(number)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, read, labelnames=()):
+        return self.register(Gauge(name, documentation, read, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # One broken gauge must not take down the scrape
+                lines.append(f"# {metric.name} failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+COMMAND_SECONDS = registry.histogram(
+    "casino_command_seconds", "Slash command handler duration", ["command"])
+COMMAND_ERRORS = registry.counter(
+    "casino_command_errors", "Slash commands that raised", ["command", "error"])
+COMPONENT_SECONDS = registry.histogram(
+    "casino_component_seconds", "Button handler duration", ["action"])
+COMPONENT_ERRORS = registry.counter(
+    "casino_component_errors", "Button handlers that raised", ["action", "error"])
+RESPONSE_SECONDS = registry.histogram(
+    "casino_time_to_response_seconds", "From interaction creation (Discord's clock) to our first response", ["name"])
+FLUSH_SECONDS = registry.histogram(
+    "casino_flush_seconds", "Duration of background saves", ["target"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+THROTTLED = registry.counter(
+    "casino_throttled", "Requests turned away by admission control", ["group", "reason"])
+LOOP_LAG_SECONDS = registry.histogram(
+    "casino_loop_lag_seconds", "How late the event loop ran a timer (see profiler.LoopWatchdog)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+# Name used for an interaction in the metrics: the command, or game:action for a button
+def interaction_name(interaction):
+    if interaction.command is not None:
+        return interaction.command.qualified_name
+    custom_id = (interaction.data or {}).get("custom_id", "")
+    parts = custom_id.split(":")
+    return ":".join(parts[1:3]) if len(parts) >= 3 else "component"
+
+
+# Time every first response (send, edit, defer, modal) against the interaction's
+# creation time. Wraps discord.py's InteractionResponse once, process-wide.
+def instrument_responses():
+    response_class = discord.InteractionResponse
+    if getattr(response_class, "_casino_instrumented", False):
+        return
+    for method_name in ("send_message", "edit_message", "defer", "send_modal"):
+        original = getattr(response_class, method_name)
+
+        def timed(original):
+            async def wrapper(self, *args, **kwargs):
+                result = await original(self, *args, **kwargs)
+                interaction = self._parent
+                elapsed = discord.utils.utcnow() - interaction.created_at
+                RESPONSE_SECONDS.labels(interaction_name(interaction)).observe(max(elapsed.total_seconds(), 0.0))
+                return result
+            return wrapper
+
+        setattr(response_class, method_name, timed(original))
+    response_class._casino_instrumented = True
+
+
+# Serve /metrics on host:port until the bot stops. Returns the aiohttp runner.
+async def serve(host, port):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,278 @@
+import asyncio
+import collections
+import heapq
+import json
+import os
+import random
+import time
+
+import aiohttp
+import discord
+
+from snapshot import Snapshotter
+
+OUTBOUND_RATE = 4.0  # Sends per second, well under Discord's global limit
+OUTBOUND_BURST = 5
+OUTBOUND_MAX_PENDING = 10000
+OUTBOUND_CONCURRENCY = 4  # Sends in flight at once
+ROUTE_INTERVAL = 1.0  # Seconds between sends to one DM channel or one staff message
+MAX_ATTEMPTS = 6
+RETRY_BASE = 2.0  # Seconds before the first retry, doubled for each one after it
+RETRY_MAX = 300.0
+SAVE_INTERVAL = 5
+MESSAGE_LIMIT = 2000  # Discord's message length limit
+BATCH_SEPARATOR = "\n\n"
+
+
+# One DM or staff message edit. Plain data rather than a closure, so whatever is still
+# undelivered can be saved and sent after a restart.
+#   dm:   target is the user id, content the message
+#   edit: target is (channel id, message id), content replaces the message (buttons removed)
+class Notification:
+    __slots__ = ("kind", "target", "content", "attempts")
+
+    def __init__(self, kind, target, content, attempts=0):
+        self.kind = kind
+        self.target = tuple(target) if isinstance(target, list) else target
+        self.content = content
+        self.attempts = attempts
+
+    @property
+    def route(self):
+        return self.kind, self.target
+
+    @property
+    def label(self):
+        if self.kind == "dm":
+            return f"DM to {self.target}"
+        return f"edit of message {self.target[1]}"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Worth another try later: rate limits, Discord server errors and network trouble.
+# Closed DMs (Forbidden), deleted messages (NotFound) and bad requests never succeed.
+def retryable(error):
+    if isinstance(error, (discord.Forbidden, discord.NotFound)):
+        return False
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+def retry_delay(attempts):
+    return min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+# Throttled queue for outbound messages that nobody is waiting on (DMs, staff message
+# edits). Callers submit and return immediately, so a staff click never waits on
+# Discord's DM endpoint. `deliver(notification)` does the actual send.
+#
+#   - at most `concurrency` sends in flight and `rate` per second overall (bursts of
+#     `burst`), so a bulk action never turns into a flood of requests that discord.py
+#     then has to queue behind 429s
+#   - one send at a time per route (a user's DMs, one staff message), at least
+#     ROUTE_INTERVAL apart
+#   - DMs to a user that pile up while waiting are batched into one message (up to
+#     Discord's length limit); a newer edit of a message replaces the queued one
+#   - failures that may pass are retried with exponential backoff, up to MAX_ATTEMPTS
+#   - everything undelivered is saved to `path` and picked up again on the next start
+class OutboundQueue:
+    def __init__(self, deliver, path=None, rate=OUTBOUND_RATE, burst=OUTBOUND_BURST,
+                 concurrency=OUTBOUND_CONCURRENCY, max_pending=OUTBOUND_MAX_PENDING):
+        self.deliver = deliver
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._pending = {}  # route -> deque of Notification, oldest first
+        self._count = 0
+        self._in_flight = {}  # route -> Notification being sent
+        self._ready_at = {}  # route -> monotonic time the route may send again
+        self._schedule = []  # heap of (due, seq, route)
+        self._scheduled = set()
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.batched = 0
+        self.snapshots = Snapshotter(path, capture=self.capture, encode=self.encode) if path else None
+        self.load()
+
+    def __len__(self):
+        return self._count + len(self._in_flight)
+
+    def stats(self):
+        return {"sent": self.sent, "failed": self.failed, "dropped": self.dropped,
+                "retried": self.retried, "batched": self.batched}
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error loading {self.path} ({e}). Undelivered notifications were lost.")
+            return
+        for fields in data.get("pending", []):
+            self._add(Notification(**fields))
+        if self._count:
+            print(f"📨 {self._count} undelivered notification(s) queued again.")
+
+    # In-flight sends are saved too: after a crash mid-send a message may arrive twice,
+    # but never not at all
+    def capture(self):
+        pending = [notification.to_dict() for notification in self._in_flight.values()]
+        for queue in self._pending.values():
+            pending.extend(notification.to_dict() for notification in queue)
+        return {"pending": pending}
+
+    @staticmethod
+    def encode(captured):
+        return json.dumps(captured, indent=4).encode("utf-8")
+
+    def _changed(self):
+        if self.snapshots is not None:
+            self.snapshots.mark_dirty("pending")
+
+    def _wake(self, route, due):
+        if route not in self._scheduled:
+            self._scheduled.add(route)
+            self._seq += 1
+            heapq.heappush(self._schedule, (due, self._seq, route))
+            self._wakeup.set()
+
+    def _add(self, notification):
+        route = notification.route
+        queue = self._pending.get(route)
+        if queue:
+            last = queue[-1]
+            if notification.kind == "edit":
+                last.content = notification.content  # Only the latest text matters
+                self.batched += 1
+                return True
+            combined = f"{last.content}{BATCH_SEPARATOR}{notification.content}"
+            if len(combined) <= MESSAGE_LIMIT:
+                last.content = combined
+                self.batched += 1
+                return True
+        if self._count >= self.max_pending:
+            self.dropped += 1
+            print(f"⚠️ Outbound queue full, dropped {notification.label}.")
+            return False
+        if queue is None:
+            queue = self._pending[route] = collections.deque()
+        queue.append(notification)
+        self._count += 1
+        self._wake(route, time.monotonic())
+        return True
+
+    # Queue a notification. False if the queue is full.
+    def submit(self, notification):
+        added = self._add(notification)
+        if added:
+            self._changed()
+        return added
+
+    def dm(self, user_id, content):
+        return self.submit(Notification("dm", user_id, content))
+
+    def edit(self, channel_id, message_id, content):
+        return self.submit(Notification("edit", (channel_id, message_id), content))
+
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    # Next route with something to send, waiting until one is due
+    async def _next_route(self):
+        while True:
+            now = time.monotonic()
+            if self._schedule and self._schedule[0][0] <= now:
+                _, _, route = heapq.heappop(self._schedule)
+                self._scheduled.discard(route)
+                if route not in self._pending or route in self._in_flight:
+                    continue  # Sent already, or rescheduled when the send in flight ends
+                ready_at = self._ready_at.get(route, 0)
+                if ready_at > now:
+                    self._wake(route, ready_at)
+                    continue
+                return route
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, route):
+        queue = self._pending[route]
+        notification = queue.popleft()
+        if not queue:
+            del self._pending[route]
+        self._count -= 1
+        self._in_flight[route] = notification
+        delay = ROUTE_INTERVAL
+        try:
+            await self._take_token()
+            await self.deliver(notification)
+            self.sent += 1
+        except Exception as e:
+            notification.attempts += 1
+            if retryable(e) and notification.attempts < MAX_ATTEMPTS:
+                self.retried += 1
+                delay = retry_delay(notification.attempts)
+                self._pending.setdefault(route, collections.deque()).appendleft(notification)
+                self._count += 1
+                print(f"⚠️ Failed to send {notification.label} ({e}), retrying in {delay:.0f}s.")
+            else:
+                self.failed += 1
+                print(f"⚠️ Failed to send {notification.label}: {e}")
+        finally:
+            del self._in_flight[route]
+            self._ready_at[route] = time.monotonic() + delay
+            if route in self._pending:
+                self._wake(route, self._ready_at[route])
+            self._changed()
+
+    async def _worker(self):
+        while True:
+            route = await self._next_route()
+            await self._send(route)
+
+    # Forget send times that no longer hold anything back
+    def _prune(self):
+        now = time.monotonic()
+        for route in [route for route, ready_at in self._ready_at.items() if ready_at <= now]:
+            del self._ready_at[route]
+
+    # Background task: the send workers, plus periodic saves of what is undelivered
+    async def run(self):
+        workers = [asyncio.create_task(self._worker(), name=f"outbound_worker_{number}")
+                   for number in range(self.concurrency)]
+        try:
+            while True:
+                await asyncio.sleep(SAVE_INTERVAL)
+                self._prune()
+                if self.snapshots is None:
+                    continue
+                try:
+                    await self.snapshots.flush()
+                except Exception as e:
+                    print(f"⚠️ Saving undelivered notifications failed: {e}")
+        finally:
+            for worker in workers:
+                worker.cancel()
@@ -0,0 +1,145 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+# Sampling profiler and stall detector for the event loop thread.
+#
+# Both run in a plain background thread and read the loop thread's current frame with
+# sys._current_frames(), so the loop itself pays nothing but the GIL switch. Profiles
+# are written as folded stacks ("outer;inner;leaf count" per line), which flamegraph.pl,
+# speedscope and inferno read directly:
+#
+#   flamegraph.pl profiles/profile-20260101-120000.folded > profile.svg
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005  # Seconds between profiler samples
+STALL_THRESHOLD = 0.25  # Loop blocked longer than this gets its stack logged
+HEARTBEAT_INTERVAL = 0.05
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+# Outermost frame first, as flamegraph tools expect
+def _folded(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL, directory=PROFILE_DIR):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.directory = directory
+        self.running = False
+
+    # Sample for `seconds` in a worker thread; await it from the loop so the loop keeps
+    # running (and gets profiled) meanwhile. Returns (path, samples, top frames).
+    async def profile(self, seconds):
+        if self.running:
+            raise RuntimeError("a profile is already running")
+        self.running = True
+        try:
+            stacks = await asyncio.to_thread(self._sample, seconds)
+            path = await asyncio.to_thread(self._write, stacks)
+        finally:
+            self.running = False
+        return path, sum(stacks.values()), self.hottest(stacks)
+
+    def _sample(self, seconds):
+        stacks = collections.Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stacks[_folded(frame)] += 1
+            del frame
+            time.sleep(self.interval)
+        return stacks
+
+    def _write(self, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        with open(path, "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+    # Leaf frames by sample count, ignoring the loop waiting in select()/epoll
+    @staticmethod
+    def hottest(stacks, limit=5):
+        leaves = collections.Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        idle = [leaf for leaf in leaves if leaf.startswith(("select (", "poll (", "_run_once ("))]
+        for leaf in idle:
+            del leaves[leaf]
+        return leaves.most_common(limit)
+
+
+# Always-on loop lag monitor. A heartbeat coroutine stamps the time on every run; a
+# watchdog thread notices when the stamp gets older than `threshold`, i.e. something
+# is holding the loop, and logs the loop thread's stack and the running task once per
+# stall. The lag of every heartbeat is passed to `on_lag` (e.g. a metrics histogram).
+class LoopWatchdog:
+    def __init__(self, threshold=STALL_THRESHOLD, interval=HEARTBEAT_INTERVAL, on_lag=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_lag = on_lag
+        self.loop = None
+        self.thread_id = None
+        self._beat = time.monotonic()
+        self._thread = None
+        self.stalls = 0
+        self.worst = 0.0
+        self.lag = 0.0  # Smoothed over the last second or so of heartbeats
+
+    # Attach to the running loop: starts the heartbeat task and the watchdog thread
+    def start(self, loop):
+        if self._thread is not None:
+            return
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        loop.create_task(self._heartbeat(), name="loop-heartbeat")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._beat = now
+            self.worst = max(self.worst, lag)
+            self.lag += (lag - self.lag) * 0.2
+            if self.on_lag is not None:
+                self.on_lag(lag)
+
+    def _watch(self):
+        reported = None  # Heartbeat stamp of the stall already reported
+        while True:
+            time.sleep(self.interval)
+            beat = self._beat
+            blocked = time.monotonic() - beat
+            if blocked < self.threshold or beat == reported:
+                continue
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self.thread_id)
+            task = asyncio.current_task(self.loop) if self.loop is not None else None
+            name = task.get_name() if task is not None else "a callback"
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (no frame)\n"
+            del frame
+            print(f"🐢 Event loop blocked for {blocked * 1000:.0f} ms+ by {name}:\n{stack}", end="")
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+from snapshot import Snapshotter
+
+KINDS = ("deposit", "withdrawal")
+
+
+# A deposit or withdrawal waiting for staff
+class ReviewRequest:
+    __slots__ = ("id", "kind", "user_id", "amount", "ign", "proof_url", "created_at", "channel_id", "message_id")
+
+    def __init__(self, request_id, kind, user_id, amount, ign=None, proof_url=None, created_at=None, channel_id=None, message_id=None):
+        self.id = request_id
+        self.kind = kind
+        self.user_id = user_id
+        self.amount = amount
+        self.ign = ign
+        self.proof_url = proof_url
+        self.created_at = time.time() if created_at is None else created_at
+        self.channel_id = channel_id  # Staff message with the Accept/Reject buttons
+        self.message_id = message_id
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Pending deposit/withdrawal requests, persisted so the staff buttons keep working
+# after a restart. Requests are indexed by id and by user, and kept in submission
+# order so bulk actions process the oldest first. A request leaves the queue the
+# moment staff take it, so it can never be approved twice.
+class ReviewQueue:
+    def __init__(self, path):
+        self.path = path
+        self._requests = {}  # id -> ReviewRequest, in submission order
+        self._by_user = {}  # user_id -> set of request ids
+        self._next_id = 1
+        self.snapshots = Snapshotter(path, capture=self.capture, encode=self.encode)
+        self.load()
+
+    def __len__(self):
+        return len(self._requests)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error loading {self.path} ({e}). Starting with an empty review queue.")
+            return
+        self._next_id = data.get("next_id", 1)
+        for fields in data.get("pending", []):
+            self._add(ReviewRequest(**fields))
+
+    def capture(self):
+        return {"next_id": self._next_id, "pending": [request.to_dict() for request in self._requests.values()]}
+
+    @staticmethod
+    def encode(captured):
+        return json.dumps(captured, indent=4).encode("utf-8")
+
+    # Persist the queue (off the event loop) if it changed
+    async def save(self):
+        await self.snapshots.flush()
+
+    def _add(self, request):
+        self._requests[request.id] = request
+        self._by_user.setdefault(request.user_id, set()).add(request.id)
+        self._next_id = max(self._next_id, request.id + 1)
+
+    def submit(self, kind, user_id, amount, ign=None, proof_url=None):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}")
+        request = ReviewRequest(self._next_id, kind, int(user_id), amount, ign, proof_url)
+        self._add(request)
+        self.snapshots.mark_dirty(request.id)
+        return request
+
+    # Remember which staff message shows the request
+    def attach(self, request, channel_id, message_id):
+        request.channel_id = channel_id
+        request.message_id = message_id
+        self.snapshots.mark_dirty(request.id)
+
+    def get(self, request_id):
+        return self._requests.get(request_id)
+
+    # Oldest first, optionally only one kind and/or one user
+    def pending(self, kind=None, user_id=None, limit=None):
+        if user_id is not None:
+            ids = sorted(self._by_user.get(int(user_id), ()))
+            requests = (self._requests[request_id] for request_id in ids)
+        else:
+            requests = iter(self._requests.values())
+        result = []
+        for request in requests:
+            if kind is None or request.kind == kind:
+                result.append(request)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    # Remove a request so it can be decided. None if it's gone (already decided).
+    def take(self, request_id):
+        request = self._requests.pop(request_id, None)
+        if request is not None:
+            ids = self._by_user[request.user_id]
+            ids.discard(request_id)
+            if not ids:
+                del self._by_user[request.user_id]
+            self.snapshots.mark_dirty(request_id)
+        return request
+
+    # Put a taken request back (e.g. the withdrawal couldn't be covered), keeping its place
+    def restore(self, request):
+        self._add(request)
+        self._requests = dict(sorted(self._requests.items()))
+        self.snapshots.mark_dirty(request.id)
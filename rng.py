@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import json
+import os
+import secrets
+import time
+
+import numpy as np
+
+from engine.rules import BLACKJACK_DECKS
+from snapshot import write_atomic
+
+# Provably fair randomness for every game.
+#
+# Each epoch has a secret server seed; its SHA-256 hash is published (/fairness) before
+# any round uses it, and the seed itself is revealed when the epoch rotates. Every game
+# draws from its own PCG64 stream derived from the seed and the game name, pre-generated
+# in batches of floats, so a draw on the hot path is just a list index.
+#
+# A round takes a contiguous block of draws and shows its position ("dice epoch 3 draws
+# 120-121"). Anyone holding the revealed seed can regenerate those floats:
+#
+#   python rng.py --seed <revealed seed> --game dice --start 120 --count 2
+#
+# A float f becomes an integer in [low, high] as low + floor(f * (high - low + 1)),
+# and a pick from a list of n items as item[floor(f * n)]. Blackjack draws shuffle the
+# player's shoe (see engine/shoe.py); the hand then shows which shoe cards it used.
+
+POOL_SIZE = 4096  # Floats generated per batch and game
+ROTATE_SECONDS = 24 * 60 * 60
+REVEALED_KEPT = 30  # Past epochs listed by /fairness
+
+# Draws reserved per round: highlow covers the dealt card and the next one, blackjack
+# one full shoe shuffle
+ROUND_DRAWS = {"dice": 2, "coinflip": 1, "rps": 1, "slots": 3, "highlow": 2, "blackjack": BLACKJACK_DECKS * 52 - 1}
+
+
+def seed_hash(seed_hex):
+    return hashlib.sha256(bytes.fromhex(seed_hex)).hexdigest()
+
+
+# Independent stream for one game: the game name is the SeedSequence spawn key
+def game_generator(seed_hex, game):
+    sequence = np.random.SeedSequence(int(seed_hex, 16), spawn_key=tuple(game.encode()))
+    return np.random.Generator(np.random.PCG64(sequence))
+
+
+# Floats `start` .. `start + count - 1` of a game's stream, for verification
+def replay(seed_hex, game, start, count):
+    generator = game_generator(seed_hex, game)
+    generator.bit_generator.advance(start)  # One 64-bit step per float
+    return generator.random(count).tolist()
+
+
+# The draws reserved for one round. Implements the parts of the random.Random API the
+# engines use, plus numpy's integers() for batched rounds, consuming the block in order.
+class RoundDraws:
+    __slots__ = ("game", "epoch", "start", "_floats", "_next")
+
+    def __init__(self, game, epoch, start, floats):
+        self.game = game
+        self.epoch = epoch
+        self.start = start
+        self._floats = floats
+        self._next = 0
+
+    @property
+    def proof(self):
+        return f"{self.game} epoch {self.epoch} draws {self.start}-{self.start + len(self._floats) - 1}"
+
+    def random(self):
+        value = self._floats[self._next]
+        self._next += 1
+        return value
+
+    def randint(self, low, high):
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def choices(self, seq, k=1):
+        return [self.choice(seq) for _ in range(k)]
+
+    # numpy Generator.integers(low, high, size) with an exclusive `high`, for play_many
+    def integers(self, low, high, size):
+        count = int(np.prod(size))
+        floats = np.array(self._floats[self._next:self._next + count])
+        if len(floats) < count:
+            raise IndexError("round ran out of reserved draws")
+        self._next += count
+        return (low + (floats * (high - low)).astype(np.int64)).reshape(size)
+
+
+# Pre-generated float stream for one game within the current epoch
+class GamePool:
+    def __init__(self, game, epoch, seed_hex, pool_size=POOL_SIZE):
+        self.game = game
+        self.epoch = epoch
+        self.pool_size = pool_size
+        self._generator = game_generator(seed_hex, game)
+        self._pool = []
+        self._offset = 0
+        self.position = 0  # Index of the next float in the stream
+        self.batches = 0
+
+    def _refill(self):
+        self._pool = self._generator.random(self.pool_size).tolist()
+        self._offset = 0
+        self.batches += 1
+
+    def take(self, count):
+        start = self.position
+        floats = self._pool[self._offset:self._offset + count]
+        self._offset += len(floats)
+        while len(floats) < count:
+            self._refill()
+            needed = count - len(floats)
+            floats += self._pool[:needed]
+            self._offset = min(needed, len(self._pool))
+        self.position += count
+        return RoundDraws(self.game, self.epoch, start, floats)
+
+
+# Seeds, commitments and per-game pools. The secret seed of the running epoch is kept
+# in `path` so it can still be revealed after a crash; a restart always starts a new
+# epoch (revealing the old one), so draw positions are never reused.
+class RngService:
+    def __init__(self, path, rotate_seconds=ROTATE_SECONDS, pool_size=POOL_SIZE):
+        self.path = path
+        self.rotate_seconds = rotate_seconds
+        self.pool_size = pool_size
+        self.revealed = []  # Newest first: {"epoch", "seed", "hash", "started", "ended"}
+        self.epoch = 0
+        self._seed = None
+        self.seed_hash = None
+        self.started = None
+        self._pools = {}
+        state = self._load()
+        self.revealed = state.get("revealed", [])
+        current = state.get("current")
+        if current:
+            self.epoch = current["epoch"]
+            self._reveal(current["seed"], current["started"])
+        self.rotate()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error loading {self.path} ({e}). Starting a fresh seed history.")
+            return {}
+
+    def _save(self):
+        state = {
+            "current": {"epoch": self.epoch, "seed": self._seed, "hash": self.seed_hash, "started": self.started},
+            "revealed": self.revealed,
+        }
+        write_atomic(self.path, json.dumps(state, indent=4).encode("utf-8"))
+
+    def _reveal(self, seed_hex, started):
+        self.revealed.insert(0, {
+            "epoch": self.epoch,
+            "seed": seed_hex,
+            "hash": seed_hash(seed_hex),
+            "started": started,
+            "ended": time.time(),
+        })
+        del self.revealed[REVEALED_KEPT:]
+
+    # Reveal the running seed and commit to a fresh one. Returns the revealed entry.
+    def rotate(self):
+        if self._seed is not None:
+            self._reveal(self._seed, self.started)
+        self.epoch += 1
+        self._seed = secrets.token_hex(32)
+        self.seed_hash = seed_hash(self._seed)
+        self.started = time.time()
+        self._pools = {}
+        self._save()  # Commit before any round draws from the new seed
+        return self.revealed[0] if self.revealed else None
+
+    @property
+    def due(self):
+        return time.time() - self.started >= self.rotate_seconds
+
+    def pool(self, game):
+        pool = self._pools.get(game)
+        if pool is None:
+            pool = self._pools[game] = GamePool(game, self.epoch, self._seed, self.pool_size)
+        return pool
+
+    # Reserve the draws for one round (or `count` draws for a batch of rounds)
+    def round(self, game, count=None):
+        return self.pool(game).take(ROUND_DRAWS[game] if count is None else count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay draws from a revealed server seed")
+    parser.add_argument("--seed", required=True, help="Revealed server seed (hex)")
+    parser.add_argument("--game", required=True, choices=sorted(ROUND_DRAWS))
+    parser.add_argument("--start", type=int, required=True, help="First draw of the round")
+    parser.add_argument("--count", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"seed hash {seed_hash(args.seed)}")
+    for offset, value in enumerate(replay(args.seed, args.game, args.start, args.count)):
+        print(f"draw {args.start + offset}: {value!r}")
+
+
+if __name__ == "__main__":
+    main()
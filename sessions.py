@@ -0,0 +1,357 @@
+import asyncio
+import json
+import os
+import time
+
+from snapshot import write_atomic
+from wallet import Hold
+
+SESSION_TTL = 900  # Seconds without a click before a round expires
+TICK_SECONDS = 1.0  # Timer wheel resolution
+MAX_SESSIONS = 20000  # Hard cap on rounds in play at once
+SLOT_BITS = 16  # Low bits of a session id are its slot in the table
+SLOT_MASK = (1 << SLOT_BITS) - 1
+POLICIES = ("refund", "forfeit", "finish")
+JOURNAL_COMPACT_LINES = 10000  # Rewrite the journal once it has this many lines (and mostly closed rounds)
+
+
+# One game round in play: the bet held for it plus whatever the game needs between clicks
+class Session:
+    __slots__ = ("id", "user_id", "game", "hold", "state", "expires_at")
+
+    def __init__(self, session_id, user_id, game, hold, state, expires_at):
+        self.id = session_id
+        self.user_id = user_id
+        self.game = game
+        self.hold = hold
+        self.state = state
+        self.expires_at = expires_at
+
+
+# Session ids travel in button custom_ids, so they are short base-36 strings
+def encode_id(session_id):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        session_id, digit = divmod(session_id, 36)
+        text = digits[digit] + text
+        if not session_id:
+            return text
+
+
+def decode_id(text):
+    try:
+        return int(text, 36)
+    except ValueError:
+        return None
+
+
+# Append-only record of the rounds in play, so a crash or a kill between a bet and its
+# result never loses the stake without a trace: the rounds still open when the bot
+# starts again are closed by policy (see SessionManager.recover). One JSON object
+# per line:
+#   {"op": "open", "id": ..., "user": ..., "game": ..., "hold": [hold id, amount], "state": ...}
+#   {"op": "update", "id": ..., "state": ...}
+#   {"op": "close", "id": ...}
+# Lines go straight to the OS, so a crashed process loses nothing (a crashed machine
+# may lose the last moments). The file is rewritten with only the open rounds once
+# closed ones make up most of it.
+class SessionJournal:
+    def __init__(self, path):
+        self.path = path
+        self.lines = 0
+        self._file = None
+
+    # The rounds left open by the last run, as their latest open records
+    def load(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                op = record["op"]
+                if op == "open":
+                    records[record["id"]] = record
+                elif op == "update" and record["id"] in records:
+                    records[record["id"]]["state"] = record["state"]
+                elif op == "close":
+                    records.pop(record["id"], None)
+        return list(records.values())
+
+    def append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.lines += 1
+
+    # Replace the whole journal with `records`
+    def rewrite(self, records):
+        self.close()
+        write_atomic(self.path, "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8"))
+        self.lines = len(records)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Central registry for rounds waiting on a button click.
+# Sessions live in a slot table: a session id is (sequence << SLOT_BITS) | slot, so a
+# lookup is one list index, and freed slots are reused. The sequence starts from the
+# clock in milliseconds, so ids from before a restart never match a new round.
+# Every session sits in exactly one timer wheel slot (keyed by the tick it is due),
+# so expiry only looks at the slots that came due instead of scanning everything.
+# Memory is bounded by the rounds actually in play (capped at `max_sessions`).
+#
+# A round nobody finished (timed out, replaced by a new one, or still open at
+# shutdown) is closed by its game's policy, from `policies` or else `policy`:
+#   refund   the bet goes back: only fair while the player has seen nothing yet
+#   forfeit  the bet is lost, as if the player had lost the round
+#   finish   `on_finish(session)` plays the round out and settles it (e.g. stands a hand)
+#
+# With a `journal`, every round is recorded while it is open. `codecs` maps a game to
+# (encode, decode) functions turning its state into plain data and back; the state of
+# other games is not journaled, which is fine for any game that is not finished.
+class SessionManager:
+    def __init__(self, wallet, on_forfeit=None, on_finish=None, ttl=SESSION_TTL, policy="refund", policies=None,
+                 max_sessions=MAX_SESSIONS, tick=TICK_SECONDS, journal=None, codecs=None):
+        policies = dict(policies or {})
+        for name in (policy, *policies.values()):
+            if name not in POLICIES:
+                raise ValueError(f"policy must be one of {POLICIES}")
+            if name == "finish" and on_finish is None:
+                raise ValueError("the finish policy needs on_finish")
+        if max_sessions > SLOT_MASK + 1:
+            raise ValueError(f"max_sessions can be at most {SLOT_MASK + 1}")
+        self.wallet = wallet
+        self.on_forfeit = on_forfeit  # Called with the session after a forfeit, e.g. to log the loss
+        self.on_finish = on_finish  # Coroutine that settles the session's round
+        self.ttl = ttl
+        self.policy = policy
+        self.policies = policies  # game -> policy, for games that don't use `policy`
+        self.journal = journal
+        self.codecs = codecs or {}
+        self.max_sessions = max_sessions
+        self.tick = tick
+        self._slots = []  # slot -> Session or None
+        self._free = []  # Slots available for reuse
+        self._live = 0
+        self._latest = {}  # (user_id, game) -> id of that user's newest session
+        self._wheel = {}  # tick number -> session ids due in that tick
+        self._next_tick = self._tick_of(time.monotonic())
+        self._sequence = time.time_ns() // 1_000_000
+        self.opened = 0
+        self.closed = 0
+        self.expired = 0
+        self.refunded = 0  # Amounts, not counts
+        self.forfeited = 0
+        self.finished = 0  # Counts
+        self.rejected = 0
+        self.recovered = 0
+
+    def __len__(self):
+        return self._live
+
+    def _sessions(self):
+        return (session for session in self._slots if session is not None)
+
+    def _tick_of(self, when):
+        return int(when // self.tick) + 1  # Round up, so a session never fires early
+
+    def _schedule(self, session):
+        self._wheel.setdefault(self._tick_of(session.expires_at), []).append(session.id)
+
+    # Start tracking a round. Returns None when the table is full.
+    def open(self, user_id, game, hold, state=None, ttl=None):
+        if self._live >= self.max_sessions:
+            self.rejected += 1
+            return None
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            self._slots.append(None)
+        self._sequence += 1
+        user_id = int(user_id)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        session = Session((self._sequence << SLOT_BITS) | slot, user_id, game, hold, state, expires_at)
+        self._slots[slot] = session
+        self._live += 1
+        self._latest[(user_id, game)] = session.id
+        self._schedule(session)
+        self.opened += 1
+        self._journal_open(session)
+        return session
+
+    def get(self, session_id):
+        if session_id is None:
+            return None
+        slot = session_id & SLOT_MASK
+        session = self._slots[slot] if slot < len(self._slots) else None
+        return session if session is not None and session.id == session_id else None
+
+    # Every live round of `game`, as a list the caller may close rounds from
+    def live(self, game):
+        return [session for session in self._sessions() if session.game == game]
+
+    # The user's newest live round of `game`, if any
+    def latest(self, user_id, game):
+        return self.get(self._latest.get((int(user_id), game)))
+
+    # Push the expiry back after activity (and journal the state the activity changed).
+    # The wheel entry is moved lazily when its slot comes due.
+    def touch(self, session, ttl=None):
+        session.expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        if self.journal is not None and session.game in self.codecs:
+            self.journal.append({"op": "update", "id": session.id, "state": self._encode(session)})
+
+    def _remove(self, session_id):
+        session = self.get(session_id)
+        if session is not None:
+            slot = session_id & SLOT_MASK
+            self._slots[slot] = None
+            self._free.append(slot)
+            self._live -= 1
+            key = (session.user_id, session.game)
+            if self._latest.get(key) == session_id:
+                del self._latest[key]
+            if self.journal is not None:
+                self.journal.append({"op": "close", "id": session_id})
+                if self.journal.lines >= max(JOURNAL_COMPACT_LINES, 4 * self._live):
+                    self.journal.rewrite([self._open_record(live) for live in self._sessions()])
+        return session
+
+    # Stop tracking a round that is being settled. Returns the session, or None if it
+    # already ended (or expired), so two clicks can never settle the same round twice.
+    def take(self, session_id):
+        session = self._remove(session_id)
+        if session is not None:
+            self.closed += 1
+        return session
+
+    def policy_for(self, game):
+        return self.policies.get(game, self.policy)
+
+    def _encode(self, session):
+        codec = self.codecs.get(session.game)
+        return codec[0](session.state) if codec and session.state is not None else None
+
+    def _open_record(self, session):
+        return {"op": "open", "id": session.id, "user": session.user_id, "game": session.game,
+                "hold": [session.hold.id, session.hold.amount], "state": self._encode(session)}
+
+    def _journal_open(self, session):
+        if self.journal is not None:
+            self.journal.append(self._open_record(session))
+
+    # Apply the game's expiry policy to a round nobody finished
+    async def expire(self, session):
+        if self._remove(session.id) is None:
+            return False
+        self.expired += 1
+        await self._close(session)
+        return True
+
+    async def _close(self, session):
+        policy = self.policy_for(session.game)
+        if policy == "finish":
+            await self.on_finish(session)
+            self.finished += 1
+        elif policy == "refund":
+            if await self.wallet.refund(session.hold):
+                self.refunded += session.hold.amount
+        elif await self.wallet.settle(session.hold, 0):
+            self.forfeited += session.hold.amount
+            if self.on_forfeit:
+                self.on_forfeit(session)
+
+    # Close the rounds a previous run left open (a crash, a kill, a deploy) by the same
+    # policies as expiry. A round that should be played out but whose state can't be
+    # restored is refunded. Call once at startup, before any new round opens.
+    async def recover(self):
+        if self.journal is None:
+            return 0
+        records = self.journal.load()
+        for record in records:
+            hold = Hold(record["user"], record["hold"][1])
+            hold.id = record["hold"][0]  # The coordinator knows the hold by this id
+            codec = self.codecs.get(record["game"])
+            state = codec[1](record["state"]) if codec and record["state"] is not None else None
+            session = Session(record["id"], record["user"], record["game"], hold, state, 0)
+            if self.policy_for(session.game) == "finish" and state is None:
+                if await self.wallet.refund(hold):
+                    self.refunded += hold.amount
+            else:
+                await self._close(session)
+            self.journal.append({"op": "close", "id": session.id})
+            self.recovered += 1
+        self.journal.rewrite([self._open_record(session) for session in self._sessions()])
+        return len(records)
+
+    # Expire every session whose slot has come due. Returns how many expired.
+    async def expire_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        due = []
+        current = self._tick_of(now)
+        while self._next_tick < current:
+            for session_id in self._wheel.pop(self._next_tick, ()):
+                session = self.get(session_id)
+                if session is None:
+                    continue  # Already finished
+                if session.expires_at > now:
+                    self._schedule(session)  # Touched since it was filed
+                else:
+                    due.append(session)
+            self._next_tick += 1
+        count = 0
+        for session in due:
+            count += await self.expire(session)
+        return count
+
+    # Background task: advance the wheel once per tick
+    async def run_expiry(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                count = await self.expire_due()
+                if count:
+                    print(f"⌛ Expired {count} abandoned game(s).")
+            except Exception as e:
+                print(f"⚠️ Session expiry failed: {e}")
+
+    # Settle every open round by policy, e.g. before shutting down
+    async def expire_all(self):
+        count = 0
+        for session in list(self._sessions()):
+            count += await self.expire(session)
+        self._wheel.clear()
+        return count
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def stats(self):
+        live = {}
+        for session in self._sessions():
+            live[session.game] = live.get(session.game, 0) + 1
+        return {
+            "live": self._live,
+            "live_by_game": live,
+            "slots": len(self._slots),
+            "wheel_slots": len(self._wheel),
+            "opened": self.opened,
+            "closed": self.closed,
+            "expired": self.expired,
+            "refunded": self.refunded,
+            "forfeited": self.forfeited,
+            "finished": self.finished,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+        }
@@ -0,0 +1,179 @@
+import argparse
+import time
+
+import numpy as np
+
+from engine.rules import (
+    BLACKJACK_PAYOUT, COINFLIP_PAYOUT, DEALER_STANDS_ON, DICE_PAYOUT, DICE_SIDES, EMOJIS,
+    RPS_PAYOUT, SLOTS_FIRST_MULTIPLIER, SLOTS_MULTIPLIER_AFTER_LOSS, SLOTS_MULTIPLIER_AFTER_WIN, pay_table,
+)
+
+# Monte Carlo RTP / house-edge simulator.
+# Every game's rules are replayed with vectorized NumPy draws. Each sampler returns
+# the total paid back (stake included) for `n` rounds of a flat `bet`.
+#
+#   python simulator.py --rounds 10000000 --seed 42
+#   python simulator.py --game slots --bankroll 50 --horizon 2000
+
+CHUNK = 1_000_000  # Rounds per vectorized batch, keeps memory bounded
+BLACKJACK_MAX_CARDS = 22  # Cards are >= 1, so nobody can need more than this
+
+
+def simulate_dice(rng, n, bet):
+    user_roll = rng.integers(1, DICE_SIDES + 1, n)
+    bot_roll = rng.integers(1, DICE_SIDES + 1, n)
+    return np.where(user_roll == bot_roll, bet * DICE_PAYOUT, 0)
+
+
+def simulate_coinflip(rng, n, bet):
+    # The player's call doesn't matter against a fair coin
+    return np.where(rng.integers(0, 2, n) == 0, bet * COINFLIP_PAYOUT, 0)
+
+
+def simulate_rps(rng, n, bet):
+    # Against a uniform bot every move wins, ties and loses a third of the time
+    outcome = rng.integers(0, 3, n)  # 0 win, 1 tie, 2 lose
+    return np.select([outcome == 0, outcome == 1], [bet * RPS_PAYOUT, bet], 0)
+
+
+# Best total after drawing until it reaches `stand_on` (at least two cards).
+# Cards are drawn from an infinite deck (13 ranks, faces count 10), an approximation
+# of the live 6-deck shoe; an ace counts 11 while that doesn't bust the hand.
+def _draw_until(rng, n, stand_on):
+    cards = np.minimum(rng.integers(1, 14, (n, BLACKJACK_MAX_CARDS), dtype=np.int16), 10)
+    hard = np.cumsum(cards, axis=1)
+    has_ace = np.maximum.accumulate(cards == 1, axis=1)
+    totals = np.where(has_ace & (hard + 10 <= 21), hard + 10, hard)
+    reached = totals >= stand_on
+    reached[:, 0] = False  # Two starting cards
+    stop = np.argmax(reached, axis=1)
+    stop[~reached.any(axis=1)] = BLACKJACK_MAX_CARDS - 1
+    return totals[np.arange(n), stop]
+
+
+# Player hits until reaching `stand_on`; busting (>21) loses, ties lose the stake
+def simulate_blackjack(rng, n, bet, stand_on=DEALER_STANDS_ON):
+    player = _draw_until(rng, n, stand_on)
+    dealer = _draw_until(rng, n, DEALER_STANDS_ON)
+    win = (player <= 21) & ((dealer > 21) | (player > dealer))
+    return np.where(win, bet * BLACKJACK_PAYOUT, 0)
+
+
+# Slots sessions of `session_length` spins: the first spin uses the /slots payout,
+# every "Play Again" spin uses the multiplier picked by the previous spin's result.
+def simulate_slots(rng, n, bet, session_length=10):
+    sessions = -(-n // session_length)
+    reels = rng.integers(0, len(EMOJIS), (sessions, session_length, 3), dtype=np.int8)
+    win = (reels[..., 0] == reels[..., 1]) & (reels[..., 1] == reels[..., 2])
+    multiplier = np.empty(win.shape)
+    multiplier[:, 0] = SLOTS_FIRST_MULTIPLIER
+    multiplier[:, 1:] = np.where(win[:, :-1], SLOTS_MULTIPLIER_AFTER_WIN, SLOTS_MULTIPLIER_AFTER_LOSS)
+    winnings = (bet * multiplier).astype(np.int64)  # int() truncation, as in the bot
+    return np.where(win, bet + winnings, 0).reshape(-1)[:n]
+
+
+# Pay-table multiplier for every (old, new) card value pair, 0 where the guess loses
+def _highlow_tables():
+    values = np.arange(2, 15)
+    diff = np.abs(values[None, :] - values[:, None])
+    multiplier = np.array([0.0] + [pay_table.get(d, 0.0) for d in range(1, 13)])[diff]
+    higher = np.where(values[None, :] > values[:, None], multiplier, 0.0)
+    lower = np.where(values[None, :] < values[:, None], multiplier, 0.0)
+    return higher, lower
+
+
+# The player always takes the guess with the better expected payout for their card
+def simulate_highlow(rng, n, bet):
+    higher, lower = _highlow_tables()
+    choose_higher = higher.mean(axis=1) >= lower.mean(axis=1)
+    old = rng.integers(0, 13, n)
+    new = rng.integers(0, 13, n)
+    multiplier = np.where(choose_higher[old], higher[old, new], lower[old, new])
+    return (bet * multiplier).astype(np.int64)
+
+
+SIMULATORS = {
+    "dice": simulate_dice,
+    "coinflip": simulate_coinflip,
+    "blackjack": simulate_blackjack,
+    "slots": simulate_slots,
+    "rps": simulate_rps,
+    "highlow": simulate_highlow,
+}
+
+
+# RTP, hit rate and per-round variance over `rounds` rounds, in chunks
+def measure(game, rounds, bet=100, seed=None):
+    rng = np.random.default_rng(seed)
+    sampler = SIMULATORS[game]
+    paid = 0
+    hits = 0
+    net_sum = 0.0
+    net_sq = 0.0
+    done = 0
+    while done < rounds:
+        n = min(CHUNK, rounds - done)
+        payout = sampler(rng, n, bet)
+        net = (payout - bet) / bet  # In units of the bet
+        paid += int(payout.sum())
+        hits += int((payout > bet).sum())
+        net_sum += float(net.sum())
+        net_sq += float(np.square(net).sum())
+        done += n
+    mean = net_sum / rounds
+    variance = net_sq / rounds - mean ** 2
+    return {
+        "game": game,
+        "rounds": rounds,
+        "rtp": paid / (bet * rounds),
+        "house_edge": 1 - paid / (bet * rounds),
+        "hit_rate": hits / rounds,
+        "variance": variance,
+        "std_error": (variance / rounds) ** 0.5,
+    }
+
+
+# Share of players ruined (can no longer cover the bet) after each checkpoint,
+# starting with `bankroll` bets and flat betting for `horizon` rounds.
+def ruin_curve(game, bankroll=100, horizon=1000, players=2000, bet=100, seed=None, checkpoints=10):
+    rng = np.random.default_rng(seed)
+    sampler = SIMULATORS[game]
+    if game == "slots":
+        payout = sampler(rng, players * horizon, bet, session_length=horizon)
+    else:
+        payout = sampler(rng, players * horizon, bet)
+    wealth = bankroll * bet + np.cumsum((payout - bet).reshape(players, horizon), axis=1)
+    broke = wealth < bet
+    ruined_at = np.where(broke.any(axis=1), np.argmax(broke, axis=1) + 1, horizon + 1)
+    marks = np.linspace(horizon / checkpoints, horizon, checkpoints).astype(int)
+    return [(int(t), float((ruined_at <= t).mean())) for t in marks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo RTP / house-edge simulator for every casino game")
+    parser.add_argument("--game", choices=["all", *SIMULATORS], default="all")
+    parser.add_argument("--rounds", type=int, default=10_000_000)
+    parser.add_argument("--bet", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible runs")
+    parser.add_argument("--bankroll", type=int, default=100, help="Starting bankroll, in bets, for the ruin curve")
+    parser.add_argument("--horizon", type=int, default=1000, help="Rounds per player for the ruin curve")
+    parser.add_argument("--players", type=int, default=2000, help="Simulated players for the ruin curve")
+    args = parser.parse_args()
+
+    games = list(SIMULATORS) if args.game == "all" else [args.game]
+    print(f"{'game':<10} {'RTP':>8} {'edge':>8} {'hit rate':>9} {'variance':>9} {'±RTP':>8} {'rounds/s':>11}")
+    for game in games:
+        started = time.perf_counter()
+        result = measure(game, args.rounds, args.bet, args.seed)
+        rate = args.rounds / (time.perf_counter() - started)
+        print(f"{game:<10} {result['rtp']:>8.2%} {result['house_edge']:>8.2%} {result['hit_rate']:>9.2%} "
+              f"{result['variance']:>9.3f} {1.96 * result['std_error']:>8.3%} {rate:>11,.0f}")
+
+    print(f"\nRuin probability (bankroll {args.bankroll} bets, {args.players} players)")
+    for game in games:
+        curve = ruin_curve(game, args.bankroll, args.horizon, args.players, args.bet, args.seed)
+        print(f"{game:<10} " + "  ".join(f"{t}:{p:.1%}" for t, p in curve))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+
+
+# Write bytes to path atomically: temp file + fsync + rename, so a crash mid-write
+# leaves the previous snapshot intact instead of a truncated file.
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return  # Platforms without directory fds (Windows) still get the atomic rename
+    try:
+        os.fsync(dir_fd)  # Make the rename itself durable
+    finally:
+        os.close(dir_fd)
+
+
+# Dirty-tracked snapshot of one in-memory structure.
+# capture() runs on the event loop and must return a cheap copy of the state;
+# encode(copy) runs in a worker thread and returns the bytes to publish.
+class Snapshotter:
+    def __init__(self, path, capture, encode, slow_flush_seconds=0.5):
+        self.path = path
+        self.capture = capture
+        self.encode = encode
+        self.slow_flush_seconds = slow_flush_seconds
+        self.dirty = set()
+        self.flush_count = 0
+        self.skipped_count = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_bytes = 0
+        self.total_bytes = 0
+        self._lock = asyncio.Lock()
+
+    def mark_dirty(self, key):
+        self.dirty.add(key)
+
+    def _write(self, payload):
+        data = self.encode(payload)
+        write_atomic(self.path, data)
+        return len(data)
+
+    def _record(self, started, dirty_count, nbytes):
+        self.flush_count += 1
+        self.last_flush_seconds = time.perf_counter() - started
+        self.last_flush_bytes = nbytes
+        self.total_bytes += nbytes
+        if self.last_flush_seconds >= self.slow_flush_seconds:
+            print(f"⚠️ Slow snapshot of {self.path}: {dirty_count} dirty, "
+                  f"{nbytes} bytes in {self.last_flush_seconds:.3f}s")
+
+    # Publish a snapshot if anything changed since the last one. Returns True if written.
+    async def flush(self):
+        async with self._lock:
+            if not self.dirty:
+                self.skipped_count += 1
+                return False
+
+            started = time.perf_counter()
+            dirty, self.dirty = self.dirty, set()
+            payload = self.capture()
+            try:
+                nbytes = await asyncio.to_thread(self._write, payload)
+            except Exception:
+                self.dirty |= dirty  # Retry these on the next cycle
+                raise
+            self._record(started, len(dirty), nbytes)
+            return True
+
+    # Blocking variant for shutdown, when the loop may already be gone
+    def flush_sync(self, force=False):
+        if not self.dirty and not force:
+            return False
+        started = time.perf_counter()
+        dirty, self.dirty = self.dirty, set()
+        nbytes = self._write(self.capture())
+        self._record(started, len(dirty), nbytes)
+        return True
@@ -0,0 +1,332 @@
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from balance_store import BalanceStore
+from snapshot import Snapshotter
+
+# Storage backends persist balances and transactions behind get_balance /
+# update_balance / log_transaction. The bot keeps balances in memory (BalanceStore)
+# and stages every change here; flush() writes the staged batch in one go.
+#
+# Balances are staged as deltas and applied as increments, so several processes
+# can write to the same SQLite file or Mongo database without overwriting each other.
+
+
+class StorageBackend(abc.ABC):
+    name = "base"
+
+    def __init__(self):
+        self._deltas = {}  # user id -> net change since the last flush
+        self._rows = []  # transactions since the last flush
+        self.flush_count = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_ops = 0
+
+    # Load every balance into a BalanceStore (called once at startup)
+    @abc.abstractmethod
+    def load_balances(self):
+        ...
+
+    def stage_balance(self, user_id, delta):
+        self._deltas[user_id] = self._deltas.get(user_id, 0) + delta
+
+    # row: (record, timestamp, user_id, game, stake, payout, outcome, balance_after),
+    # record being the row's index in the ledger
+    def stage_transaction(self, row):
+        self._rows.append(row)
+
+    @property
+    def dirty(self):
+        return bool(self._deltas or self._rows)
+
+    def _take_batch(self):
+        batch = self._deltas, self._rows
+        self._deltas, self._rows = {}, []
+        return batch
+
+    # Put a batch back after a failed write so the next flush retries it
+    def _restore_batch(self, deltas, rows):
+        for user_id, delta in deltas.items():
+            self.stage_balance(user_id, delta)
+        self._rows[:0] = rows
+
+    def _record(self, started, ops):
+        self.flush_count += 1
+        self.last_flush_seconds = time.perf_counter() - started
+        self.last_flush_ops = ops
+
+    @abc.abstractmethod
+    async def _write(self, deltas, rows):
+        ...
+
+    @abc.abstractmethod
+    def _write_sync(self, deltas, rows):
+        ...
+
+    # Write everything staged since the last flush. Returns True if anything was written.
+    async def flush(self):
+        if not self.dirty:
+            return False
+        started = time.perf_counter()
+        deltas, rows = self._take_batch()
+        try:
+            await self._write(deltas, rows)
+        except Exception:
+            self._restore_batch(deltas, rows)
+            raise
+        self._record(started, len(deltas) + len(rows))
+        return True
+
+    # Blocking flush for shutdown
+    def flush_sync(self):
+        if not self.dirty:
+            return False
+        started = time.perf_counter()
+        deltas, rows = self._take_batch()
+        self._write_sync(deltas, rows)
+        self._record(started, len(deltas) + len(rows))
+        return True
+
+    def close(self):
+        pass
+
+
+# Default backend: binary balance snapshot on disk; transactions live in the ledger file
+class FileBackend(StorageBackend):
+    name = "file"
+
+    def __init__(self, snapshot_path, legacy_loader=None):
+        super().__init__()
+        self.snapshot_path = snapshot_path
+        self.legacy_loader = legacy_loader  # Returns the legacy {user_id: balance} dict
+        self.balances = None
+        self.snapshots = None
+
+    def load_balances(self):
+        self.balances = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                self.balances = BalanceStore.load(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Error loading {self.snapshot_path} ({e}). Falling back to legacy balances.")
+        if self.balances is None:
+            self.balances = BalanceStore.from_dict(self.legacy_loader() if self.legacy_loader else {})
+        # Snapshotted off the event loop, and only when someone's balance changed
+        self.snapshots = Snapshotter(
+            self.snapshot_path,
+            capture=self.balances.capture,
+            encode=BalanceStore.encode_snapshot,
+        )
+        return self.balances
+
+    def stage_balance(self, user_id, delta):
+        self.snapshots.mark_dirty(user_id)
+
+    def stage_transaction(self, row):
+        pass  # The ledger file already is the durable transaction store
+
+    @property
+    def dirty(self):
+        return bool(self.snapshots.dirty)
+
+    # The whole balance table is snapshotted, so no deltas or rows are ever staged
+    async def _write(self, deltas, rows):
+        return await self.snapshots.flush()
+
+    def _write_sync(self, deltas, rows):
+        return self.snapshots.flush_sync(force=True)
+
+    async def flush(self):
+        written = await self._write({}, [])
+        if written:
+            self._record_snapshot()
+        return written
+
+    def flush_sync(self):
+        written = self._write_sync({}, [])
+        self._record_snapshot()
+        return written
+
+    def _record_snapshot(self):
+        self.flush_count = self.snapshots.flush_count
+        self.last_flush_seconds = self.snapshots.last_flush_seconds
+        self.last_flush_ops = self.snapshots.last_flush_bytes
+
+
+# SQLite in WAL mode: readers never block the writer, and every flush is one transaction
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn_lock = threading.Lock()  # Flushes run in worker threads
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Durable at each WAL checkpoint, safe with WAL
+        self._conn.execute("PRAGMA busy_timeout=5000")  # Other processes may hold the write lock briefly
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS balances (
+                user_id INTEGER PRIMARY KEY,
+                balance INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                user_id INTEGER NOT NULL,
+                game TEXT NOT NULL,
+                stake INTEGER NOT NULL,
+                payout INTEGER NOT NULL,
+                outcome TEXT NOT NULL,
+                balance_after INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS transactions_user ON transactions (user_id, timestamp);
+        """)
+
+    def load_balances(self):
+        with self._conn_lock:
+            rows = self._conn.execute("SELECT user_id, balance FROM balances").fetchall()
+        return BalanceStore.from_dict(dict(rows))
+
+    def _write_sync(self, deltas, rows):
+        with self._conn_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO balances (user_id, balance) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET balance = balance + excluded.balance",
+                deltas.items(),
+            )
+            self._conn.executemany(
+                "INSERT INTO transactions (timestamp, user_id, game, stake, payout, outcome, balance_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row[1:] for row in rows),
+            )
+
+    async def _write(self, deltas, rows):
+        await asyncio.to_thread(self._write_sync, deltas, rows)
+
+    def close(self):
+        with self._conn_lock:
+            self._conn.close()
+
+
+# MongoDB through motor: one pooled client, unordered bulk writes per flush.
+# Pass `client` to use an already configured (or in-process stand-in) motor client.
+class MongoBackend(StorageBackend):
+    name = "mongo"
+
+    def __init__(self, uri, database="casino", pool_size=20, client=None):
+        super().__init__()
+        self.uri = uri
+        self.database_name = database
+        self.pool_size = pool_size
+        self._client = client
+        self._sync_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from motor.motor_asyncio import AsyncIOMotorClient  # Only needed with this backend
+            self._client = AsyncIOMotorClient(self.uri, maxPoolSize=self.pool_size)
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.database_name]
+
+    # Startup and shutdown run outside the event loop, so they use a plain pymongo client
+    def _sync_db(self):
+        if self._sync_client is None:
+            from pymongo import MongoClient
+            self._sync_client = MongoClient(self.uri, maxPoolSize=1)
+        return self._sync_client[self.database_name]
+
+    def load_balances(self):
+        documents = self._sync_db().balances.find({}, {"balance": 1})
+        return BalanceStore.from_dict({doc["_id"]: doc["balance"] for doc in documents})
+
+    # Same row, same id: the ledger record plus the time and user (ledgers of separate
+    # processes number their records independently)
+    @staticmethod
+    def transaction_id(record, timestamp, user_id):
+        return f"{record}:{timestamp!r}:{user_id}"
+
+    @staticmethod
+    def _operations(deltas, rows):
+        from pymongo import UpdateOne
+        balance_ops = [
+            UpdateOne({"_id": user_id}, {"$inc": {"balance": delta}}, upsert=True)
+            for user_id, delta in deltas.items()
+        ]
+        # Upserts that only ever insert, so writing a row again changes nothing
+        transaction_ops = [
+            UpdateOne({"_id": MongoBackend.transaction_id(record, timestamp, user_id)}, {"$setOnInsert": {
+                "record": record, "timestamp": timestamp, "user_id": user_id, "game": game, "stake": stake,
+                "payout": payout, "outcome": outcome, "balance_after": balance_after,
+            }}, upsert=True)
+            for record, timestamp, user_id, game, stake, payout, outcome, balance_after in rows
+        ]
+        return balance_ops, transaction_ops
+
+    async def _write(self, deltas, rows):
+        balance_ops, transaction_ops = self._operations(deltas, rows)
+        # Transactions first: if the balance write fails the whole batch is retried,
+        # which leaves the transactions already written as they are, where writing the
+        # increments first could apply them twice
+        if transaction_ops:
+            await self.db.transactions.bulk_write(transaction_ops, ordered=False)
+        if balance_ops:
+            await self.db.balances.bulk_write(balance_ops, ordered=False)
+
+    def _write_sync(self, deltas, rows):
+        balance_ops, transaction_ops = self._operations(deltas, rows)
+        db = self._sync_db()
+        if transaction_ops:
+            db.transactions.bulk_write(transaction_ops, ordered=False)
+        if balance_ops:
+            db.balances.bulk_write(balance_ops, ordered=False)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+
+# Build the backend selected by configuration (STORAGE_BACKEND and friends)
+def open_backend(kind, **config):
+    if kind == "file":
+        return FileBackend(config["snapshot_path"], config.get("legacy_loader"))
+    if kind == "sqlite":
+        return SQLiteBackend(config.get("sqlite_path", "casino.db"))
+    if kind == "mongo":
+        return MongoBackend(
+            config.get("mongo_uri", "mongodb://localhost:27017"),
+            config.get("mongo_database", "casino"),
+            int(config.get("mongo_pool_size", 20)),
+        )
+    raise ValueError(f"unknown storage backend {kind!r}")
+
+
+# Backend settings from the environment, on top of the given paths
+def config_from_env(**config):
+    config.setdefault("sqlite_path", os.getenv("SQLITE_PATH", "casino.db"))
+    config.setdefault("mongo_uri", os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    config.setdefault("mongo_database", os.getenv("MONGO_DATABASE", "casino"))
+    config.setdefault("mongo_pool_size", os.getenv("MONGO_POOL_SIZE", "20"))
+    return config
+
+
+# Load every balance from `storage`. The first start on a database backend seeds it
+# from the local files.
+def load_or_seed(storage, **config):
+    balances = storage.load_balances()
+    if len(balances) == 0 and storage.name != "file":
+        balances = open_backend("file", **config).load_balances()
+        for user_id, balance in balances.items():
+            storage.stage_balance(user_id, balance)
+        storage.flush_sync()
+    return balances
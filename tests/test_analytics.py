@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+
+import simulator
+from analytics import FIXED_ODDS_GAMES, GameStats
+from engine import highlow
+from engine.rules import DICE_PAYOUT
+
+GAMES = ("dice", "coinflip", "blackjack", "slots", "rps", "highlow")
+NOW = 1_700_000_000.0
+
+
+def stats_with_expected():
+    stats = GameStats(GAMES)
+    stats.set_expected([simulator.measure(game, 100_000, seed=0) for game in GAMES])
+    return stats
+
+
+def test_only_fixed_odds_games_get_an_expected_rtp():
+    stats = stats_with_expected()
+    assert set(stats.expected) == set(FIXED_ODDS_GAMES)
+
+
+def test_non_optimal_highlow_play_is_not_an_anomaly():
+    stats = stats_with_expected()
+    rng = random.Random(7)
+    for i in range(2000):
+        card = highlow.draw_card(rng)
+        result = highlow.guess(100, card, rng.choice(("higher", "lower")), rng)
+        stats.record("highlow", 100, result.payout, NOW - i)
+    [row] = stats.summary("1h", NOW)
+    assert row["rounds"] == 2000
+    assert row["expected_rtp"] is None and row["z"] is None
+    assert not row["anomaly"]
+    assert stats.anomalies("1h", NOW) == []
+
+
+def test_non_optimal_blackjack_play_is_not_an_anomaly():
+    stats = stats_with_expected()
+    payouts = simulator.simulate_blackjack(np.random.default_rng(3), 2000, 100, stand_on=12)
+    stats.record_many(["blackjack"] * len(payouts), [100] * len(payouts), payouts, NOW - np.arange(len(payouts)))
+    assert stats.anomalies("1h", NOW) == []
+
+
+def test_fair_dice_is_not_flagged_and_overpaying_dice_is():
+    stats = stats_with_expected()
+    payouts = simulator.simulate_dice(np.random.default_rng(5), 2000, 100)
+    stats.record_many(["dice"] * len(payouts), [100] * len(payouts), payouts, NOW - np.arange(len(payouts)))
+    assert stats.anomalies("1h", NOW) == []
+
+    for i in range(500):  # A bug paying every other roll
+        stats.record("dice", 100, 100 * DICE_PAYOUT if i % 2 else 0, NOW - i)
+    [row] = stats.anomalies("1h", NOW)
+    assert row["game"] == "dice" and row["z"] > 4
+
+
+def test_windows_forget_old_rounds():
+    stats = GameStats(GAMES)
+    stats.record("coinflip", 10, 20, NOW - 2 * 3600)
+    stats.record("coinflip", 10, 0, NOW - 60)
+    assert stats.summary("1h", NOW)[0]["rounds"] == 1
+    assert stats.summary("24h", NOW)[0]["rounds"] == 2
+    assert stats.summary("7d", NOW + 8 * 86400) == []
@@ -0,0 +1,131 @@
+import asyncio
+import importlib
+import itertools
+
+import pytest
+from discord.ext import commands
+
+# Game flows through the real bot module, imported once in a scratch directory (its
+# state files are relative paths) with the gateway connection left out. Commands and
+# buttons are called directly with stand-in interactions.
+
+_ids = itertools.count(10 ** 17)
+_users = itertools.count(1)
+
+
+class FakeResponse:
+    def __init__(self, log):
+        self.log = log
+
+    async def send_message(self, content=None, **kwargs):
+        self.log.append((content, kwargs))
+
+    async def edit_message(self, content=None, **kwargs):
+        self.log.append((content, kwargs))
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeInteraction:
+    def __init__(self, user_id):
+        self.id = next(_ids)
+        self.user = FakeUser(user_id)
+        self.log = []
+        self.response = FakeResponse(self.log)
+
+
+@pytest.fixture(scope="module")
+def bot(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("bot"))
+        patch.setattr(commands.Bot, "run", lambda self, *args, **kwargs: None)
+        yield importlib.import_module("casino_bot")
+
+
+# A new player with 1000 to play with
+@pytest.fixture
+def player(bot):
+    user_id = next(_users)
+    asyncio.run(bot.wallet.credit(user_id, 1000))
+    return user_id
+
+
+# Dealing a new hand stands the unfinished one and settles it, instead of handing the
+# stake back to a player who didn't like their cards
+def test_new_blackjack_hand_settles_the_previous_one(bot, player):
+    async def play():
+        await bot.blackjack.callback(FakeInteraction(player), 100)
+        first = bot.sessions.latest(player, "blackjack")
+        await bot.blackjack.callback(FakeInteraction(player), 100)
+        return first.state
+
+    first = asyncio.run(play())
+    assert first.game_over
+    assert bot.get_balance(player) == 1000 - 200 + first.payout
+    assert bot.sessions.latest(player, "blackjack") is not None
+
+
+def test_timed_out_blackjack_hand_is_stood_and_settled(bot, player):
+    async def play():
+        await bot.blackjack.callback(FakeInteraction(player), 100)
+        session = bot.sessions.latest(player, "blackjack")
+        await bot.sessions.expire_due(now=session.expires_at + bot.sessions.tick * 2)
+        return session
+
+    session = asyncio.run(play())
+    assert bot.sessions.latest(player, "blackjack") is None
+    assert session.state.game_over
+    assert not session.hold.open
+    assert bot.get_balance(player) == 1000 - 100 + session.state.payout
+
+
+# A shoe shuffled from a seed that has since been revealed is reshuffled before the next hand
+def test_blackjack_shoe_is_reshuffled_after_a_seed_rotation(bot, player):
+    async def deal():
+        interaction = FakeInteraction(player)
+        await bot.blackjack.callback(interaction, 10)
+        [(_, sent)] = interaction.log
+        return sent["embed"].footer.text
+
+    asyncio.run(deal())
+    shoe = bot.blackjack_shoes[player]
+    assert shoe.epoch == bot.fair_rng.epoch
+    bot.fair_rng.rotate()
+
+    footer = asyncio.run(deal())
+    assert shoe.shuffles == 2
+    assert shoe.epoch == bot.fair_rng.epoch
+    assert f"blackjack epoch {bot.fair_rng.epoch} " in footer
+
+
+# After a rotation nothing still in play may be derivable from the seed just revealed
+def test_seed_rotation_leaves_nothing_in_play_on_the_revealed_seed(bot, player):
+    async def play():
+        await bot.blackjack.callback(FakeInteraction(player), 100)
+        await bot.highlow.callback(FakeInteraction(player), 100)
+        hand = bot.sessions.latest(player, "blackjack")
+        revealed = await bot.rotate_fairness()
+        return hand, revealed
+
+    hand, revealed = asyncio.run(play())
+    old_epoch = revealed["epoch"]
+    assert bot.fair_rng.epoch == old_epoch + 1
+
+    # The hand was played out and paid; the highlow round plays on with a new next card
+    assert bot.sessions.latest(player, "blackjack") is None
+    assert hand.state.game_over and not hand.hold.open
+    assert bot.get_balance(player) == 1000 - 200 + hand.state.payout
+    assert all(shoe.epoch != old_epoch for shoe in bot.blackjack_shoes.values())
+    for session in bot.sessions.live("blackjack"):
+        assert session.state.shoe.epoch != old_epoch
+    for session in bot.sessions.live("highlow"):
+        assert session.state[1].epoch != old_epoch
+
+    pending = bot.sessions.latest(player, "highlow")
+    interaction = FakeInteraction(player)
+    asyncio.run(bot.play_highlow(interaction, bot.encode_id(pending.id), "higher"))
+    [(content, _)] = interaction.log
+    assert f"highlow epoch {bot.fair_rng.epoch} " in content
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import coordinator
+from balance_store import BalanceStore
+from coordinator import CoordinatedWallet, CoordinatorServer
+from storage import SQLiteBackend
+
+
+# Applies adjusts on an in-process server, losing the first `drop` replies after the
+# server has applied them, like a connection that breaks at the worst moment
+class LossyClient:
+    def __init__(self, server, drop=0):
+        self.server = server
+        self.drop = drop
+
+    async def adjust(self, user_id, delta, floor=None, key=None):
+        reply = self.server.adjust(user_id, delta, floor, key)
+        if self.drop:
+            self.drop -= 1
+            raise ConnectionError("balance coordinator disconnected")
+        return reply
+
+    def cancel(self, key):
+        self.server.cancel(key)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(coordinator, "RECONNECT_DELAY", 0)
+    storage = SQLiteBackend(":memory:")
+    yield CoordinatorServer(storage, None, BalanceStore.from_dict({1: 1000}))
+    storage.close()
+
+
+def test_settle_is_applied_once_when_the_reply_is_lost(server):
+    client = LossyClient(server)
+    wallet = CoordinatedWallet(client, server.balances.get)
+
+    async def play():
+        hold = await wallet.reserve(1, 100)
+        client.drop = 2
+        assert await wallet.settle(hold, 300)
+        assert not hold.open
+        assert not await wallet.refund(hold)
+
+    asyncio.run(play())
+    assert server.balances.get(1) == 1200
+
+
+def test_refund_after_a_lost_settle_does_not_pay_twice(server, monkeypatch):
+    monkeypatch.setattr(coordinator, "ADJUST_ATTEMPTS", 1)
+    client = LossyClient(server)
+    wallet = CoordinatedWallet(client, server.balances.get)
+
+    async def play():
+        hold = await wallet.reserve(1, 100)
+        client.drop = 1
+        with pytest.raises(ConnectionError):
+            await wallet.settle(hold, 300)  # Applied, but the bot never heard back
+        assert hold.open
+        assert await wallet.refund(hold)  # Same hold key: the coordinator has it already
+
+    asyncio.run(play())
+    assert server.balances.get(1) == 1200
+
+
+def test_reserve_is_applied_once_when_the_reply_is_lost(server):
+    client = LossyClient(server, drop=1)
+    wallet = CoordinatedWallet(client, server.balances.get)
+
+    async def play():
+        hold = await wallet.reserve(1, 100)
+        assert hold is not None
+        assert server.balances.get(1) == 900
+        await wallet.settle(hold, 0)
+
+    asyncio.run(play())
+    assert server.balances.get(1) == 900
+
+
+def test_reserve_that_never_got_a_reply_is_cancelled(server, monkeypatch):
+    monkeypatch.setattr(coordinator, "ADJUST_ATTEMPTS", 2)
+    client = LossyClient(server, drop=2)
+    wallet = CoordinatedWallet(client, server.balances.get)
+    with pytest.raises(ConnectionError):
+        asyncio.run(wallet.reserve(1, 100))  # Applied, but the bot never heard back
+    assert server.balances.get(1) == 1000
+
+    # A copy of the debit that reaches the coordinator late is not applied either
+    [key] = [key for key in server._results if key.startswith("reserve:")]
+    assert not server.adjust(1, -100, 0, key)["ok"]
+    assert server.balances.get(1) == 1000
+
+
+def test_holds_get_distinct_keys(server):
+    wallet = CoordinatedWallet(LossyClient(server), server.balances.get)
+
+    async def play():
+        first = await wallet.reserve(1, 100)
+        second = await wallet.reserve(1, 100)
+        await wallet.settle(first, 200)
+        await wallet.settle(second, 200)
+
+    asyncio.run(play())
+    assert server.balances.get(1) == 1200
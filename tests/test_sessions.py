@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+from engine.blackjack import BlackjackGame
+from sessions import SessionJournal, SessionManager
+from wallet import Wallet
+
+
+@pytest.fixture
+def balances():
+    return {1: 1000}
+
+
+@pytest.fixture
+def wallet(balances):
+    return Wallet(balances.get, lambda user_id, delta: balances.__setitem__(user_id, balances[user_id] + delta))
+
+
+def test_finish_policy_needs_a_callback(wallet):
+    with pytest.raises(ValueError):
+        SessionManager(wallet, policies={"blackjack": "finish"})
+
+
+# Timed out rounds are closed by their game's policy, whatever the default is
+def test_expiry_applies_each_games_policy(wallet, balances):
+    finished, forfeited = [], []
+
+    async def finish(session):
+        finished.append(session.game)
+        await wallet.settle(session.hold, 150)  # Played out: this one happens to win
+
+    sessions = SessionManager(wallet, on_forfeit=lambda session: forfeited.append(session.game), on_finish=finish,
+                              policy="refund", policies={"blackjack": "finish", "highlow": "forfeit"}, tick=0.01)
+
+    async def play():
+        for game in ("blackjack", "highlow", "rps"):
+            sessions.open(1, game, await wallet.reserve(1, 100), ttl=0)
+        assert balances[1] == 700
+        assert await sessions.expire_due(now=time.monotonic() + 1) == 3
+
+    asyncio.run(play())
+    assert finished == ["blackjack"]
+    assert forfeited == ["highlow"]
+    assert balances[1] == 700 + 150 + 100  # Blackjack paid out, highlow lost, rps refunded
+    assert len(sessions) == 0
+    stats = sessions.stats()
+    assert (stats["finished"], stats["forfeited"], stats["refunded"]) == (1, 100, 100)
+
+
+# The process dies with three rounds open; the next start closes them from the journal
+def test_recover_closes_rounds_left_open(wallet, balances, tmp_path):
+    path = str(tmp_path / "sessions.journal")
+    policies = {"blackjack": "finish", "highlow": "forfeit"}
+    codecs = {"blackjack": (BlackjackGame.to_dict, BlackjackGame.from_dict)}
+    finished = []
+
+    async def finish(session):
+        game = session.state
+        game.stand()
+        finished.append(game)
+        await wallet.settle(session.hold, game.payout)
+
+    async def crash():
+        sessions = SessionManager(wallet, on_finish=finish, policies=policies, journal=SessionJournal(path), codecs=codecs)
+        game = BlackjackGame(100)
+        sessions.open(1, "blackjack", await wallet.reserve(1, 100), game)
+        if game.player_total < 12:
+            game.hit()
+            sessions.touch(sessions.latest(1, "blackjack"))
+        sessions.open(1, "highlow", await wallet.reserve(1, 100), ("7", None))
+        sessions.open(1, "rps", await wallet.reserve(1, 100))
+        done = sessions.open(1, "rps", await wallet.reserve(1, 100))
+        await wallet.settle(sessions.take(done.id).hold, 200)
+        return game
+
+    game = asyncio.run(crash())
+    assert balances[1] == 800
+
+    restarted = SessionManager(wallet, on_finish=finish, policies=policies, journal=SessionJournal(path), codecs=codecs)
+    assert asyncio.run(restarted.recover()) == 3
+    [stood] = finished
+    assert stood.player_hand == game.player_hand  # Played out from the journaled hand and shoe
+    assert balances[1] == 800 + stood.payout + 100  # Highlow lost, rps refunded
+
+    again = SessionManager(wallet, on_finish=finish, policies=policies, journal=SessionJournal(path), codecs=codecs)
+    assert asyncio.run(again.recover()) == 0
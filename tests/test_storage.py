@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+from pymongo import UpdateOne
+
+from storage import FileBackend, MongoBackend, SQLiteBackend, StorageBackend
+
+ROW = (0, 1_700_000_000.0, 1, "dice", 10, 20, "win", 110)
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_sqlite_flush_and_reload(tmp_path):
+    path = str(tmp_path / "casino.db")
+    storage = SQLiteBackend(path)
+    storage.stage_balance(1, 100)
+    storage.stage_balance(1, 10)
+    storage.stage_balance(2, 50)
+    storage.stage_transaction(ROW)
+    assert asyncio.run(storage.flush())
+    assert not storage.dirty
+    assert not asyncio.run(storage.flush())  # Nothing staged since
+    storage.close()
+
+    reopened = SQLiteBackend(path)
+    assert dict(reopened.load_balances().items()) == {1: 110, 2: 50}
+    assert reopened._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+    reopened.close()
+
+
+def test_sqlite_flush_sync_in_memory():
+    storage = SQLiteBackend(":memory:")
+    storage.stage_balance(7, 42)
+    assert storage.flush_sync()
+    assert dict(storage.load_balances().items()) == {7: 42}
+    storage.close()
+
+
+# Two processes on one database: balances are increments, so neither overwrites the other
+def test_sqlite_two_writers_increment_the_same_user(tmp_path):
+    path = str(tmp_path / "casino.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    first.stage_balance(1, 100)  # Upsert: user 1 does not exist yet
+    asyncio.run(first.flush())
+    first.stage_balance(1, -30)
+    second.stage_balance(1, 25)
+    second.stage_balance(2, 5)
+    asyncio.run(second.flush())
+    asyncio.run(first.flush())
+    assert dict(first.load_balances().items()) == {1: 95, 2: 5}
+    assert dict(second.load_balances().items()) == {1: 95, 2: 5}
+    first.close()
+    second.close()
+
+
+class FlakySQLiteBackend(SQLiteBackend):
+    failures = 1
+
+    def _write_sync(self, deltas, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        super()._write_sync(deltas, rows)
+
+
+def test_failed_flush_requeues_the_batch():
+    storage = FlakySQLiteBackend(":memory:")
+    storage.stage_balance(1, 100)
+    storage.stage_transaction(ROW)
+    with pytest.raises(OSError):
+        asyncio.run(storage.flush())
+    assert storage.dirty
+
+    # Changes staged after the failure merge with the restored batch, rows stay in order
+    later = (1, ROW[1] + 1, 1, "dice", 10, 0, "loss", 100)
+    storage.stage_balance(1, -10)
+    storage.stage_transaction(later)
+    assert storage._deltas == {1: 90}
+    assert storage._rows == [ROW, later]
+
+    assert asyncio.run(storage.flush())
+    assert dict(storage.load_balances().items()) == {1: 90}
+    assert storage._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 2
+    storage.close()
+
+
+# Records every bulk write and applies its upserts, as far as the backend uses them
+class FakeCollection:
+    def __init__(self, fail=0):
+        self.batches = []
+        self.documents = {}
+        self.fail = fail
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("primary stepped down")
+        self.batches.append((list(operations), ordered))
+        for operation in operations:
+            key, update = operation._filter["_id"], operation._doc
+            if key not in self.documents:
+                self.documents[key] = dict(update.get("$setOnInsert", {}))
+            for field, amount in update.get("$inc", {}).items():
+                self.documents[key][field] = self.documents[key].get(field, 0) + amount
+
+
+class FakeMotorClient:
+    def __init__(self):
+        self.databases = {}
+        self.closed = False
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, type("FakeDatabase", (), {
+            "balances": FakeCollection(), "transactions": FakeCollection()})())
+
+    def close(self):
+        self.closed = True
+
+
+def test_mongo_writes_increments_and_inserts():
+    client = FakeMotorClient()
+    storage = MongoBackend("mongodb://unused", database="test", client=client)
+    storage.stage_balance(1, 100)
+    storage.stage_balance(1, -40)
+    storage.stage_transaction(ROW)
+    assert asyncio.run(storage.flush())
+
+    db = client["test"]
+    assert db.balances.batches == [([UpdateOne({"_id": 1}, {"$inc": {"balance": 60}}, upsert=True)], False)]
+    [(inserts, ordered)] = db.transactions.batches
+    assert not ordered
+    assert inserts == [UpdateOne({"_id": "0:1700000000.0:1"}, {"$setOnInsert": {
+        "record": 0, "timestamp": ROW[1], "user_id": 1, "game": "dice", "stake": 10,
+        "payout": 20, "outcome": "win", "balance_after": 110}}, upsert=True)]
+    storage.close()
+    assert client.closed
+
+
+def test_mongo_failed_balance_write_requeues_the_batch():
+    client = FakeMotorClient()
+    storage = MongoBackend("mongodb://unused", database="test", client=client)
+    client["test"].balances.fail = 1
+    storage.stage_balance(1, 100)
+    with pytest.raises(ConnectionError):
+        asyncio.run(storage.flush())
+    assert storage._deltas == {1: 100}
+
+    assert asyncio.run(storage.flush())
+    assert client["test"].balances.batches == [([UpdateOne({"_id": 1}, {"$inc": {"balance": 100}}, upsert=True)], False)]
+
+
+# The transactions went through before the balance write failed; the retry writes them
+# again, which must not add a second copy
+def test_mongo_retry_does_not_duplicate_transactions():
+    client = FakeMotorClient()
+    storage = MongoBackend("mongodb://unused", database="test", client=client)
+    db = client["test"]
+    db.balances.fail = 1
+    storage.stage_balance(1, 10)
+    storage.stage_transaction(ROW)
+    with pytest.raises(ConnectionError):
+        asyncio.run(storage.flush())
+    assert len(db.transactions.documents) == 1
+
+    storage.stage_transaction((1, ROW[1] + 1, 1, "dice", 10, 0, "loss", 100))
+    assert asyncio.run(storage.flush())
+    assert len(db.transactions.batches) == 2
+    assert sorted(doc["record"] for doc in db.transactions.documents.values()) == [0, 1]
+    assert db.balances.documents == {1: {"balance": 10}}
+
+
+def test_file_backend_snapshots_balances(tmp_path):
+    path = str(tmp_path / "balances.bin")
+    storage = FileBackend(path, legacy_loader=lambda: {"1": 10})
+    balances = storage.load_balances()
+    balances.add(1, 5)
+    storage.stage_balance(1, 5)
+    assert asyncio.run(storage.flush())
+    assert dict(FileBackend(path).load_balances().items()) == {1: 15}
@@ -0,0 +1,115 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+
+
+# A bet taken out of a balance and waiting to be settled or refunded
+class Hold:
+    __slots__ = ("id", "user_id", "amount", "key", "state")
+
+    def __init__(self, user_id, amount, key=None):
+        self.id = uuid.uuid4().hex  # Unique across processes, used as the settle/refund key
+        self.user_id = user_id
+        self.amount = amount
+        self.key = key
+        self.state = "held"  # held -> settled | refunded
+
+    @property
+    def open(self):
+        return self.state == "held"
+
+
+# Wallet engine: every balance mutation goes through a per-user lock, bets are
+# reserved up front (hold -> settle/refund), and operations tagged with an
+# idempotency key (e.g. the interaction id) are applied at most once.
+# Locks are per user, so unrelated players never wait on each other.
+class Wallet:
+    def __init__(self, get_balance, update_balance, max_keys=50000):
+        self._get_balance = get_balance
+        self._update_balance = update_balance
+        self._locks = {}  # user_id -> [lock, waiters]
+        self._results = OrderedDict()  # idempotency key -> result of the first call
+        self.max_keys = max_keys
+
+    # Per-user lock, dropped again once nobody is waiting on it
+    class _UserLock:
+        def __init__(self, wallet, user_id):
+            self.wallet = wallet
+            self.user_id = user_id
+
+        async def __aenter__(self):
+            entry = self.wallet._locks.setdefault(self.user_id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            await entry[0].acquire()
+
+        async def __aexit__(self, *exc):
+            entry = self.wallet._locks[self.user_id]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.wallet._locks[self.user_id]
+
+    def lock(self, user_id):
+        return self._UserLock(self, int(user_id))
+
+    def _seen(self, key):
+        return key is not None and key in self._results
+
+    def _remember(self, key, result):
+        if key is None:
+            return
+        self._results[key] = result
+        if len(self._results) > self.max_keys:
+            self._results.popitem(last=False)
+
+    # Take `amount` out of the balance. Returns a Hold, or None if funds are short.
+    async def reserve(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key):
+                return self._results[key]
+            if amount <= 0 or self._get_balance(user_id) < amount:
+                return None
+            self._update_balance(user_id, -amount)
+            hold = Hold(user_id, amount, key)
+            self._remember(key, hold)
+            return hold
+
+    # Pay out `payout` (stake included) for a hold. False if it was already closed.
+    async def settle(self, hold, payout):
+        async with self.lock(hold.user_id):
+            if not hold.open:
+                return False
+            hold.state = "settled"
+            if payout:
+                self._update_balance(hold.user_id, payout)
+            return True
+
+    # Give the held stake back. False if it was already closed.
+    async def refund(self, hold):
+        async with self.lock(hold.user_id):
+            if not hold.open:
+                return False
+            hold.state = "refunded"
+            self._update_balance(hold.user_id, hold.amount)
+            return True
+
+    # Unconditional adjustment (admin changes, accepted deposits). False if `key` was already applied.
+    async def credit(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key):
+                return False
+            self._update_balance(user_id, amount)
+            self._remember(key, True)
+            return True
+
+    # Debit only if the balance covers it. False if funds are short or `key` was already applied.
+    async def debit(self, user_id, amount, key=None):
+        user_id = int(user_id)
+        async with self.lock(user_id):
+            if self._seen(key) or self._get_balance(user_id) < amount:
+                return False
+            self._update_balance(user_id, -amount)
+            self._remember(key, True)
+            return True